@@ -1,6 +1,10 @@
 # app_gui.py
 
+import collections
+import io
 import os
+import queue
+import threading
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide" # Esconde o prompt de inicialização do Pygame
 
 import tkinter as tk
@@ -12,11 +16,35 @@ import tempfile
 import mido
 import datetime # Para criar nomes de pastas com data/hora
 import re       # Para limpar o nome do projeto
+import sqlite3
+import time
 import pygame
 
 # Importe sua classe MusicGenerator e MidiVisualizer
 from music_generator import MusicGenerator
+from groove import GROOVE_TEMPLATES
 from midi_visualizer import MidiVisualizer # Assumindo que esta classe está em midi_visualizer.py
+from midi_catalog import MidiCatalog
+from midi_store import ContentStore
+from midi_reader import load_song_events
+from markov_melody import MarkovMelodyModel
+from midi_sequencer import MidiSequencer, open_output_port
+from live_mode import LiveSession
+from tempo_map import TempoMap
+from audio_renderer import render_song_to_wav, render_stems_to_wav
+from audio_preview import DEFAULT_PREVIEW_DIR, PreviewCache
+from session_file import SESSION_EXTENSION, Session, load_session, save_session
+from arrangement import ArrangementGenerator, materialize, to_pattern_events
+from midi_parts import PART_NAMES
+from measure_patterns import PatternEvents
+
+PYGAME_OUTPUT = "Pygame (sintetizador do sistema)"
+AUDIO_PREVIEW_OUTPUT = "Prévia de áudio (sintetizador embutido)"
+GENRE_GROOVE_LABEL = "Padrão do gênero"
+NO_OVERLAP_FIX = "none"
+
+# Música tocada e exibida: a gerada ou um arquivo aberto em "Abrir MIDI" (este não é salvo nem exportado)
+PlaybackSong = collections.namedtuple('PlaybackSong', ['all_midi_events', 'total_ticks', 'tempo_map', 'instrument_programs'])
 
 class TranceGenGUI:
     def __init__(self, master):
@@ -53,6 +81,17 @@ class TranceGenGUI:
         self.generate_pads_var = tk.BooleanVar(value=True)
         self.generate_arpeggio_var = tk.BooleanVar(value=False)
         self.generate_drums_var = tk.BooleanVar(value=True)
+        self.use_markov_lead_var = tk.BooleanVar(value=False) # Melodia baseada no corpus da pasta MIDI/
+        self.markov_model = None # Treinado (ou lido do cache) em segundo plano ao marcar a opção
+        self.markov_training = None # Fila com o resultado do treino em andamento (modelo ou exceção)
+        self.use_arrangement_var = tk.BooleanVar(value=False) # Intro/build/drop/breakdown/outro do gênero
+        self.groove_var = tk.StringVar(value=GENRE_GROOVE_LABEL) # Groove do gênero ou um modelo de groove.py
+
+        # Salvamento com deduplicação (armazenamento por conteúdo + hardlinks)
+        self.dedup_save_var = tk.BooleanVar(value=False)
+        self.compact_midi_var = tk.BooleanVar(value=False) # MIDI salvo na codificação mais compacta
+        self.overlap_policy_var = tk.StringVar(value=self.music_generator.overlap_policy or NO_OVERLAP_FIX)
+        self.content_store = None # Criado sob demanda no primeiro salvamento deduplicado
 
         # Variáveis e lista de gêneros para o dropdown
         self.available_genres = sorted(list(self.music_generator.genre_configs.keys()))
@@ -64,15 +103,25 @@ class TranceGenGUI:
         self.midi_file_path = None # Caminho do MIDI completo temporário (para reprodução)
         self.midi_player = None 
         self.update_progress_job = None
-        self.start_playback_time = 0 # Tempo de início da reprodução para a linha de progresso
+        self.start_playback_time = 0 # Instante (relógio monotônico) do início da reprodução pelo pygame
         self.music_bpm = 0 # BPM da música que está tocando para cálculo da linha de progresso
+        self.midi_output_var = tk.StringVar(value=PYGAME_OUTPUT) # Saída da reprodução (pygame ou porta MIDI)
+        self.sequencer = None # MidiSequencer ativo quando a saída é uma porta MIDI
+        self.live_session = None # LiveSession ativa no modo ao vivo (geração contínua)
+        self.preview_cache = PreviewCache(cache_dir=DEFAULT_PREVIEW_DIR) # Prévias de áudio já renderizadas
+        self.current_preview = None # Amostras da prévia tocando (para navegar com clique no visualizador)
 
         # Dados do MIDI gerado para reprodução, visualização e salvamento
         self.generated_all_midi_events = None # Eventos MIDI completos
         self.generated_total_ticks = 0 # Total de ticks da música gerada
         self.generated_us_per_beat = 0 # Microsegundos por batida da música gerada
+        self.generated_tempo_map = None # Mapa de tempo (ticks <-> segundos) usado pelo player e pelo visualizador
         self.generated_bpm = 0 # BPM da música gerada
         self.generated_instrument_programs = {} # Programas de instrumento usados na geração
+        self.generated_params = {} # Gênero, tônica, escala, seed e estrutura do arranjo usados na geração (registrados no catálogo)
+        self.generated_arrangement = None # Arrangement da música arranjada (materializado só ao exportar)
+        self.generated_chord_progression = None # Progressão de acordes usada na geração (gravada nas sessões)
+        self.loaded_song = None # PlaybackSong do arquivo aberto no visualizador (só reprodução e visualização)
 
         # current_project_base_dir agora é apenas um indicador da pasta base do projeto,
         # a pasta de sessão completa é criada/verificada no momento do salvamento.
@@ -87,6 +136,13 @@ class TranceGenGUI:
         self.log_text_area.insert(tk.END, self.log_mixer_init + "\n")
         self.log_text_area.see(tk.END)
 
+        # Catálogo SQLite dos MIDIs salvos (para buscas rápidas por gênero, tônica, BPM...)
+        try:
+            self.midi_catalog = MidiCatalog()
+        except sqlite3.Error as e:
+            self.midi_catalog = None
+            self.log_message(f"AVISO: Não foi possível abrir o catálogo de MIDIs. Erro: {e}")
+
         # Chama a função para aplicar as configurações iniciais do gênero
         self._apply_genre_config() 
 
@@ -129,6 +185,16 @@ class TranceGenGUI:
                      values=self.scale_options, state='readonly').grid(row=row_idx, column=1, padx=5, pady=5, sticky="ew")
         row_idx += 1
 
+        ttk.Label(control_frame, text="Groove:").grid(row=row_idx, column=0, padx=5, pady=5, sticky="w")
+        ttk.Combobox(control_frame, textvariable=self.groove_var,
+                     values=[GENRE_GROOVE_LABEL] + list(GROOVE_TEMPLATES), state='readonly').grid(row=row_idx, column=1, padx=5, pady=5, sticky="ew")
+        row_idx += 1
+
+        ttk.Label(control_frame, text="Saída MIDI:").grid(row=row_idx, column=0, padx=5, pady=5, sticky="w")
+        ttk.Combobox(control_frame, textvariable=self.midi_output_var,
+                     values=self._get_midi_output_options(), state='readonly').grid(row=row_idx, column=1, padx=5, pady=5, sticky="ew")
+        row_idx += 1
+
         parts_frame = ttk.LabelFrame(control_frame, text="Gerar Partes:")
         parts_frame.grid(row=row_idx, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
 
@@ -138,6 +204,10 @@ class TranceGenGUI:
         ttk.Checkbutton(parts_frame, text="Pads", variable=self.generate_pads_var).grid(row=1, column=1, padx=5, pady=2, sticky="w")
         ttk.Checkbutton(parts_frame, text="Arpejo", variable=self.generate_arpeggio_var).grid(row=2, column=0, padx=5, pady=2, sticky="w")
         ttk.Checkbutton(parts_frame, text="Bateria", variable=self.generate_drums_var).grid(row=2, column=1, padx=5, pady=2, sticky="w")
+        self.markov_checkbutton = ttk.Checkbutton(parts_frame, text="Melodia treinada no corpus (pasta MIDI/)", variable=self.use_markov_lead_var,
+                                                  command=self._on_markov_lead_toggled)
+        self.markov_checkbutton.grid(row=3, column=0, columnspan=2, padx=5, pady=2, sticky="w")
+        ttk.Checkbutton(parts_frame, text="Arranjo em seções (intro, build, drop...)", variable=self.use_arrangement_var).grid(row=4, column=0, columnspan=2, padx=5, pady=2, sticky="w")
         row_idx += 1
 
         # Botões de ação
@@ -147,17 +217,32 @@ class TranceGenGUI:
         button_frame.columnconfigure(1, weight=1)
         button_frame.columnconfigure(2, weight=1)
         button_frame.columnconfigure(3, weight=1) 
+        button_frame.columnconfigure(4, weight=1)
 
         ttk.Button(button_frame, text="Gerar MIDI", command=self.generate_music).grid(row=0, column=0, padx=5, pady=5, sticky="ew")
         ttk.Button(button_frame, text="Reproduzir MIDI", command=self.play_midi).grid(row=0, column=1, padx=5, pady=5, sticky="ew")
         ttk.Button(button_frame, text="Parar Reprodução", command=self.stop_midi_playback).grid(row=0, column=2, padx=5, pady=5, sticky="ew")
+        ttk.Button(button_frame, text="Tocar ao Vivo", command=self.start_live_playback).grid(row=0, column=3, padx=5, pady=5, sticky="ew")
         
         # Menu de Salvar MIDI (Completo e Partes Separadas)
         save_menubutton = ttk.Menubutton(button_frame, text="Salvar MIDI")
-        save_menubutton.grid(row=0, column=3, padx=5, pady=5, sticky="ew")
+        save_menubutton.grid(row=0, column=4, padx=5, pady=5, sticky="ew")
         save_menu = tk.Menu(save_menubutton, tearoff=0)
         save_menu.add_command(label="Salvar MIDI Completo...", command=self.save_midi_full_to_default_location)
         save_menu.add_command(label="Salvar Partes Separadas...", command=self.save_midi_parts_to_default_location)
+        save_menu.add_command(label="Exportar Áudio (WAV)...", command=self.export_wav_to_default_location)
+        save_menu.add_command(label="Exportar Stems (WAV)...", command=self.export_stems_to_default_location)
+        save_menu.add_separator()
+        save_menu.add_command(label="Salvar Sessão...", command=self.save_session_to_file)
+        save_menu.add_separator()
+        save_menu.add_checkbutton(label="Deduplicar arquivos idênticos", variable=self.dedup_save_var)
+        save_menu.add_checkbutton(label="MIDI compacto (arquivos menores)", variable=self.compact_midi_var)
+        overlap_menu = tk.Menu(save_menu, tearoff=0)
+        for label, policy in (("Truncar a nota anterior", 'truncate'), ("Mesclar em uma nota", 'merge'),
+                              ("Atacar de novo", 'retrigger'), ("Não corrigir", NO_OVERLAP_FIX)):
+            overlap_menu.add_radiobutton(label=label, value=policy, variable=self.overlap_policy_var,
+                                         command=self._configure_overlap_policy)
+        save_menu.add_cascade(label="Notas sobrepostas", menu=overlap_menu)
         save_menubutton["menu"] = save_menu
         
         row_idx += 1
@@ -166,6 +251,14 @@ class TranceGenGUI:
         ttk.Button(control_frame, text="Abrir Pasta de MIDIs Gerados", command=self.open_generated_midi_folder).grid(row=row_idx, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
         row_idx += 1
 
+        # Botão para carregar um MIDI existente no visualizador
+        ttk.Button(control_frame, text="Abrir MIDI no Visualizador...", command=self.load_midi_into_visualizer).grid(row=row_idx, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
+        row_idx += 1
+
+        # Botão para reabrir uma sessão salva (música + parâmetros da geração)
+        ttk.Button(control_frame, text="Abrir Sessão...", command=self.open_session_file).grid(row=row_idx, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
+        row_idx += 1
+
         # Frame para o Visualizador MIDI e suas barras de rolagem
         visualizer_container_frame = ttk.Frame(self.master)
         visualizer_container_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -177,6 +270,7 @@ class TranceGenGUI:
         # Inicializa o visualizador com um total_ticks padrão (será atualizado)
         self.midi_visualizer = MidiVisualizer(visualizer_container_frame, total_ticks=1, bg="grey", height=300)
         self.midi_visualizer.grid(row=0, column=0, sticky="nsew") # Posiciona o canvas
+        self.midi_visualizer.bind("<Button-1>", self._on_visualizer_click)
 
         # CRIAÇÃO E POSICIONAMENTO CORRETO DAS BARRAS DE ROLAGEM
         # Barra de rolagem vertical
@@ -322,42 +416,47 @@ class TranceGenGUI:
             return
 
         try:
-            # Chama o gerador de música com os parâmetros da GUI
-            all_midi_events, log_details, total_ticks, us_per_beat = self.music_generator.generate_music_parts(
-                root_key, scale_type, bpm, num_beats, # Passa num_beats para o gerador
-                generate_bass, generate_chords, generate_lead, generate_pads, generate_arpeggio,
-                generate_drums,
-                selected_genre
-            )
-            self.log_message(log_details)
-
-            # Armazena os dados gerados para reprodução e visualização
-            self.generated_all_midi_events = all_midi_events
-            self.generated_total_ticks = total_ticks
-            self.generated_us_per_beat = us_per_beat
-            self.generated_bpm = bpm
-            
-            # Obtém os programas de instrumento do gênero selecionado para salvar/reproduzir
-            selected_genre_config = self.music_generator.genre_configs.get(selected_genre, {})
-            self.generated_instrument_programs = selected_genre_config.get('instrument_programs', {
-                'bass': 39, 'chords': 1, 'lead': 81, 'pads': 89, 'arpeggio': 81, 'drums': 0
-            })
-
-            # Salva o MIDI em um arquivo temporário para reprodução posterior pelo botão "Reproduzir MIDI"
-            if self.temp_midi_file_for_playback and os.path.exists(self.temp_midi_file_for_playback):
-                os.remove(self.temp_midi_file_for_playback) 
-
-            with tempfile.NamedTemporaryFile(suffix=".mid", delete=False) as tmp_midi_file:
-                self.temp_midi_file_for_playback = tmp_midi_file.name
-
-            # Salva o arquivo temporário usando os programas de instrumento corretos
-            self.music_generator.save_midi_file(
-                self.generated_all_midi_events, 
-                self.temp_midi_file_for_playback, 
-                self.generated_bpm, 
-                self.generated_instrument_programs
-            )
-            self.midi_file_path = self.temp_midi_file_for_playback 
+            self._configure_melody_model()
+            self._configure_groove(self.music_generator)
+
+            # Seed explícita para que a geração possa ser reproduzida (e registrada no catálogo)
+            seed = random.randrange(2**31)
+            arrangement = None
+
+            if self.use_arrangement_var.get():
+                # Duração definida pelas seções do gênero (a duração em compassos é ignorada)
+                parts = [part for part, enabled in zip(PART_NAMES, (generate_bass, generate_chords, generate_lead,
+                                                                    generate_pads, generate_arpeggio, generate_drums)) if enabled]
+                arrangement = ArrangementGenerator(self.music_generator).generate_arrangement(
+                    root_key, scale_type, bpm, selected_genre, parts, seed=seed
+                )
+                # Compassos das seções posicionados por referência, sem materializar a música
+                all_midi_events = to_pattern_events(arrangement, self.music_generator.ticks_per_beat * 4)
+                total_ticks = arrangement.total_ticks
+                self.duration_measures_var.set(total_ticks // (self.music_generator.ticks_per_beat * 4))
+                self.log_message("Arranjo: " + " → ".join(name for name, _ in arrangement.placements))
+            else:
+                # Chama o gerador de música com os parâmetros da GUI
+                all_midi_events, log_details, total_ticks, us_per_beat = self.music_generator.generate_music_parts(
+                    root_key, scale_type, bpm, num_beats, # Passa num_beats para o gerador
+                    generate_bass, generate_chords, generate_lead, generate_pads, generate_arpeggio,
+                    generate_drums,
+                    selected_genre,
+                    seed=seed
+                )
+                self.log_message(log_details)
+
+            # Com arranjo, a seed só reproduz a música junto com a estrutura de seções
+            self.generated_params = {
+                'genre': selected_genre, 'root_key': root_key, 'scale_type': scale_type, 'seed': seed,
+                'arrangement': ",".join(name for name, _ in arrangement.placements) if arrangement else None
+            }
+            if arrangement:
+                self.generated_chord_progression = arrangement.chord_progression_roman
+            else:
+                self.generated_chord_progression = self.music_generator.last_chord_progression_roman
+            self._set_current_song(all_midi_events, total_ticks, bpm,
+                                   self.music_generator.get_instrument_programs(selected_genre), arrangement)
 
             self.log_message(f"Música gerada e salva temporariamente em '{self.midi_file_path}'. Agora você pode reproduzi-la ou salvá-la.")
 
@@ -366,17 +465,164 @@ class TranceGenGUI:
             self.current_project_base_dir = self.get_current_project_session_dir()
             self.log_message(f"Pasta base do projeto definida: {self.current_project_base_dir}")
 
-            # Atualização do Visualizador
-            self.midi_visualizer.set_midi_data(all_midi_events, total_ticks, self.music_generator.ticks_per_beat)
-            self.midi_visualizer.xview_moveto(0) 
-            self.midi_visualizer.yview_moveto(0) 
-
             #messagebox.showinfo("Sucesso", "Música MIDI gerada e visualizada com sucesso! Agora você pode reproduzi-la ou salvá-la.")
 
         except Exception as e:
             self.log_message(f"Ocorreu um erro durante a geração: {e}")
             messagebox.showerror("Erro", f"Ocorreu um erro: {e}")
 
+    def _set_current_song(self, all_midi_events, total_ticks, bpm, instrument_programs, arrangement=None):
+        """Define a música atual (gerada ou reaberta de uma sessão) para reprodução, visualização e salvamento."""
+        self.generated_arrangement = arrangement
+        # Armazena os dados gerados para reprodução e visualização (compassos repetidos guardados uma única vez)
+        all_midi_events = PatternEvents.from_events(all_midi_events, self.music_generator.ticks_per_beat * 4)
+        self.loaded_song = None # A reprodução volta a ser a da música atual
+        self.generated_all_midi_events = all_midi_events
+        self.generated_total_ticks = total_ticks
+        self.generated_us_per_beat = mido.bpm2tempo(bpm)
+        self.generated_tempo_map = TempoMap.from_bpm(self.music_generator.ticks_per_beat, bpm)
+        self.generated_bpm = bpm
+        # Programas de instrumento do gênero para salvar/reproduzir
+        self.generated_instrument_programs = instrument_programs
+
+        # Salva o MIDI em um arquivo temporário para reprodução posterior pelo botão "Reproduzir MIDI"
+        if self.temp_midi_file_for_playback and os.path.exists(self.temp_midi_file_for_playback):
+            os.remove(self.temp_midi_file_for_playback) 
+
+        with tempfile.NamedTemporaryFile(suffix=".mid", delete=False) as tmp_midi_file:
+            self.temp_midi_file_for_playback = tmp_midi_file.name
+
+        # Salva o arquivo temporário usando os programas de instrumento corretos
+        self.music_generator.save_midi_file(
+            self.generated_all_midi_events, 
+            self.temp_midi_file_for_playback, 
+            self.generated_bpm, 
+            self.generated_instrument_programs
+        )
+        self.midi_file_path = self.temp_midi_file_for_playback 
+
+        # Atualização do Visualizador
+        self.midi_visualizer.set_midi_data(all_midi_events, total_ticks, self.music_generator.ticks_per_beat,
+                                           self.generated_tempo_map)
+        self.midi_visualizer.xview_moveto(0) 
+        self.midi_visualizer.yview_moveto(0) 
+
+    def save_session_to_file(self):
+        """Grava a música atual e os parâmetros da geração em um arquivo de sessão (reaberto sem reler MIDI)."""
+        if not self.generated_all_midi_events or not self.generated_params:
+            messagebox.showwarning("Salvar Sessão", "Nenhuma música foi gerada ainda para salvar.")
+            return
+
+        timestamp_file = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = filedialog.asksaveasfilename(
+            title="Salvar Sessão",
+            initialdir=self.get_current_project_session_dir(),
+            initialfile=f"Sessao_{timestamp_file}{SESSION_EXTENSION}",
+            defaultextension=SESSION_EXTENSION,
+            filetypes=[("Sessões do gerador", f"*{SESSION_EXTENSION}"), ("Todos os arquivos", "*.*")]
+        )
+        if not filename:
+            return
+
+        params = self.generated_params
+        session = Session(self.generated_all_midi_events, self.generated_bpm, self.music_generator.ticks_per_beat,
+                          self.generated_total_ticks, params.get('genre'), params.get('root_key'),
+                          params.get('scale_type'), params.get('seed'), self.generated_chord_progression,
+                          self.generated_instrument_programs)
+        try:
+            save_session(filename, session)
+            self.log_message(f"Sessão salva em: {filename}")
+        except Exception as e:
+            messagebox.showerror("Erro ao Salvar", f"Não foi possível salvar a sessão: {e}")
+            self.log_message(f"ERRO ao salvar sessão: {e}")
+
+    def open_session_file(self):
+        """Reabre uma sessão salva: restaura a música, os controles da geração e o visualizador."""
+        filename = filedialog.askopenfilename(
+            title="Abrir Sessão",
+            initialdir=self.current_project_base_dir or os.getcwd(),
+            filetypes=[("Sessões do gerador", f"*{SESSION_EXTENSION}"), ("Todos os arquivos", "*.*")]
+        )
+        if not filename:
+            return
+
+        self.stop_midi_playback()
+        try:
+            session = load_session(filename)
+        except ValueError as e:
+            messagebox.showerror("Erro", f"Não foi possível abrir a sessão: {e}")
+            self.log_message(f"ERRO ao abrir sessão: {e}")
+            return
+
+        if session.ticks_per_beat != self.music_generator.ticks_per_beat:
+            messagebox.showerror("Erro", "A sessão usa uma resolução (ticks por batida) diferente da do gerador.")
+            return
+
+        # Restaura os controles com os parâmetros usados na geração
+        if session.genre in self.available_genres:
+            self.selected_genre_var.set(session.genre)
+        self.bpm_var.set(session.bpm)
+        self.duration_measures_var.set(session.total_ticks // (self.music_generator.ticks_per_beat * 4))
+        self.root_key_var.set(session.root_key)
+        self.scale_type_var.set(session.scale_type)
+
+        self.generated_params = {
+            'genre': session.genre, 'root_key': session.root_key, 'scale_type': session.scale_type, 'seed': session.seed
+        }
+        self.generated_chord_progression = session.chord_progression_roman
+        self._set_current_song(session.all_midi_events, session.total_ticks, session.bpm, session.instrument_programs)
+        self.log_message(f"Sessão aberta: {filename} ({session.genre}, {session.root_key} {session.scale_type}, "
+                         f"seed {session.seed}, progressão {' - '.join(session.chord_progression_roman or [])})")
+
+    def _configure_overlap_policy(self):
+        policy = self.overlap_policy_var.get()
+        self.music_generator.overlap_policy = None if policy == NO_OVERLAP_FIX else policy
+
+    def _configure_groove(self, generator):
+        groove = self.groove_var.get()
+        generator.groove_template = None if groove == GENRE_GROOVE_LABEL else groove
+
+    def _configure_melody_model(self):
+        """Ativa ou desativa o modelo de melodia do corpus (a opção só fica marcada com o modelo pronto)."""
+        use_model = self.use_markov_lead_var.get() and self.markov_model is not None
+        self.music_generator.melody_model = self.markov_model if use_model else None
+
+    def _on_markov_lead_toggled(self):
+        """
+        Na primeira vez que a opção é marcada, treina (ou lê do cache) o modelo em uma thread,
+        sem travar a janela: a opção fica desmarcada e desabilitada até o treino terminar.
+        """
+        if not self.use_markov_lead_var.get() or self.markov_model is not None:
+            return
+        self.use_markov_lead_var.set(False)
+        self.markov_checkbutton.state(['disabled'])
+        self.log_message("Carregando modelo de melodia a partir do corpus MIDI/ em segundo plano...")
+        self.markov_training = queue.Queue(maxsize=1)
+
+        def train(result):
+            # O treino em si roda no pool de processos de MarkovMelodyModel.train
+            try:
+                result.put(MarkovMelodyModel.train_or_load())
+            except Exception as e:
+                result.put(e)
+        threading.Thread(target=train, args=(self.markov_training,), daemon=True, name="MarkovTraining").start()
+        self.master.after(100, self._check_markov_training)
+
+    def _check_markov_training(self):
+        try:
+            result = self.markov_training.get_nowait()
+        except queue.Empty:
+            self.master.after(100, self._check_markov_training)
+            return
+        self.markov_training = None
+        self.markov_checkbutton.state(['!disabled'])
+        if isinstance(result, Exception):
+            self.log_message(f"ERRO ao carregar o modelo de melodia: {result}")
+            return
+        self.markov_model = result
+        self.use_markov_lead_var.set(True)
+        self.log_message("Modelo de melodia pronto: a melodia passa a seguir o corpus MIDI/.")
+
     # Chamado pelo botão "Reproduzir MIDI"
     def play_midi(self):
         if not self.midi_file_path or not os.path.exists(self.midi_file_path):
@@ -384,16 +630,40 @@ class TranceGenGUI:
             self.log_message("Tentativa de reprodução falhou: nenhuma música gerada.")
             return
         
-        self._start_midi_playback(self.midi_file_path, self.generated_bpm)
+        bpm = mido.tempo2bpm(self.loaded_song.tempo_map.initial_us_per_beat) if self.loaded_song else self.generated_bpm
+        self._start_midi_playback(self.midi_file_path, bpm)
+
+    def _playback_song(self):
+        """Música tocada e exibida: o arquivo aberto no visualizador, se houver, ou a música gerada."""
+        if self.loaded_song is not None:
+            return self.loaded_song
+        return PlaybackSong(self.generated_all_midi_events, self.generated_total_ticks, self.generated_tempo_map,
+                            self.generated_instrument_programs)
+
+    def _get_midi_output_options(self):
+        """Portas de saída MIDI disponíveis (hardware ou virtuais), além do pygame."""
+        try:
+            port_names = mido.get_output_names()
+        except Exception: # Nenhum backend MIDI (ex.: python-rtmidi) instalado
+            port_names = []
+        return [PYGAME_OUTPUT, AUDIO_PREVIEW_OUTPUT] + list(port_names)
 
     def _start_midi_playback(self, filename, bpm):
         self.stop_midi_playback() # Para qualquer reprodução anterior
+
+        song_events = self._playback_song().all_midi_events
+        if self.midi_output_var.get() == AUDIO_PREVIEW_OUTPUT and song_events:
+            self._start_preview_playback()
+            return
+        if self.midi_output_var.get() != PYGAME_OUTPUT and song_events:
+            self._start_sequencer_playback(bpm)
+            return
         
         try:
             pygame.mixer.music.load(filename)
             pygame.mixer.music.play()
             self.playing_midi = True
-            self.start_playback_time = pygame.time.get_ticks() / 1000.0 # Tempo em segundos quando a reprodução começou
+            self.start_playback_time = time.perf_counter() # Relógio da reprodução para a linha de progresso
             self.music_bpm = bpm
             
             # Inicia a atualização da linha de progresso
@@ -405,10 +675,120 @@ class TranceGenGUI:
         except Exception as e:
             self.log_message(f"Erro inesperado durante a reprodução MIDI: {e}")
 
+    def _start_preview_playback(self, start_seconds=0.0):
+        """Toca a prévia de áudio da música (renderizada só na primeira vez, depois vem do cache)."""
+        started = time.perf_counter()
+        song = self._playback_song()
+        try:
+            key, pcm = self.preview_cache.get_preview(song.all_midi_events, song.tempo_map,
+                                                      song.instrument_programs, song.total_ticks)
+            pygame.mixer.music.load(io.BytesIO(self.preview_cache.wav_bytes(pcm, start_seconds)), "wav")
+            pygame.mixer.music.play()
+        except Exception as e:
+            self.log_message(f"Erro ao reproduzir a prévia de áudio: {e}")
+            return
+        self.current_preview = pcm
+        self.playing_midi = True
+        # O relógio da linha de progresso começa no ponto de partida da prévia
+        self.start_playback_time = time.perf_counter() - start_seconds
+        self.update_progress_line()
+        if start_seconds == 0.0:
+            self.log_message(f"Reproduzindo prévia de áudio {key[:12]} (pronta em {(time.perf_counter() - started) * 1000:.0f} ms, "
+                             f"{self.preview_cache.hits} acerto(s) de cache).")
+
+    def _on_visualizer_click(self, event):
+        """Com a prévia de áudio tocando, um clique no visualizador leva a reprodução àquele ponto."""
+        tempo_map = self._playback_song().tempo_map
+        if not (self.playing_midi and self.current_preview is not None and tempo_map):
+            return
+        tick = self.midi_visualizer.canvasx(event.x) / self.midi_visualizer.pixels_per_tick
+        seconds = tempo_map.tick_to_seconds(max(0.0, tick))
+        if self.update_progress_job:
+            self.master.after_cancel(self.update_progress_job)
+            self.update_progress_job = None
+        self._start_preview_playback(seconds)
+
+    def _start_sequencer_playback(self, bpm):
+        """Reproduz a música gerada na porta MIDI selecionada, via MidiSequencer."""
+        port_name = self.midi_output_var.get()
+        try:
+            port = open_output_port(port_name)
+        except Exception as e:
+            self.log_message(f"Erro ao abrir a porta MIDI '{port_name}': {e}")
+            return
+
+        song = self._playback_song()
+        self.sequencer = MidiSequencer(port)
+        self.sequencer.play_song(song.all_midi_events, song.tempo_map, song.instrument_programs)
+        self.playing_midi = True
+        self.music_bpm = bpm
+        self.update_progress_line()
+        self.log_message(f"Reproduzindo na porta MIDI '{port_name}' (BPM: {bpm})...")
+
+    def start_live_playback(self):
+        """Modo ao vivo: gera e toca compassos continuamente na porta MIDI selecionada, até ser parado."""
+        port_name = self.midi_output_var.get()
+        if port_name in (PYGAME_OUTPUT, AUDIO_PREVIEW_OUTPUT):
+            messagebox.showwarning("Tocar ao Vivo", "O modo ao vivo precisa de uma porta MIDI. Selecione uma em 'Saída MIDI'.")
+            return
+        parts = [part for part, var in (('bass', self.generate_bass_var), ('chords', self.generate_chords_var),
+                                        ('lead', self.generate_lead_var), ('pads', self.generate_pads_var),
+                                        ('arpeggio', self.generate_arpeggio_var), ('drums', self.generate_drums_var))
+                 if var.get()]
+        if not parts:
+            messagebox.showwarning("Tocar ao Vivo", "Selecione pelo menos uma parte para gerar.")
+            return
+
+        self.stop_midi_playback()
+        try:
+            self._configure_melody_model()
+            port = open_output_port(port_name)
+        except Exception as e:
+            self.log_message(f"Erro ao iniciar o modo ao vivo: {e}")
+            return
+
+        # Gerador exclusivo: a thread de geração não compartilha o RNG com a geração normal
+        live_generator = MusicGenerator()
+        live_generator.melody_model = self.music_generator.melody_model
+        live_generator.overlap_policy = self.music_generator.overlap_policy # Aplicada aos eventos enviados (LiveSession)
+        self._configure_groove(live_generator)
+        self.sequencer = MidiSequencer(port)
+        self.live_session = LiveSession(live_generator, self.sequencer, self.root_key_var.get(), self.scale_type_var.get(),
+                                        self.bpm_var.get(), self.selected_genre_var.get(), parts)
+        self.live_session.start()
+        self.playing_midi = True
+        self.log_message(f"Modo ao vivo na porta '{port_name}' (progressão: {' - '.join(self.live_session.chord_progression_roman)}, "
+                         f"look-ahead de {self.live_session.lookahead_measures} compassos).")
+
+    def _stop_live_session(self):
+        if not self.live_session:
+            return
+        self.live_session.stop()
+        if self.live_session.error is not None:
+            self.log_message(f"ERRO na geração do modo ao vivo: {self.live_session.error}")
+        self.log_message(f"Modo ao vivo: {self.live_session.measures_played} compasso(s) tocado(s), "
+                         f"{self.live_session.underruns} falta(s) de buffer.")
+        self.live_session = None
+
+    def _stop_sequencer(self):
+        if not self.sequencer:
+            return
+        self._stop_live_session()
+        self.sequencer.stop()
+        self.sequencer.port.close()
+        report = self.sequencer.jitter_report()
+        if report.count:
+            self.log_message(f"Jitter do sequenciador: médio {report.mean_ms:.3f} ms, p99 {report.p99_ms:.3f} ms, máximo {report.max_ms:.3f} ms ({report.count} eventos).")
+        self.sequencer = None
+
     def stop_midi_playback(self):
         if self.playing_midi:
-            pygame.mixer.music.stop()
+            if self.sequencer:
+                self._stop_sequencer()
+            else:
+                pygame.mixer.music.stop()
             self.playing_midi = False
+            self.current_preview = None
             if self.update_progress_job:
                 self.master.after_cancel(self.update_progress_job)
                 self.update_progress_job = None
@@ -416,16 +796,21 @@ class TranceGenGUI:
             self.log_message("Reprodução MIDI parada.")
 
     def update_progress_line(self):
-        if self.playing_midi and pygame.mixer.music.get_busy():
-            elapsed_ms = pygame.mixer.music.get_pos() 
-            elapsed_seconds = elapsed_ms / 1000.0 
+        if self.sequencer:
+            is_busy = self.sequencer.is_playing
+        else:
+            is_busy = pygame.mixer.music.get_busy()
 
-            if self.generated_us_per_beat > 0 and self.music_generator.ticks_per_beat > 0:
-                current_ticks = mido.second2tick(elapsed_seconds, self.music_generator.ticks_per_beat, self.generated_us_per_beat)
+        if self.playing_midi and is_busy:
+            # A posição vem do relógio da reprodução (não de get_pos) e é convertida pelo mapa de tempo
+            if self.sequencer:
+                elapsed_seconds = self.sequencer.position_seconds()
             else:
-                current_ticks = 0
+                elapsed_seconds = time.perf_counter() - self.start_playback_time
 
-            if current_ticks <= self.generated_total_ticks:
+            current_ticks = self.midi_visualizer.seconds_to_ticks(elapsed_seconds)
+
+            if current_ticks <= self._playback_song().total_ticks:
                 self.midi_visualizer.update_progress_line(current_ticks)
             else:
                 self.stop_midi_playback()
@@ -449,13 +834,59 @@ class TranceGenGUI:
         try:
             timestamp_file = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             full_midi_filename = os.path.join(session_dir, f"Full_Mix_{timestamp_file}.mid")
-            self.music_generator.save_midi_file(self.generated_all_midi_events, full_midi_filename, self.generated_bpm, self.generated_instrument_programs)
+            all_midi_events = self._export_events()
+            full_midi_filename = self._write_midi(all_midi_events, full_midi_filename, self.generated_instrument_programs)
+            self._record_in_catalog(full_midi_filename, all_midi_events)
             self.log_message(f"MIDI completo salvo em: {full_midi_filename}")
             messagebox.showinfo("Sucesso", f"MIDI completo salvo com sucesso em:\n{full_midi_filename}")
         except Exception as e:
             messagebox.showerror("Erro ao Salvar", f"Não foi possível salvar o arquivo MIDI completo: {e}")
             self.log_message(f"ERRO ao salvar MIDI completo: {e}")
 
+    def export_wav_to_default_location(self):
+        """Renderiza a música gerada em WAV com o sintetizador embutido (não depende do sintetizador do sistema)."""
+        if not self.generated_all_midi_events or not self.generated_tempo_map:
+            messagebox.showwarning("Exportar Áudio", "Nenhuma música foi gerada ainda para exportar.")
+            return
+
+        session_dir = self.get_current_project_session_dir()
+        if not session_dir:
+            messagebox.showerror("Erro de Exportação", "Não foi possível determinar o diretório para exportar. Tente novamente.")
+            return
+
+        try:
+            timestamp_file = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            wav_filename = os.path.join(session_dir, f"Full_Mix_{timestamp_file}.wav")
+            render_song_to_wav(wav_filename, self._export_events(), self.generated_tempo_map,
+                               self.generated_instrument_programs, self.generated_total_ticks)
+            self.log_message(f"Áudio exportado em: {wav_filename}")
+            messagebox.showinfo("Sucesso", f"Áudio exportado com sucesso em:\n{wav_filename}")
+        except Exception as e:
+            messagebox.showerror("Erro ao Exportar", f"Não foi possível exportar o áudio: {e}")
+            self.log_message(f"ERRO ao exportar áudio: {e}")
+
+    def export_stems_to_default_location(self):
+        """Renderiza cada parte em um WAV separado (em paralelo) e a mixagem, numa subpasta da sessão."""
+        if not self.generated_all_midi_events or not self.generated_tempo_map:
+            messagebox.showwarning("Exportar Stems", "Nenhuma música foi gerada ainda para exportar.")
+            return
+
+        session_dir = self.get_current_project_session_dir()
+        if not session_dir:
+            messagebox.showerror("Erro de Exportação", "Não foi possível determinar o diretório para exportar. Tente novamente.")
+            return
+
+        try:
+            timestamp_file = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            stems_dir = os.path.join(session_dir, f"Stems_{timestamp_file}")
+            written = render_stems_to_wav(stems_dir, self._export_events(), self.generated_tempo_map,
+                                          self.generated_instrument_programs, self.generated_total_ticks)
+            self.log_message(f"{len(written)} arquivo(s) WAV exportado(s) em: {stems_dir}")
+            messagebox.showinfo("Sucesso", f"Stems exportados com sucesso na pasta:\n{stems_dir}")
+        except Exception as e:
+            messagebox.showerror("Erro ao Exportar", f"Não foi possível exportar os stems: {e}")
+            self.log_message(f"ERRO ao exportar stems: {e}")
+
     def save_midi_parts_to_default_location(self):
         """Salva as partes MIDI separadamente no diretório de sessão atual do projeto, com timestamp nos nomes dos arquivos."""
         if not self.generated_all_midi_events or not self.generated_bpm or not self.generated_instrument_programs:
@@ -469,7 +900,7 @@ class TranceGenGUI:
 
         try:
             timestamp_file = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            for part_name, events in self.generated_all_midi_events.items():
+            for part_name, events in self._export_events().items():
                 if events:
                     # Formata o nome da pasta (ex: "Baixo", "Acordes")
                     part_dir_name = part_name.replace(' ', '_').capitalize()
@@ -483,7 +914,8 @@ class TranceGenGUI:
                     # Usa o programa de instrumento específico para esta parte
                     single_part_instrument_program = {part_name: self.generated_instrument_programs.get(part_name, 0)}
 
-                    self.music_generator.save_midi_file(temp_midi_events, part_filename, self.generated_bpm, single_part_instrument_program)
+                    part_filename = self._write_midi(temp_midi_events, part_filename, single_part_instrument_program)
+                    self._record_in_catalog(part_filename, temp_midi_events, part=part_name)
                     self.log_message(f"Parte '{part_name}' salva em: {part_filename}")
             
             messagebox.showinfo("Sucesso", f"Partes MIDI salvas separadamente na pasta:\n{session_dir}")
@@ -492,6 +924,48 @@ class TranceGenGUI:
             messagebox.showerror("Erro ao Salvar Partes", f"Ocorreu um erro ao salvar as partes MIDI: {e}")
             self.log_message(f"ERRO ao salvar partes MIDI: {e}")
 
+    def _export_events(self):
+        """Eventos completos para exportar: uma música arranjada é materializada a partir do seu Arrangement."""
+        if self.generated_arrangement is not None:
+            return materialize(self.generated_arrangement)
+        return self.generated_all_midi_events
+
+    def _write_midi(self, midi_events, filename, instrument_programs):
+        """
+        Grava o MIDI em disco. Com a deduplicação ativa, o conteúdo é salvo uma única vez no
+        armazenamento por conteúdo e o arquivo do projeto vira uma referência para ele;
+        se a pasta já tiver um arquivo idêntico, ele é reaproveitado. Retorna o caminho final.
+        """
+        compact = self.compact_midi_var.get()
+        if not self.dedup_save_var.get():
+            self.music_generator.save_midi_file(midi_events, filename, self.generated_bpm, instrument_programs, compact)
+            return filename
+
+        if self.content_store is None:
+            self.content_store = ContentStore()
+        midi_bytes = self.music_generator.encode_midi_bytes(midi_events, self.generated_bpm, instrument_programs, compact)
+        saved_path, reused = self.content_store.save(midi_bytes, filename)
+        if reused:
+            self.log_message(f"Conteúdo idêntico já salvo em '{saved_path}'. Nenhum arquivo novo criado.")
+        return saved_path
+
+    def _record_in_catalog(self, filename, midi_events, part=None):
+        """Registra um arquivo salvo no catálogo com os parâmetros da geração atual."""
+        if not self.midi_catalog:
+            return
+        try:
+            self.midi_catalog.record_file(
+                filename,
+                bpm=self.generated_bpm,
+                length_ticks=self.generated_total_ticks,
+                event_count=sum(len(events) for events in midi_events.values()),
+                ticks_per_beat=self.music_generator.ticks_per_beat,
+                part=part,
+                **self.generated_params
+            )
+        except (sqlite3.Error, OSError) as e:
+            self.log_message(f"AVISO: Não foi possível registrar '{filename}' no catálogo. Erro: {e}")
+
     def open_generated_midi_folder(self):
         """Abre a pasta de sessão do projeto atual no explorador de arquivos do sistema."""
         session_dir = self.get_current_project_session_dir() 
@@ -512,6 +986,31 @@ class TranceGenGUI:
             messagebox.showerror("Erro", f"Não foi possível abrir a pasta. Erro: {e}")
             self.log_message(f"ERRO ao abrir pasta: {e}")
 
+    def load_midi_into_visualizer(self):
+        """Carrega um arquivo MIDI existente no visualizador (e para o botão de reprodução)."""
+        filename = filedialog.askopenfilename(
+            title="Abrir MIDI",
+            initialdir=self.current_project_base_dir or os.getcwd(),
+            filetypes=[("Arquivos MIDI", "*.mid *.midi"), ("Todos os arquivos", "*.*")]
+        )
+        if not filename:
+            return
+
+        self.stop_midi_playback()
+        try:
+            all_midi_events, total_ticks, ticks_per_beat, tempo_map = load_song_events(filename)
+        except Exception as e:
+            messagebox.showerror("Erro", f"Não foi possível ler o arquivo MIDI: {e}")
+            self.log_message(f"ERRO ao abrir MIDI: {e}")
+            return
+
+        # O arquivo aberto passa a ser o tocado por "Reproduzir MIDI", com o seu próprio mapa de tempo e duração;
+        # os dados da música gerada (generated_*) não mudam e continuam sendo os salvos e exportados
+        self.midi_file_path = filename
+        self.loaded_song = PlaybackSong(all_midi_events, total_ticks, tempo_map, {})
+        self.midi_visualizer.set_midi_data(all_midi_events, total_ticks, ticks_per_beat, tempo_map)
+        self.log_message(f"MIDI aberto no visualizador: {filename} ({', '.join(all_midi_events) or 'sem notas'})")
+
     # Esta função open_midi_file é um resquício, não sendo mais usada para reprodução
     # mas sim para abrir o MIDI com o programa padrão do sistema.
     def open_midi_file(self, filename):
@@ -533,6 +1032,8 @@ class TranceGenGUI:
 
     # Certifique-se de que quaisquer arquivos temporários sejam limpos ao fechar o app
     def on_closing(self):
+        if self.midi_catalog:
+            self.midi_catalog.close()
         if self.temp_midi_file_for_playback and os.path.exists(self.temp_midi_file_for_playback):
             os.remove(self.temp_midi_file_for_playback)
             self.log_message(f"Arquivo temporário '{self.temp_midi_file_for_playback}' removido.")
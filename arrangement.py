@@ -0,0 +1,150 @@
+# arrangement.py
+
+import collections
+import random
+
+import mido
+
+from measure_patterns import PatternEvents, PatternPart, compress_part
+from midi_parts import PART_NAMES
+
+# Arranjo padrão para gêneros sem a chave "arrangement" no genres_config.json
+DEFAULT_ARRANGEMENT = {
+    'sections': {
+        'intro': {'measures': 8, 'parts': ['pads', 'drums']},
+        'build': {'measures': 8, 'parts': ['bass', 'chords', 'pads', 'drums']},
+        'drop': {'measures': 16, 'parts': list(PART_NAMES)},
+        'breakdown': {'measures': 8, 'parts': ['chords', 'lead', 'pads']},
+        'outro': {'measures': 8, 'parts': ['pads', 'drums']},
+    },
+    'structure': ['intro', 'build', 'drop', 'breakdown', 'build', 'drop', 'outro'],
+}
+
+# Material de uma seção, gerado uma única vez: eventos com ticks relativos ao início da seção
+Section = collections.namedtuple('Section', ['name', 'all_midi_events', 'length_ticks', 'seed'])
+
+# Música arranjada: cada seção única é guardada uma vez e posicionada por referência
+# (nome da seção, tick inicial); os eventos completos só existem em materialize()
+Arrangement = collections.namedtuple(
+    'Arrangement',
+    ['sections', 'placements', 'total_ticks', 'us_per_beat', 'chord_progression_roman', 'instrument_programs']
+)
+
+
+class ArrangementGenerator:
+    """
+    Gera músicas em seções (intro, build, drop, breakdown, outro...) definidas por gênero
+    no genres_config.json. Cada seção é gerada uma vez com as suas partes, sobre a mesma
+    progressão de acordes, e repetida por referência: uma faixa longa com seções repetidas
+    ocupa memória proporcional ao material único, não à duração.
+    """
+    def __init__(self, music_generator):
+        self.music_generator = music_generator
+
+    def arrangement_config(self, selected_style):
+        generator = self.music_generator
+        config = generator.genre_configs.get(selected_style, generator.genre_configs.get('Drum and Bass', {}))
+        return config.get('arrangement', DEFAULT_ARRANGEMENT)
+
+    def generate_arrangement(self, root_key, scale_type, bpm, selected_style, parts=PART_NAMES,
+                             seed=None, chord_progression_roman=None, structure=None):
+        """
+        Gera as seções usadas em `structure` (por padrão, a do gênero). Cada seção toca as
+        partes configuradas para ela que também estejam em `parts`. Retorna um Arrangement.
+        """
+        generator = self.music_generator
+        arrangement_config = self.arrangement_config(selected_style)
+        section_configs = arrangement_config['sections']
+        structure = list(structure or arrangement_config['structure'])
+
+        unknown_sections = set(structure) - set(section_configs)
+        if unknown_sections:
+            raise ValueError(f"Seções desconhecidas: {', '.join(sorted(unknown_sections))}")
+
+        # Progressão e seeds das seções vêm de uma única seed, como em variations.VariationGenerator
+        rng = random.Random(seed)
+        config = generator.genre_configs.get(selected_style, generator.genre_configs.get('Drum and Bass', {}))
+        if chord_progression_roman is None:
+            chord_progression_roman = rng.choice(config.get('chords_progressions', [['i', 'VI', 'VII', 'III']]))
+
+        sections = {}
+        for name in structure:
+            if name in sections:
+                continue # Seção repetida: reutiliza o mesmo material
+            section_config = section_configs[name]
+            section_parts = [part for part in section_config.get('parts', PART_NAMES) if part in parts]
+            flags = [part in section_parts for part in PART_NAMES]
+            section_seed = rng.getrandbits(32)
+            all_midi_events, _, length_ticks, _ = generator.generate_music_parts(
+                root_key, scale_type, bpm, section_config['measures'] * 4, *flags, selected_style,
+                seed=section_seed, chord_progression_roman=chord_progression_roman
+            )
+            sections[name] = Section(name, self._clip_to_length(all_midi_events, length_ticks), length_ticks, section_seed)
+
+        placements = []
+        tick = 0
+        for name in structure:
+            placements.append((name, tick))
+            tick += sections[name].length_ticks
+
+        return Arrangement(sections, placements, tick, mido.bpm2tempo(bpm), list(chord_progression_roman),
+                           generator.get_instrument_programs(selected_style))
+
+    @staticmethod
+    def _clip_to_length(all_midi_events, length_ticks):
+        # Notas que passariam do fim da seção (ex.: acordes longos no último compasso) terminam nele,
+        # para não se sobreporem à seção seguinte
+        return {part: [(event_type, note, velocity, min(tick, length_ticks)) for event_type, note, velocity, tick in events]
+                for part, events in all_midi_events.items()}
+
+    def export_arrangement(self, arrangement, filename, bpm):
+        """Materializa os eventos e grava o arquivo MIDI."""
+        return self.music_generator.save_midi_file(materialize(arrangement), filename, bpm, arrangement.instrument_programs)
+
+
+def to_pattern_events(arrangement, measure_ticks):
+    """
+    PatternEvents da música arranjada sem materializar os eventos: os blocos de compasso
+    de cada seção são calculados uma vez e posicionados em cada repetição. Expandir uma
+    parte dá a mesma lista de materialize (uma nota cortada no fim de uma seção divide
+    o compasso com o início da seguinte, na mesma ordem).
+    """
+    section_patterns = {name: {part: compress_part(events, measure_ticks) for part, events in section.all_midi_events.items()}
+                        for name, section in arrangement.sections.items()}
+    measures = {}
+    for name, start_tick in arrangement.placements:
+        start_measure = start_tick // measure_ticks
+        for part, pattern_part in section_patterns[name].items():
+            part_measures = measures.setdefault(part, {})
+            for pattern, occurrences in zip(pattern_part.patterns, pattern_part.occurrences):
+                for measure in occurrences:
+                    part_measures.setdefault(start_measure + measure, []).append(pattern)
+
+    parts = {}
+    for part, part_measures in measures.items():
+        pattern_index = {}
+        patterns, occurrences = [], []
+        for measure, blocks in sorted(part_measures.items()):
+            block = blocks[0] if len(blocks) == 1 else sum(blocks, ())
+            index = pattern_index.get(block)
+            if index is None:
+                index = pattern_index[block] = len(patterns)
+                patterns.append(block)
+                occurrences.append([])
+            occurrences[index].append(measure)
+        parts[part] = PatternPart(patterns, occurrences)
+    return PatternEvents(parts, measure_ticks)
+
+
+def materialize(arrangement, parts=None):
+    """Lista completa de eventos por parte, com ticks absolutos, a partir das seções posicionadas."""
+    all_midi_events = {}
+    for name, start_tick in arrangement.placements:
+        for part, events in arrangement.sections[name].all_midi_events.items():
+            if parts is not None and part not in parts:
+                continue
+            all_midi_events.setdefault(part, []).extend(
+                (event_type, note, velocity, start_tick + tick) for event_type, note, velocity, tick in events
+            )
+    return all_midi_events
+
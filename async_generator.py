@@ -0,0 +1,181 @@
+# async_generator.py
+
+import asyncio
+import collections
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from midi_parts import PART_NAMES
+from song_cache import DEFAULT_MAX_DISK_BYTES, DEFAULT_SONG_CACHE_DIR, SongCache
+
+DEFAULT_PARTS = ('bass', 'chords', 'lead', 'pads', 'drums')
+
+# Resultado de AsyncMusicGenerator.generate: o mesmo de generate_music_parts, mais o que é preciso para reproduzi-lo
+GenerationResult = collections.namedtuple(
+    'GenerationResult',
+    ['all_midi_events', 'log_details', 'total_ticks', 'us_per_beat', 'seed', 'chord_progression_roman', 'instrument_programs']
+)
+
+# Resultado de AsyncMusicGenerator.generate_midi: bytes do arquivo MIDI e a seed usada
+MidiResult = collections.namedtuple('MidiResult', ['midi_bytes', 'seed'])
+
+# Uma parte produzida por AsyncMusicGenerator.iter_parts
+PartResult = collections.namedtuple('PartResult', ['part', 'events', 'seed'])
+
+_worker_generator = None # MusicGenerator de cada processo de trabalho (criado no primeiro uso)
+_worker_caches = {} # (pasta do cache em disco, limite em bytes) -> SongCache do processo de trabalho
+
+
+def _get_worker_generator():
+    global _worker_generator
+    if _worker_generator is None:
+        from music_generator import MusicGenerator
+        _worker_generator = MusicGenerator()
+    return _worker_generator
+
+
+def _get_worker_cache(cache_dir, max_disk_bytes):
+    # Cada processo tem o seu LRU em memória; o armazenamento em disco é compartilhado por todos
+    key = (cache_dir, max_disk_bytes)
+    if key not in _worker_caches:
+        _worker_caches[key] = SongCache(_get_worker_generator(), cache_dir=cache_dir, max_disk_bytes=max_disk_bytes)
+    return _worker_caches[key]
+
+
+def _cached_song(root_key, scale_type, bpm, num_beats, selected_style, parts, seed, chord_progression_roman, cache):
+    """Retorna (CachedSong, seed usada)."""
+    flags = [part in parts for part in PART_NAMES]
+    use_cache = seed is not None
+    if seed is None:
+        # Sorteada aqui para ser devolvida e reproduzir a música depois; o pedido em si
+        # não é repetível, então fica fora do cache
+        seed = random.randrange(2**31)
+    song = _get_worker_cache(*cache).generate_music_parts(
+        root_key, scale_type, bpm, num_beats, *flags, selected_style,
+        seed=seed, chord_progression_roman=chord_progression_roman, use_cache=use_cache
+    )
+    return song, seed
+
+
+def _generate_job(root_key, scale_type, bpm, num_beats, selected_style, parts, seed, chord_progression_roman, cache):
+    """Executado nos processos de trabalho, por isso é uma função de módulo. cache é (pasta, limite em bytes)."""
+    song, seed = _cached_song(root_key, scale_type, bpm, num_beats, selected_style, parts, seed, chord_progression_roman, cache)
+    all_midi_events = {part: list(events) for part, events in song.all_midi_events.items()}
+    return GenerationResult(all_midi_events, song.log_details, song.total_ticks, song.us_per_beat, seed,
+                            song.chord_progression_roman, dict(song.instrument_programs))
+
+
+def _generate_midi_job(root_key, scale_type, bpm, num_beats, selected_style, parts, seed, chord_progression_roman,
+                       cache, compact):
+    song, seed = _cached_song(root_key, scale_type, bpm, num_beats, selected_style, parts, seed, chord_progression_roman, cache)
+    if not compact:
+        return MidiResult(song.midi_bytes, seed) # Já codificado (e guardado) junto com a música
+    return MidiResult(_get_worker_generator().encode_midi_bytes(song.all_midi_events, bpm, song.instrument_programs, compact), seed)
+
+
+def _export_job(all_midi_events, bpm, instrument_programs, filename, compact):
+    data = _get_worker_generator().encode_midi_bytes(all_midi_events, bpm, instrument_programs, compact)
+    if filename:
+        with open(filename, 'wb') as f:
+            f.write(data)
+    return data
+
+
+class AsyncMusicGenerator:
+    """
+    Interface asyncio para o MusicGenerator. A geração roda em um pool de processos
+    compartilhado por todas as chamadas (ou no executor informado), e no máximo
+    max_concurrency trabalhos são enviados ao pool ao mesmo tempo: as demais chamadas
+    apenas aguardam, sem bloquear o loop de eventos, então um único loop pode manter
+    centenas de gerações em andamento. Gerações com seed passam pelo SongCache de cada
+    processo (em memória e na pasta cache_dir, compartilhada e limitada a max_disk_bytes;
+    None para só memória), então um pedido repetido não é gerado nem codificado de novo.
+    """
+    def __init__(self, max_workers=None, max_concurrency=None, executor=None, cache_dir=DEFAULT_SONG_CACHE_DIR,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        from music_generator import MusicGenerator
+        self.genre_configs = MusicGenerator().genre_configs
+        self.cache = (cache_dir, max_disk_bytes)
+
+        self._owns_executor = executor is None
+        if executor is None:
+            # 'spawn': processos criados por fork herdariam descritores abertos do processo
+            # principal (ex.: sockets de um servidor), mantendo-os abertos
+            executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        self.executor = executor
+        # Alguns trabalhos a mais que processos, para o pool nunca ficar ocioso entre duas chamadas
+        self.max_concurrency = max_concurrency or 2 * (max_workers or os.cpu_count() or 1)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _run(self, job, *args):
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, job, *args)
+
+    async def generate(self, root_key, scale_type, bpm, num_beats, selected_style,
+                       parts=DEFAULT_PARTS, seed=None, chord_progression_roman=None):
+        """Mesmo que MusicGenerator.generate_music_parts, com as partes informadas pelo nome. Retorna um GenerationResult."""
+        self._check_parts(parts)
+        return await self._run(_generate_job, root_key, scale_type, bpm, num_beats, selected_style,
+                               tuple(parts), seed, chord_progression_roman, self.cache)
+
+    async def generate_midi(self, root_key, scale_type, bpm, num_beats, selected_style,
+                            parts=DEFAULT_PARTS, seed=None, chord_progression_roman=None, compact=False):
+        """Gera e codifica em um único trabalho. Retorna um MidiResult (bytes do cache, se já gerado)."""
+        self._check_parts(parts)
+        return await self._run(_generate_midi_job, root_key, scale_type, bpm, num_beats, selected_style,
+                               tuple(parts), seed, chord_progression_roman, self.cache, compact)
+
+    async def export(self, all_midi_events, bpm, selected_style=None, instrument_programs=None, filename=None, compact=False):
+        """
+        Codifica as partes como arquivo MIDI e retorna os bytes (gravando também em filename, se informado).
+        compact=True usa a codificação mais compacta (ver MusicGenerator.build_midi_file).
+        """
+        if instrument_programs is None:
+            instrument_programs = self.genre_configs.get(selected_style, {}).get('instrument_programs', {})
+        return await self._run(_export_job, all_midi_events, bpm, instrument_programs, filename, compact)
+
+    async def iter_parts(self, root_key, scale_type, bpm, num_beats, selected_style,
+                         parts=DEFAULT_PARTS, seed=None, chord_progression_roman=None):
+        """
+        Gera cada parte em paralelo sobre a mesma progressão e produz PartResult à medida
+        que ficam prontas. Como em variations.VariationGenerator, a progressão e a seed de
+        cada parte vêm de um random.Random(seed): a mesma seed dá as mesmas partes, mas não
+        as mesmas notas de generate (lá todas as partes compartilham uma única sequência aleatória).
+        """
+        self._check_parts(parts)
+        rng = random.Random(seed)
+        if chord_progression_roman is None:
+            config = self.genre_configs.get(selected_style, self.genre_configs.get('Drum and Bass', {}))
+            chord_progression_roman = rng.choice(config.get('chords_progressions', [['i', 'VI', 'VII', 'III']]))
+        part_seeds = {part: rng.getrandbits(32) for part in PART_NAMES if part in parts}
+
+        async def one(part):
+            result = await self.generate(root_key, scale_type, bpm, num_beats, selected_style, (part,),
+                                         part_seeds[part], chord_progression_roman)
+            return PartResult(part, result.all_midi_events.get(part, []), part_seeds[part])
+
+        tasks = [asyncio.ensure_future(one(part)) for part in part_seeds]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks: # Consumidor parou antes do fim
+                task.cancel()
+
+    @staticmethod
+    def _check_parts(parts):
+        unknown_parts = set(parts) - set(PART_NAMES)
+        if unknown_parts:
+            raise ValueError(f"Partes desconhecidas: {', '.join(sorted(unknown_parts))}")
+
+    async def close(self):
+        if self._owns_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,126 @@
+# audio_preview.py
+
+import hashlib
+import io
+import json
+import os
+import threading
+
+import numpy as np
+
+from audio_renderer import DEFAULT_SAMPLE_RATE, RENDERER_VERSION, AudioRenderer, normalize, to_pcm16, write_wav
+from song_cache import SizeBoundedLRU
+
+DEFAULT_PREVIEW_DIR = os.path.join(os.getcwd(), "MIDIs_Gerados", ".cache", "previews")
+
+
+def song_hash(all_midi_events, tempo_map, instrument_programs, total_ticks=0, sample_rate=DEFAULT_SAMPLE_RATE):
+    """Hash (hex) de tudo o que determina o áudio renderizado de uma música."""
+    parts = sorted(part for part, events in all_midi_events.items() if events)
+    content = {
+        'renderer': RENDERER_VERSION,
+        'sample_rate': sample_rate,
+        'total_ticks': total_ticks,
+        'tempo': [tempo_map.ticks_per_beat, tempo_map.ticks, tempo_map.us_per_beat],
+        'programs': {part: instrument_programs.get(part, 0) for part in parts},
+        'events': {part: [list(event) for event in all_midi_events[part]] for part in parts},
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class PreviewCache:
+    """
+    Cache das prévias de áudio (mixagem PCM 16 bits) por hash da música: LRU em memória
+    limitado em bytes e, opcionalmente, arquivos .npy em disco, também limitados em bytes
+    (os acessados há mais tempo são removidos primeiro). Repetir, navegar pela música ou
+    alternar entre gerações recentes não precisa sintetizar de novo.
+    """
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, cache_dir=None,
+                 max_memory_bytes=256 * 1024 * 1024, max_disk_bytes=1024 * 1024 * 1024):
+        self.sample_rate = sample_rate
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = SizeBoundedLRU(max_memory_bytes)
+        self.renderer = AudioRenderer(sample_rate)
+        self.hits = 0
+        self.misses = 0
+        self._disk_lock = threading.Lock()
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_preview(self, all_midi_events, tempo_map, instrument_programs, total_ticks=0):
+        """Retorna (hash da música, amostras int16) renderizando apenas se não houver prévia em cache."""
+        key = song_hash(all_midi_events, tempo_map, instrument_programs, total_ticks, self.sample_rate)
+        pcm = self.lookup(key)
+        if pcm is not None:
+            self.hits += 1
+            return key, pcm
+
+        self.misses += 1
+        mix = self.renderer.render_song(all_midi_events, tempo_map, instrument_programs, total_ticks)
+        pcm = to_pcm16(normalize(mix))
+        pcm.setflags(write=False) # Compartilhado entre todos os acessos
+        self.memory.put(key, pcm, pcm.nbytes)
+        self._save_to_disk(key, pcm)
+        return key, pcm
+
+    def lookup(self, key):
+        """Prévia já renderizada (memória ou disco) ou None."""
+        pcm = self.memory.get(key)
+        if pcm is None:
+            pcm = self._load_from_disk(key)
+            if pcm is not None:
+                self.memory.put(key, pcm, pcm.nbytes)
+        return pcm
+
+    def wav_bytes(self, pcm, start_seconds=0.0):
+        """Arquivo WAV (em memória) da prévia a partir de start_seconds, para tocar ou navegar."""
+        start = min(len(pcm), max(0, int(start_seconds * self.sample_rate)))
+        buffer = io.BytesIO()
+        write_wav(buffer, pcm[start:], self.sample_rate)
+        return buffer.getvalue()
+
+    def clear(self):
+        """Limpa o cache em memória (o armazenamento em disco é mantido)."""
+        self.memory.clear()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            pcm = np.load(path, allow_pickle=False)
+            os.utime(path) # Marca como usada recentemente para a remoção por bytes
+        except (OSError, ValueError):
+            return None # Prévia ausente ou corrompida: trata como falta de cache
+        pcm.setflags(write=False)
+        return pcm
+
+    def _save_to_disk(self, key, pcm):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = path + '.tmp.npy'
+        with self._disk_lock:
+            np.save(tmp_path, pcm)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+
+    def _evict_disk(self):
+        # Chamado com self._disk_lock adquirido
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy') or name.endswith('.tmp.npy'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
@@ -0,0 +1,385 @@
+# audio_renderer.py
+
+import argparse
+import collections
+import os
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from midi_reader import load_song_events
+from song_cache import SizeBoundedLRU
+
+DEFAULT_SAMPLE_RATE = 44100
+RENDERER_VERSION = 1 # Incrementado quando o som do sintetizador muda (invalida prévias em cache)
+MAX_BLOCK_SAMPLES = 1 << 21 # Limite de amostras (notas x duração) sintetizadas de uma vez
+SLICE_MIX_MIN_SAMPLES = 8192 # A partir deste tamanho, mix_at_offsets soma nota a nota por fatias
+HEADROOM = 0.9 # Pico máximo da mixagem gravada no WAV
+
+# Timbre de uma família de programas General MIDI: osciladores (forma de onda, razão de
+# frequência, ganho) e envelope ADSR (segundos; sustain como nível de 0 a 1)
+Voice = collections.namedtuple('Voice', ['oscillators', 'attack', 'decay', 'sustain', 'release'])
+
+# Famílias GM (programa // 8) para os timbres do sintetizador
+FAMILY_VOICES = {
+    0: Voice((('triangle', 1.0, 0.7), ('sine', 2.0, 0.3)), 0.005, 0.4, 0.3, 0.2), # Piano
+    1: Voice((('sine', 1.0, 0.8), ('sine', 4.0, 0.2)), 0.001, 0.3, 0.0, 0.1), # Percussão cromática
+    2: Voice((('sine', 1.0, 0.5), ('sine', 2.0, 0.3), ('sine', 3.0, 0.2)), 0.01, 0.05, 0.9, 0.05), # Órgão
+    3: Voice((('triangle', 1.0, 0.6), ('saw', 1.0, 0.4)), 0.003, 0.25, 0.4, 0.1), # Guitarra
+    4: Voice((('saw', 1.0, 0.5), ('sine', 0.5, 0.5)), 0.005, 0.15, 0.7, 0.05), # Baixo
+    5: Voice((('saw', 1.0, 0.5), ('saw', 1.003, 0.5)), 0.15, 0.2, 0.8, 0.3), # Cordas
+    6: Voice((('saw', 1.0, 0.5), ('saw', 0.997, 0.5)), 0.2, 0.2, 0.8, 0.4), # Ensemble
+    7: Voice((('saw', 1.0, 0.7), ('square', 1.0, 0.3)), 0.03, 0.1, 0.8, 0.1), # Metais
+    8: Voice((('square', 1.0, 0.6), ('sine', 2.0, 0.4)), 0.02, 0.1, 0.8, 0.1), # Palhetas
+    9: Voice((('sine', 1.0, 0.8), ('triangle', 2.0, 0.2)), 0.03, 0.1, 0.8, 0.15), # Sopros
+    10: Voice((('saw', 1.0, 0.6), ('square', 1.005, 0.4)), 0.01, 0.1, 0.7, 0.1), # Synth lead
+    11: Voice((('saw', 1.0, 0.4), ('saw', 1.006, 0.4), ('sine', 0.5, 0.2)), 0.4, 0.5, 0.7, 0.8), # Synth pad
+    12: Voice((('triangle', 1.0, 0.6), ('square', 1.5, 0.4)), 0.05, 0.3, 0.5, 0.4), # Synth FX
+}
+DEFAULT_VOICE = Voice((('sine', 1.0, 1.0),), 0.01, 0.1, 0.8, 0.1)
+
+# Ganho de cada parte na mixagem (acordes e pads tocam várias notas ao mesmo tempo)
+PART_GAINS = {'bass': 0.7, 'chords': 0.25, 'lead': 0.4, 'pads': 0.2, 'arpeggio': 0.25, 'drums': 0.8}
+DRUM_PART = 'drums'
+
+DRUM_VELOCITY_BUCKETS = 16 # O timbre da bateria muda por faixas de 8 valores de velocity
+# Sons de bateria já sintetizados, compartilhados por todas as renderizações do processo:
+# (nota, faixa de velocity, taxa de amostragem) -> forma de onda com intensidade 1
+DRUM_VOICE_CACHE = SizeBoundedLRU(32 * 1024 * 1024)
+
+
+def _oscillator(waveform, cycles):
+    """Forma de onda avaliada em `cycles` (fase em número de ciclos)."""
+    if waveform == 'sine':
+        return np.sin(2 * np.pi * cycles)
+    fraction = cycles - np.floor(cycles)
+    if waveform == 'saw':
+        return 2.0 * fraction - 1.0
+    if waveform == 'square':
+        return np.where(fraction < 0.5, 1.0, -1.0)
+    if waveform == 'triangle':
+        return 4.0 * np.abs(fraction - 0.5) - 1.0
+    raise ValueError(f"Forma de onda desconhecida: {waveform}")
+
+
+def adsr_envelope(voice, held_samples, sample_rate):
+    """Envelope de uma nota mantida por held_samples amostras, seguido do release."""
+    attack = max(1, int(voice.attack * sample_rate))
+    decay = max(1, int(voice.decay * sample_rate))
+    release = max(1, int(voice.release * sample_rate))
+    t = np.arange(held_samples, dtype=np.float64)
+    held = np.where(t < attack, t / attack,
+                    np.maximum(voice.sustain, 1.0 - (1.0 - voice.sustain) * (t - attack) / decay))
+    end_level = held[-1] if held_samples else 0.0
+    return np.concatenate((held, end_level * (1.0 - np.arange(release) / release)))
+
+
+def voice_for_program(program):
+    return FAMILY_VOICES.get(program // 8, DEFAULT_VOICE)
+
+
+def midi_to_frequency(notes):
+    return 440.0 * 2.0 ** ((np.asarray(notes, dtype=np.float64) - 69) / 12)
+
+
+def note_table(events, tempo_map, sample_rate):
+    """
+    Pareia note_on/note_off (FIFO por nota, na ordem da lista) e retorna arrays de
+    (início em amostras, duração em amostras, nota, velocity).
+    """
+    pending = collections.defaultdict(collections.deque)
+    start_ticks, end_ticks, notes, velocities = [], [], [], []
+    for event_type, note, velocity, tick in events:
+        if event_type == 'note_on' and velocity > 0:
+            pending[note].append((tick, velocity))
+        elif pending[note]:
+            start_tick, on_velocity = pending[note].popleft()
+            start_ticks.append(start_tick)
+            end_ticks.append(max(start_tick, tick))
+            notes.append(note)
+            velocities.append(on_velocity)
+
+    starts = np.rint(tempo_map.ticks_to_seconds(np.maximum(0, start_ticks)) * sample_rate).astype(np.int64)
+    ends = np.rint(tempo_map.ticks_to_seconds(np.maximum(0, end_ticks)) * sample_rate).astype(np.int64)
+    return starts, np.maximum(1, ends - starts), np.asarray(notes, dtype=np.int64), np.asarray(velocities, dtype=np.float64)
+
+
+def mix_at_offsets(output, offsets, block):
+    """Soma cada linha de `block` em `output` a partir do respectivo deslocamento (sobreposições acumulam)."""
+    length = block.shape[1]
+    limit = len(output)
+    if length >= SLICE_MIX_MIN_SAMPLES:
+        # Linhas longas: uma soma por fatia é mais barata que montar os índices de todas as amostras
+        for offset, row in zip(offsets.tolist(), block):
+            end = min(limit, offset + length)
+            if end > offset:
+                output[offset:end] += row[:end - offset]
+        return
+    indices = offsets[:, None] + np.arange(length)
+    inside = indices < limit
+    np.add.at(output, indices[inside], block[inside])
+
+
+def _drum_waveform(note, velocity, sample_rate):
+    """Som percussivo (one-shot, intensidade 1) de uma nota do kit General MIDI usado por generate_drums."""
+    # Semente fixa por nota: o mesmo golpe soa igual em todas as renderizações
+    noise_rng = np.random.default_rng(note)
+    brightness = 0.5 + 0.5 * velocity / 127.0 # Golpes mais fortes soam mais brilhantes
+
+    def times(seconds):
+        return np.arange(int(seconds * sample_rate)) / sample_rate
+
+    if note in (35, 36): # Kick: seno com queda rápida de altura
+        t = times(0.35)
+        frequency = 50 + 100 * np.exp(-t * 35)
+        phase = np.cumsum(frequency) / sample_rate
+        wave_data = np.sin(2 * np.pi * phase) * np.exp(-t * 9)
+    elif note in (38, 40): # Snare: corpo tonal + ruído
+        t = times(0.25)
+        body = np.sin(2 * np.pi * 190 * t) * np.exp(-t * 25)
+        noise = noise_rng.uniform(-1, 1, len(t)) * np.exp(-t * 18) * brightness
+        wave_data = 0.5 * body + 0.6 * noise
+    elif note in (42, 44, 46): # Hi-hats: ruído agudo (diferença do ruído), aberto decai mais devagar
+        t = times(0.45 if note == 46 else 0.08)
+        noise = np.diff(noise_rng.uniform(-1, 1, len(t) + 1))
+        wave_data = 0.5 * noise * np.exp(-t * (9 if note == 46 else 60)) * brightness
+    elif note in (49, 51, 52, 55, 57, 59): # Pratos (crash, ride): parciais metálicas + ruído
+        t = times(1.2 if note == 49 else 0.6)
+        partials = sum(np.sin(2 * np.pi * frequency * t) for frequency in (3150, 4580, 5270, 6840))
+        noise = np.diff(noise_rng.uniform(-1, 1, len(t) + 1))
+        wave_data = (0.1 * partials + 0.4 * noise) * np.exp(-t * (3 if note == 49 else 6)) * brightness
+    else: # Demais percussões: ruído curto com um toque tonal
+        t = times(0.15)
+        wave_data = (0.5 * np.sin(2 * np.pi * (200 + 8 * note) * t)
+                     + 0.3 * noise_rng.uniform(-1, 1, len(t))) * np.exp(-t * 30)
+    return wave_data.astype(np.float32)
+
+
+def drum_velocity_bucket(velocity):
+    """Faixa de velocity do timbre da bateria (aceita um valor ou um array de velocities)."""
+    return np.minimum(DRUM_VELOCITY_BUCKETS - 1, np.asarray(velocity).astype(np.int64) * DRUM_VELOCITY_BUCKETS // 128)
+
+
+def cached_drum_voice(note, velocity, sample_rate):
+    """
+    Forma de onda (intensidade 1, somente leitura) do golpe, sintetizada uma única vez por
+    (nota, faixa de velocity, taxa de amostragem) e mantida no cache LRU do processo.
+    """
+    bucket = int(drum_velocity_bucket(velocity))
+    key = (note, bucket, sample_rate)
+    waveform = DRUM_VOICE_CACHE.get(key)
+    if waveform is None:
+        # Timbre sintetizado no centro da faixa de velocity
+        waveform = _drum_waveform(note, (bucket + 0.5) * 128 / DRUM_VELOCITY_BUCKETS, sample_rate)
+        waveform.setflags(write=False)
+        DRUM_VOICE_CACHE.put(key, waveform, waveform.nbytes)
+    return waveform
+
+
+class AudioRenderer:
+    """
+    Sintetizador offline que transforma as partes geradas em áudio (float32, mono).
+    As notas de uma parte são agrupadas por duração: cada grupo é sintetizado como uma
+    matriz (alturas x amostras), com o envelope calculado uma vez, e cada forma de onda é
+    somada na saída em todos os instantes em que a nota ocorre. A bateria usa sons
+    one-shot do cache de vozes de bateria (DRUM_VOICE_CACHE).
+    """
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+
+    def song_length_samples(self, all_midi_events, tempo_map, total_ticks=0):
+        last_tick = max([total_ticks] + [event[3] for events in all_midi_events.values() for event in events])
+        # Margem para o release das notas e o decaimento dos pratos
+        return int(tempo_map.tick_to_seconds(last_tick) * self.sample_rate) + 2 * self.sample_rate
+
+    def render_part(self, part_name, events, program, tempo_map, num_samples, output=None):
+        """Renderiza uma parte em `output` (float32 com num_samples amostras; criado se não for informado)."""
+        if output is None:
+            output = np.zeros(num_samples, dtype=np.float32)
+        else:
+            output[:] = 0.0
+        if not events:
+            return output
+        starts, durations, notes, velocities = note_table(events, tempo_map, self.sample_rate)
+        if part_name == DRUM_PART:
+            self._render_drums(output, starts, notes, velocities)
+        else:
+            self._render_pitched(output, starts, durations, notes, velocities, voice_for_program(program))
+        output *= PART_GAINS.get(part_name, 0.3)
+        return output
+
+    def render_song(self, all_midi_events, tempo_map, instrument_programs, total_ticks=0):
+        num_samples = self.song_length_samples(all_midi_events, tempo_map, total_ticks)
+        mix = np.zeros(num_samples, dtype=np.float32)
+        for part_name, events in all_midi_events.items():
+            mix += self.render_part(part_name, events, instrument_programs.get(part_name, 0), tempo_map, num_samples)
+        return mix
+
+    def _render_pitched(self, output, starts, durations, notes, velocities, voice):
+        amplitudes = velocities / 127.0
+        for duration in np.unique(durations).tolist():
+            members = np.flatnonzero(durations == duration)
+            envelope = adsr_envelope(voice, duration, self.sample_rate)
+            t = np.arange(len(envelope)) / self.sample_rate
+            # Notas repetidas (mesma altura e duração) usam a mesma forma de onda: sintetiza cada altura uma vez
+            pitches, pitch_index = np.unique(notes[members], return_inverse=True)
+            rows_per_block = max(1, MAX_BLOCK_SAMPLES // len(envelope))
+            for first in range(0, len(pitches), rows_per_block):
+                block_pitches = pitches[first:first + rows_per_block]
+                cycles = midi_to_frequency(block_pitches)[:, None] * t[None, :]
+                waves = np.zeros(cycles.shape)
+                for waveform, ratio, gain in voice.oscillators:
+                    waves += gain * _oscillator(waveform, cycles * ratio)
+                waves = (waves * envelope[None, :]).astype(np.float32)
+                for row, pitch_number in enumerate(range(first, first + len(block_pitches))):
+                    hits = members[pitch_index == pitch_number]
+                    mix_at_offsets(output, starts[hits], amplitudes[hits, None].astype(np.float32) * waves[row])
+
+    def _render_drums(self, output, starts, notes, velocities):
+        # Um grupo por (nota, faixa de velocity); os golpes de cada grupo ficam contíguos em `order`
+        hits = notes * DRUM_VELOCITY_BUCKETS + drum_velocity_bucket(velocities)
+        _, first_members, hit_groups, group_sizes = np.unique(hits, return_index=True, return_inverse=True, return_counts=True)
+        order = np.argsort(hit_groups, kind='stable')
+        for first_member, members in zip(first_members.tolist(), np.split(order, np.cumsum(group_sizes)[:-1])):
+            waveform = cached_drum_voice(int(notes[first_member]), velocities[first_member], self.sample_rate)
+            # Um golpe por linha: a forma de onda em cache escalada pela velocity de cada golpe
+            intensities = (velocities[members] / 127.0).astype(np.float32)
+            mix_at_offsets(output, starts[members], intensities[:, None] * waveform[None, :])
+
+
+def _render_stem_into_shared_memory(args):
+    """
+    Renderiza uma parte direto na sua linha do bloco de memória compartilhada dos stems.
+    Executado nos processos de trabalho, por isso é uma função de módulo.
+    """
+    shm_name, row, num_parts, num_samples, sample_rate, part_name, events, program, tempo_map = args
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        stems = np.ndarray((num_parts, num_samples), dtype=np.float32, buffer=shm.buf)
+        AudioRenderer(sample_rate).render_part(part_name, events, program, tempo_map, num_samples, output=stems[row])
+        del stems # Libera a visão antes de fechar o bloco
+    finally:
+        shm.close()
+    return part_name
+
+
+def render_stems(all_midi_events, tempo_map, instrument_programs, total_ticks=0,
+                 sample_rate=DEFAULT_SAMPLE_RATE, max_workers=None):
+    """
+    Renderiza cada parte em um processo e retorna ({parte: stem}, mixagem), com a mixagem
+    somada a partir dos stems. Os processos escrevem os stems em um único bloco de memória
+    compartilhada (uma linha por parte), então nenhum array de áudio é serializado.
+    A bateria é renderizada neste processo enquanto os outros trabalham, para usar (e manter
+    entre exportações) o DRUM_VOICE_CACHE do processo, que os processos do pool perderiam.
+    """
+    part_names = [part_name for part_name, events in all_midi_events.items() if events]
+    num_samples = AudioRenderer(sample_rate).song_length_samples(all_midi_events, tempo_map, total_ticks)
+    if not part_names:
+        return {}, np.zeros(num_samples, dtype=np.float32)
+
+    shm = shared_memory.SharedMemory(create=True, size=len(part_names) * num_samples * np.dtype(np.float32).itemsize)
+    try:
+        shared_stems = np.ndarray((len(part_names), num_samples), dtype=np.float32, buffer=shm.buf)
+        jobs = [
+            (shm.name, row, len(part_names), num_samples, sample_rate, part_name,
+             list(all_midi_events[part_name]), instrument_programs.get(part_name, 0), tempo_map)
+            for row, part_name in enumerate(part_names) if part_name != DRUM_PART
+        ]
+        executor = ProcessPoolExecutor(max_workers=max_workers or len(jobs)) if jobs else None
+        try:
+            pending = executor.map(_render_stem_into_shared_memory, jobs) if executor else []
+            if DRUM_PART in part_names:
+                AudioRenderer(sample_rate).render_part(DRUM_PART, all_midi_events[DRUM_PART], instrument_programs.get(DRUM_PART, 0),
+                                                       tempo_map, num_samples, output=shared_stems[part_names.index(DRUM_PART)])
+            list(pending)
+        finally:
+            if executor:
+                executor.shutdown()
+
+        stems = shared_stems.copy()
+        del shared_stems
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return dict(zip(part_names, stems)), stems.sum(axis=0)
+
+
+def normalize(samples, headroom=HEADROOM):
+    """Reduz o volume apenas se o pico passar de `headroom` (mixagens baixas não são amplificadas)."""
+    peak = float(np.max(np.abs(samples))) if len(samples) else 0.0
+    return samples * (headroom / peak) if peak > headroom else samples
+
+
+def to_pcm16(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+
+
+def write_wav(path, samples, sample_rate=DEFAULT_SAMPLE_RATE):
+    """
+    Grava áudio mono como WAV PCM de 16 bits. `path` pode ser um caminho ou um arquivo
+    aberto (ex.: io.BytesIO); `samples` pode ser float (-1 a 1) ou já em int16.
+    """
+    pcm = samples.astype('<i2', copy=False) if samples.dtype == np.int16 else to_pcm16(samples)
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+
+
+def render_song_to_wav(path, all_midi_events, tempo_map, instrument_programs, total_ticks=0,
+                       sample_rate=DEFAULT_SAMPLE_RATE):
+    renderer = AudioRenderer(sample_rate)
+    write_wav(path, normalize(renderer.render_song(all_midi_events, tempo_map, instrument_programs, total_ticks)),
+              sample_rate)
+    return path
+
+
+def render_stems_to_wav(output_dir, all_midi_events, tempo_map, instrument_programs, total_ticks=0,
+                        sample_rate=DEFAULT_SAMPLE_RATE, prefix='', max_workers=None):
+    """
+    Grava um WAV por parte (<prefix><parte>.wav) e a mixagem (<prefix>mix.wav). Todos usam o
+    mesmo ganho de normalização, para que a soma dos stems continue igual à mixagem.
+    Retorna a lista de arquivos.
+    """
+    stems, mix = render_stems(all_midi_events, tempo_map, instrument_programs, total_ticks, sample_rate, max_workers)
+    peak = float(np.max(np.abs(mix))) if len(mix) else 0.0
+    gain = HEADROOM / peak if peak > HEADROOM else 1.0
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for name, samples in list(stems.items()) + [('mix', mix)]:
+        path = os.path.join(output_dir, f"{prefix}{name}.wav")
+        write_wav(path, samples * gain, sample_rate)
+        written.append(path)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renderiza um arquivo MIDI em WAV com o sintetizador embutido.")
+    parser.add_argument('input', help="Arquivo MIDI de entrada.")
+    parser.add_argument('-o', '--output', help="Arquivo WAV de saída (padrão: mesmo nome com .wav).")
+    parser.add_argument('--genre', help="Usa os instrumentos deste gênero em genres_config.json.")
+    parser.add_argument('--sample-rate', type=int, default=DEFAULT_SAMPLE_RATE)
+    parser.add_argument('--stems', metavar='PASTA', help="Grava também um WAV por parte (e a mixagem) nesta pasta.")
+    args = parser.parse_args(argv)
+
+    from music_generator import MusicGenerator
+    instrument_programs = MusicGenerator().get_instrument_programs(args.genre)
+
+    all_midi_events, total_ticks, _, tempo_map = load_song_events(args.input)
+    output = args.output or os.path.splitext(args.input)[0] + '.wav'
+    if args.stems:
+        written = render_stems_to_wav(args.stems, all_midi_events, tempo_map, instrument_programs, total_ticks,
+                                      args.sample_rate)
+        print(f"{len(written)} arquivo(s) WAV gravado(s) em '{args.stems}'.")
+        return
+    render_song_to_wav(output, all_midi_events, tempo_map, instrument_programs, total_ticks, args.sample_rate)
+    print(f"Áudio gravado em '{output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# corpus_analyzer.py
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from midi_reader import EVENT_DTYPE, MappedMidiFile
+
+DEFAULT_CORPUS_DIRS = [os.path.join(os.getcwd(), "MIDI"), os.path.join(os.getcwd(), "MIDIs_Gerados")]
+DRUM_CHANNEL = 9
+VELOCITY_BINS = 16 # Faixas de 8 valores de velocity (0-7, 8-15, ..., 120-127)
+BEATS_PER_MEASURE = 4 # O gerador trabalha apenas com compassos 4/4
+
+# Colunas numéricas por arquivo gravadas no arquivo colunar (.npz)
+SCALAR_COLUMNS = (
+    'ticks_per_beat', 'length_ticks', 'num_measures', 'num_notes',
+    'density_mean', 'density_max', 'polyphony_max', 'polyphony_mean', 'velocity_mean'
+)
+
+
+def find_midi_files(directories):
+    paths = []
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            paths.extend(os.path.join(dirpath, name) for name in filenames if name.lower().endswith('.mid'))
+    return sorted(paths)
+
+
+def read_note_events(path):
+    """
+    Lê os eventos de nota de um arquivo MIDI em arrays paralelos:
+    (ticks absolutos, canais, notas, velocities, is_note_on) e o ticks_per_beat do arquivo.
+    """
+    with MappedMidiFile(path) as midi_file:
+        tracks = [midi_file.decode_track(index) for index in range(len(midi_file))]
+        ticks_per_beat = midi_file.ticks_per_beat
+
+    events = np.concatenate([track.events for track in tracks]) if tracks else np.empty(0, dtype=EVENT_DTYPE)
+    channel_event_counts = sum((track.channel_event_counts for track in tracks), np.zeros(16, dtype=np.int64))
+    return (events['tick'], events['channel'].astype(np.int8), events['note'].astype(np.int16),
+            events['velocity'].astype(np.int16), events['type'] == 1, channel_event_counts, ticks_per_beat)
+
+
+def analyze_note_events(ticks, channels, notes, velocities, is_on, channel_event_counts, ticks_per_beat):
+    """Calcula as estatísticas de um arquivo a partir dos arrays de eventos de nota."""
+    ticks_per_measure = ticks_per_beat * BEATS_PER_MEASURE
+    length_ticks = int(ticks.max()) if len(ticks) else 0
+    num_measures = max(1, -(-length_ticks // ticks_per_measure))
+
+    on_ticks = ticks[is_on]
+    on_notes = notes[is_on]
+    on_velocities = velocities[is_on]
+    pitched = channels[is_on] != DRUM_CHANNEL # Bateria não tem classe de altura
+
+    pitch_class_hist = np.bincount(on_notes[pitched] % 12, minlength=12)
+    velocity_hist = np.bincount(on_velocities // (128 // VELOCITY_BINS), minlength=VELOCITY_BINS)[:VELOCITY_BINS]
+    notes_per_measure = np.bincount(on_ticks // ticks_per_measure, minlength=num_measures)
+
+    # Polifonia: varredura ordenada por tick (note_off antes de note_on no mesmo tick)
+    order = np.lexsort((is_on, ticks))
+    steps = np.where(is_on[order], 1, -1)
+    active = np.cumsum(steps)
+    active_at_on = active[steps > 0]
+
+    return {
+        'ticks_per_beat': ticks_per_beat,
+        'length_ticks': length_ticks,
+        'num_measures': num_measures,
+        'num_notes': int(len(on_ticks)),
+        'density_mean': float(notes_per_measure.mean()),
+        'density_max': int(notes_per_measure.max()) if len(notes_per_measure) else 0,
+        'polyphony_max': int(active.max()) if len(active) else 0,
+        'polyphony_mean': float(active_at_on.mean()) if len(active_at_on) else 0.0,
+        'velocity_mean': float(on_velocities.mean()) if len(on_velocities) else 0.0,
+        'pitch_class_hist': pitch_class_hist,
+        'velocity_hist': velocity_hist,
+        'channel_event_counts': channel_event_counts,
+    }
+
+
+def analyze_file(path):
+    """Analisa um arquivo. Função de módulo para poder rodar nos processos de trabalho."""
+    try:
+        stats = analyze_note_events(*read_note_events(path))
+    except Exception as e:
+        return {'path': path, 'error': str(e)}
+    stats['path'] = path
+    return stats
+
+
+def analyze_corpus(paths, max_workers=None):
+    """
+    Analisa todos os arquivos em um pool de processos e retorna (colunas, erros), onde
+    colunas é um dicionário nome -> array NumPy com uma linha por arquivo analisado.
+    """
+    results, errors = [], []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for stats in executor.map(analyze_file, paths, chunksize=max(1, len(paths) // 64)):
+            if 'error' in stats:
+                errors.append((stats['path'], stats['error']))
+            else:
+                results.append(stats)
+
+    columns = {'path': np.asarray([stats['path'] for stats in results], dtype=str)}
+    for name in SCALAR_COLUMNS:
+        columns[name] = np.asarray([stats[name] for stats in results])
+    columns['pitch_class_hist'] = np.asarray([stats['pitch_class_hist'] for stats in results], dtype=np.int64).reshape(-1, 12)
+    columns['velocity_hist'] = np.asarray([stats['velocity_hist'] for stats in results], dtype=np.int64).reshape(-1, VELOCITY_BINS)
+    columns['channel_event_counts'] = np.asarray([stats['channel_event_counts'] for stats in results], dtype=np.int64).reshape(-1, 16)
+    return columns, errors
+
+
+def aggregate(columns):
+    """Estatísticas agregadas de todo o corpus a partir das colunas por arquivo."""
+    num_notes = columns['num_notes']
+    total_notes = int(num_notes.sum())
+    pitch_class_hist = columns['pitch_class_hist'].sum(axis=0)
+    return {
+        'num_files': int(len(num_notes)),
+        'total_notes': total_notes,
+        'pitch_class_distribution': pitch_class_hist / max(1, pitch_class_hist.sum()),
+        'velocity_hist': columns['velocity_hist'].sum(axis=0),
+        'channel_event_counts': columns['channel_event_counts'].sum(axis=0),
+        # Média de notas por compasso ponderada pelo número de compassos de cada arquivo
+        'density_mean': float(total_notes / max(1, columns['num_measures'].sum())),
+        'polyphony_max': int(columns['polyphony_max'].max()) if len(num_notes) else 0,
+    }
+
+
+def save_columns(columns, output_path):
+    np.savez_compressed(output_path, **columns)
+
+
+def load_columns(input_path):
+    with np.load(input_path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def scale_fit(pitch_class_hist, scale_intervals):
+    """
+    Fração das notas que cabem na melhor tônica para a escala dada, para cada arquivo.
+    Retorna (fit, tônica em classe de altura) com um valor por linha do histograma.
+    """
+    pitch_class_hist = np.atleast_2d(pitch_class_hist)
+    masks = np.zeros((12, 12), dtype=np.int64) # Uma máscara de escala por tônica
+    for root in range(12):
+        masks[root, [(root + interval) % 12 for interval in scale_intervals]] = 1
+    in_scale = pitch_class_hist @ masks.T
+    totals = np.maximum(1, pitch_class_hist.sum(axis=1, keepdims=True))
+    fit = in_scale / totals
+    return fit.max(axis=1), fit.argmax(axis=1)
+
+
+def expected_drum_density(genre_config):
+    """Média de batidas por compasso dos padrões de bateria configurados para o gênero."""
+    total = 0.0
+    for patterns in genre_config.get('drum_patterns', {}).values():
+        if patterns:
+            total += sum(len(pattern) for pattern in patterns) / len(patterns)
+    return total
+
+
+def qa_against_genre(columns, genre_name, genre_configs, scales, min_scale_fit=0.9, density_tolerance=0.5):
+    """
+    Confere cada arquivo contra a definição do gênero em genres_config.json: aderência
+    à escala padrão do gênero e densidade de bateria próxima à dos padrões configurados.
+    Retorna uma lista de (caminho, problema).
+    """
+    genre_config = genre_configs[genre_name]
+    scale_type = genre_config.get('default_scale_type', 'Minor')
+    fit, _ = scale_fit(columns['pitch_class_hist'], scales[scale_type]['intervals'])
+
+    drum_events = columns['channel_event_counts'][:, DRUM_CHANNEL]
+    has_drums = drum_events > 0
+    # Cada batida gera um note_on e um note_off no canal de bateria
+    drum_density = drum_events / 2 / np.maximum(1, columns['num_measures'])
+    expected_density = expected_drum_density(genre_config)
+
+    problems = []
+    pitched_notes = columns['pitch_class_hist'].sum(axis=1) > 0
+    for index in np.flatnonzero(pitched_notes & (fit < min_scale_fit)):
+        problems.append((columns['path'][index], f"apenas {fit[index]:.0%} das notas na escala {scale_type}"))
+    if expected_density > 0:
+        deviation = np.abs(drum_density - expected_density) / expected_density
+        for index in np.flatnonzero(has_drums & (deviation > density_tolerance)):
+            problems.append((columns['path'][index],
+                             f"densidade de bateria {drum_density[index]:.1f}/compasso (esperado ~{expected_density:.1f})"))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analisa um corpus de arquivos MIDI em paralelo.")
+    parser.add_argument('directories', nargs='*', default=None, help="Pastas a analisar (padrão: MIDI/ e MIDIs_Gerados/).")
+    parser.add_argument('-o', '--output', default='corpus_stats.npz', help="Arquivo colunar (.npz) de saída.")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--genre', help="Confere os arquivos contra a definição deste gênero em genres_config.json.")
+    args = parser.parse_args(argv)
+
+    paths = find_midi_files(args.directories or DEFAULT_CORPUS_DIRS)
+    if not paths:
+        print("Nenhum arquivo MIDI encontrado.")
+        return
+
+    columns, errors = analyze_corpus(paths, max_workers=args.workers)
+    save_columns(columns, args.output)
+    summary = aggregate(columns)
+
+    print(f"{summary['num_files']} arquivo(s) analisado(s), {summary['total_notes']} notas. Resultados em '{args.output}'.")
+    print(f"  Notas por compasso (média): {summary['density_mean']:.2f}")
+    print(f"  Polifonia máxima: {summary['polyphony_max']}")
+    pitch_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+    distribution = ", ".join(f"{name} {share:.0%}" for name, share in zip(pitch_names, summary['pitch_class_distribution']))
+    print(f"  Classes de altura: {distribution}")
+    for path, error in errors:
+        print(f"  ERRO ao ler '{path}': {error}", file=sys.stderr)
+
+    if args.genre:
+        from music_generator import MusicGenerator
+        generator = MusicGenerator()
+        if args.genre not in generator.genre_configs:
+            print(f"Gênero '{args.genre}' não encontrado em genres_config.json.", file=sys.stderr)
+            return
+        problems = qa_against_genre(columns, args.genre, generator.genre_configs, generator.scales)
+        print(f"QA contra '{args.genre}': {len(problems)} problema(s).")
+        for path, problem in problems:
+            print(f"  {path}: {problem}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# generation_client.py
+
+import argparse
+import asyncio
+import json
+import time
+
+from generation_server import DEFAULT_HOST, DEFAULT_PORT
+
+
+async def request(host, port, method, path, data=None, timeout=60.0):
+    """Faz uma requisição HTTP simples ao serviço. Retorna (status, cabeçalhos, corpo em bytes)."""
+    body = json.dumps(data).encode('utf-8') if data is not None else b""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout) # O servidor fecha a conexão ao terminar
+    finally:
+        writer.close()
+
+    head, _, payload = response.partition(b"\r\n\r\n")
+    lines = head.decode('latin-1').split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status, headers, payload
+
+
+async def load_test(host, port, total_requests=100, concurrency=16, path="/generate", payload=None, distinct_seeds=8):
+    """
+    Dispara total_requests pedidos com no máximo `concurrency` simultâneos. Os pedidos
+    usam apenas `distinct_seeds` seeds diferentes, para exercitar a junção de pedidos
+    idênticos no servidor. Retorna um resumo com latências, 503s e vazão.
+    """
+    payload = dict(payload or {'genre': 'Drum and Bass', 'num_measures': 8})
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async def one(index):
+        data = dict(payload, seed=index % distinct_seeds) if distinct_seeds else payload
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                status, _, _ = await request(host, port, "POST", path, data)
+            except (OSError, asyncio.TimeoutError):
+                status = 0 # Falha de conexão
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] if latencies else 0.0
+
+    return {
+        'requests': total_requests,
+        'elapsed_s': elapsed,
+        'throughput_rps': total_requests / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(50) * 1000,
+        'p99_ms': percentile(99) * 1000,
+        'statuses': statuses,
+        'rejected_503': statuses.get(503, 0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga do serviço de geração de música.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--path', default="/generate", choices=["/generate", "/export"])
+    parser.add_argument('--genre', default="Drum and Bass")
+    parser.add_argument('--measures', type=int, default=8)
+    parser.add_argument('--distinct-seeds', type=int, default=8,
+                        help="Quantidade de seeds diferentes (0 = sem seed, nenhum pedido é juntado).")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(load_test(
+        args.host, args.port, args.requests, args.concurrency, args.path,
+        {'genre': args.genre, 'num_measures': args.measures}, args.distinct_seeds
+    ))
+    print(f"{summary['requests']} pedidos em {summary['elapsed_s']:.2f} s "
+          f"({summary['throughput_rps']:.1f} pedidos/s)")
+    print(f"Latência p50: {summary['p50_ms']:.1f} ms | p99: {summary['p99_ms']:.1f} ms")
+    print(f"Status: {summary['statuses']} | 503: {summary['rejected_503']}")
+
+
+if __name__ == "__main__":
+    main()
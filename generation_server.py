@@ -0,0 +1,305 @@
+# generation_server.py
+
+import argparse
+import asyncio
+import itertools
+import json
+from http import HTTPStatus
+
+from async_generator import DEFAULT_PARTS, AsyncMusicGenerator
+from midi_parts import PART_NAMES
+from song_cache import DEFAULT_MAX_DISK_BYTES, DEFAULT_SONG_CACHE_DIR
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_MEASURES = 1024
+RETRY_AFTER_SECONDS = 1
+
+
+class RequestError(Exception):
+    """Erro do cliente (parâmetros inválidos), respondido com o status HTTP informado."""
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class GenerationServer:
+    """
+    Serviço HTTP local (asyncio, apenas biblioteca padrão) sobre o MusicGenerator.
+
+    Endpoints (corpo JSON):
+      POST /generate         -> partes geradas, seed e progressão usadas
+      POST /regenerate-part  -> nova versão de uma parte ("part") sobre a progressão informada
+      POST /export           -> arquivo MIDI (audio/midi) gerado a partir dos parâmetros ou de "all_midi_events"
+                                ("compact": true para a codificação mais compacta)
+      GET  /health           -> estatísticas do serviço
+
+    A geração roda em um pool de processos. Pedidos idênticos com seed (determinísticos)
+    que chegam enquanto um igual está em andamento compartilham o mesmo resultado (sem
+    seed, a seed é sorteada no processo de trabalho e devolvida, fora do cache), e
+    acima de max_pending trabalhos distintos em andamento o serviço responde 503.
+    Pedidos repetidos depois disso vêm do cache de músicas dos processos (cache_dir em
+    disco, limitado a max_disk_bytes).
+    """
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, max_workers=None, max_pending=64,
+                 cache_dir=DEFAULT_SONG_CACHE_DIR, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.generator = None
+        self.genre_configs = None
+        self.stats = {'requests': 0, 'jobs': 0, 'coalesced': 0, 'rejected': 0, 'errors': 0}
+        self._in_flight = {} # chave do pedido -> asyncio.Task do trabalho
+        self._unique_keys = itertools.count() # Chaves de pedidos que nunca são juntados (sem seed)
+        self._server = None
+
+    async def start(self):
+        # O pool usa 'spawn': processos criados por fork herdariam os sockets das conexões
+        # abertas e o cliente não veria a conexão fechar ao fim da resposta
+        self.generator = AsyncMusicGenerator(max_workers=self.max_workers, cache_dir=self.cache_dir,
+                                             max_disk_bytes=self.max_disk_bytes)
+        self.genre_configs = self.generator.genre_configs
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1] # Porta real quando port=0
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.generator is not None:
+            await self.generator.close()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                method, path, body = await self._read_request(reader)
+                self.stats['requests'] += 1
+                status, content_type, payload, extra_headers = await self._dispatch(method, path, body)
+            except RequestError as e:
+                status, content_type, payload, extra_headers = self._json_response(e.status, {'error': str(e)}, e.headers)
+            except Exception as e:
+                self.stats['errors'] += 1
+                status, content_type, payload, extra_headers = self._json_response(
+                    HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"Erro interno: {e}"})
+            await self._write_response(writer, status, content_type, payload, extra_headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass # Cliente desconectou
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise RequestError("Cabeçalho muito grande.", HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+        if len(head) > MAX_HEADER_BYTES:
+            raise RequestError("Cabeçalho muito grande.", HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, path, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise RequestError("Linha de requisição inválida.")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0) or 0)
+        if length > MAX_BODY_BYTES:
+            raise RequestError("Corpo da requisição muito grande.", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path.split("?", 1)[0], body
+
+    async def _write_response(self, writer, status, content_type, payload, extra_headers):
+        status = HTTPStatus(status)
+        head = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(payload)}", "Connection: close"]
+        head.extend(f"{name}: {value}" for name, value in extra_headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + payload)
+        await writer.drain()
+
+    @staticmethod
+    def _json_response(status, data, extra_headers=None):
+        return status, "application/json", json.dumps(data).encode('utf-8'), extra_headers or {}
+
+    async def _dispatch(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return self._json_response(HTTPStatus.OK, dict(self.stats, in_flight=len(self._in_flight)))
+        if method != "POST" or path not in ("/generate", "/regenerate-part", "/export"):
+            raise RequestError("Endpoint não encontrado.", HTTPStatus.NOT_FOUND)
+
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise RequestError("Corpo JSON inválido.")
+        if not isinstance(request, dict):
+            raise RequestError("O corpo deve ser um objeto JSON.")
+
+        if path == "/generate":
+            result = await self._submit(self._generate, self._generation_params(request))
+            return self._json_response(HTTPStatus.OK, result)
+
+        if path == "/regenerate-part":
+            part = request.get('part')
+            if part not in PART_NAMES:
+                raise RequestError(f"Parte inválida: {part!r}.")
+            if not request.get('chord_progression_roman'):
+                raise RequestError("Informe a 'chord_progression_roman' da música para regenerar uma parte.")
+            params = self._generation_params(dict(request, parts=[part]))
+            result = await self._submit(self._generate, params)
+            return self._json_response(HTTPStatus.OK, {'part': part, 'seed': result['seed'],
+                                                        'events': result['parts'].get(part, [])})
+
+        params = self._generation_params(request)
+        params['compact'] = bool(request.get('compact', False))
+        if 'all_midi_events' in request:
+            # Só codifica os eventos recebidos: a seed e os demais parâmetros da geração não entram
+            params = {'genre': params['genre'], 'bpm': params['bpm'], 'compact': params['compact'],
+                      'all_midi_events': self._validate_events(request['all_midi_events'])}
+            midi_bytes = await self._submit(self._export_events, params)
+            return HTTPStatus.OK, "audio/midi", midi_bytes, {}
+        result = await self._submit(self._export, params)
+        return HTTPStatus.OK, "audio/midi", result.midi_bytes, {'X-Seed': str(result.seed)}
+
+    async def _generate(self, params):
+        result = await self.generator.generate(
+            params['root_key'], params['scale_type'], params['bpm'], params['num_measures'] * 4, params['genre'],
+            params['parts'], params['seed'], params['chord_progression_roman']
+        )
+        return {
+            'seed': result.seed,
+            'chord_progression_roman': result.chord_progression_roman,
+            'total_ticks': result.total_ticks,
+            'us_per_beat': result.us_per_beat,
+            'instrument_programs': result.instrument_programs,
+            'parts': result.all_midi_events,
+            'log': result.log_details,
+        }
+
+    async def _export(self, params):
+        return await self.generator.generate_midi(
+            params['root_key'], params['scale_type'], params['bpm'], params['num_measures'] * 4, params['genre'],
+            params['parts'], params['seed'], params['chord_progression_roman'], compact=params['compact']
+        )
+
+    async def _export_events(self, params):
+        return await self.generator.export(params['all_midi_events'], params['bpm'], params['genre'], compact=params['compact'])
+
+    def _generation_params(self, request):
+        """Valida o pedido e completa os valores padrão a partir da configuração do gênero."""
+        genre = request.get('genre', 'Drum and Bass')
+        if genre not in self.genre_configs:
+            raise RequestError(f"Gênero desconhecido: {genre!r}.")
+        config = self.genre_configs[genre]
+
+        parts = request.get('parts', list(DEFAULT_PARTS))
+        if not isinstance(parts, list) or not set(parts) <= set(PART_NAMES):
+            raise RequestError(f"'parts' deve ser uma lista com partes entre: {', '.join(PART_NAMES)}.")
+        try:
+            bpm = int(request.get('bpm', config.get('default_bpm', 120)))
+            num_measures = int(request.get('num_measures', 16))
+            seed = request.get('seed')
+            seed = None if seed is None else int(seed) # Sem seed: sorteada no processo de trabalho
+        except (TypeError, ValueError):
+            raise RequestError("'bpm', 'num_measures' e 'seed' devem ser inteiros.")
+        if not 20 <= bpm <= 400 or not 1 <= num_measures <= MAX_MEASURES:
+            raise RequestError(f"'bpm' deve estar entre 20 e 400 e 'num_measures' entre 1 e {MAX_MEASURES}.")
+
+        progression = request.get('chord_progression_roman')
+        if progression is not None and (not isinstance(progression, list) or not progression):
+            raise RequestError("'chord_progression_roman' deve ser uma lista de acordes.")
+
+        return {
+            'genre': genre,
+            'root_key': request.get('root_key', 'A'),
+            'scale_type': request.get('scale_type', config.get('default_scale_type', 'Minor')),
+            'bpm': bpm,
+            'num_measures': num_measures,
+            'parts': sorted(parts),
+            'seed': seed,
+            'chord_progression_roman': progression,
+        }
+
+    @staticmethod
+    def _validate_events(all_midi_events):
+        if not isinstance(all_midi_events, dict):
+            raise RequestError("'all_midi_events' deve ser um objeto {parte: eventos}.")
+        try:
+            return {part: [(str(event_type), int(note), int(velocity), int(tick))
+                           for event_type, note, velocity, tick in events]
+                    for part, events in all_midi_events.items() if part in PART_NAMES}
+        except (TypeError, ValueError):
+            raise RequestError("Eventos devem ser listas [tipo, nota, velocity, tick].")
+
+    async def _submit(self, job, params):
+        """
+        Executa job(params). Pedidos iguais em andamento compartilham a mesma tarefa (só os
+        determinísticos: com seed ou com os eventos prontos); acima de max_pending trabalhos
+        distintos, responde 503 em vez de enfileirar.
+        """
+        if params.get('seed') is not None or 'all_midi_events' in params:
+            key = json.dumps([job.__name__, params], sort_keys=True)
+        else:
+            key = next(self._unique_keys)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            if len(self._in_flight) >= self.max_pending:
+                self.stats['rejected'] += 1
+                raise RequestError("Serviço ocupado, tente novamente.", HTTPStatus.SERVICE_UNAVAILABLE,
+                                   {'Retry-After': RETRY_AFTER_SECONDS})
+            self.stats['jobs'] += 1
+            task = asyncio.ensure_future(job(params))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        try:
+            return await asyncio.shield(task) # Um cliente que desconecta não cancela o trabalho dos demais
+        except (KeyError, ValueError) as e:
+            # Combinações inválidas (ex.: acorde que não existe na escala escolhida)
+            raise RequestError(f"Parâmetros incompatíveis: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço HTTP local de geração de música.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-pending', type=int, default=64, help="Trabalhos em andamento antes de responder 503.")
+    parser.add_argument('--cache-dir', default=DEFAULT_SONG_CACHE_DIR, help="Pasta do cache de músicas geradas.")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_DISK_BYTES // (1024 * 1024),
+                        help="Tamanho máximo do cache em disco (MB); as entradas usadas há mais tempo saem primeiro.")
+    parser.add_argument('--no-disk-cache', action='store_true', help="Mantém o cache de músicas só em memória.")
+    args = parser.parse_args(argv)
+
+    async def run():
+        server = await GenerationServer(args.host, args.port, args.workers, args.max_pending,
+                                        None if args.no_disk_cache else args.cache_dir,
+                                        args.cache_max_mb * 1024 * 1024).start()
+        print(f"Servindo em http://{server.host}:{server.port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# groove.py
+
+import collections
+
+import numpy as np
+
+GROOVE_REFERENCE_TICKS_PER_BEAT = 480 # Resolução em que os offsets dos modelos estão escritos
+
+# Modelos de groove embutidos, referenciados por nome no genres_config.json ("groove": {"template": ...}).
+#   swing: porcentagem da dupla de subdivisões ocupada pela primeira (50 = reto, 66 = tercina),
+#          com subdivision 8 (colcheias) ou 16 (semicolcheias)
+#   offsets: mapa estilo MPC com o deslocamento (ticks a 480 por batida) de cada passo da batida
+#   velocity: multiplicador de velocity de cada passo (opcional, acentos do groove)
+GROOVE_TEMPLATES = {
+    'straight': {'offsets': [0]},
+    'swing16_54': {'swing': 54, 'subdivision': 16},
+    'swing16_56': {'swing': 56, 'subdivision': 16},
+    'swing16_58': {'swing': 58, 'subdivision': 16},
+    'swing8_62': {'swing': 62, 'subdivision': 8},
+    'mpc16_laid_back': {'offsets': [0, 10, 4, 14], 'velocity': [1.0, 0.85, 0.95, 0.8]},
+    'mpc16_push': {'offsets': [0, -6, 0, -8], 'velocity': [1.0, 0.9, 1.0, 0.9]},
+}
+
+# Tabelas de consulta indexadas pelo tick dentro da batida (0 a ticks_per_beat - 1)
+GrooveTable = collections.namedtuple('GrooveTable', ['tick_offsets', 'velocity_scales'])
+
+
+def resolve_template(groove):
+    """Modelo (dicionário) a partir do nome de um modelo embutido ou de um modelo escrito por extenso."""
+    if isinstance(groove, str):
+        if groove not in GROOVE_TEMPLATES:
+            raise ValueError(f"Groove desconhecido: {groove!r}")
+        return GROOVE_TEMPLATES[groove]
+    return groove
+
+
+def compile_groove(template, ticks_per_beat):
+    """
+    Compila o modelo em um GrooveTable. Os pontos da grade de cada batida recebem o
+    deslocamento do modelo e os ticks entre eles são interpolados linearmente, então a
+    ordem dos eventos é preservada (uma nota nunca termina antes de começar).
+    """
+    if 'swing' in template:
+        steps_per_beat = template.get('subdivision', 16) // 4
+        pair_ticks = 2 * GROOVE_REFERENCE_TICKS_PER_BEAT / steps_per_beat
+        delay = (template['swing'] / 100 - 0.5) * pair_ticks # Atraso da segunda subdivisão da dupla
+        offsets = [0, delay] * (steps_per_beat // 2) if steps_per_beat >= 2 else [0]
+    else:
+        offsets = list(template['offsets'])
+    steps = len(offsets)
+    offsets = np.asarray(offsets, dtype=np.float64) * ticks_per_beat / GROOVE_REFERENCE_TICKS_PER_BEAT
+    step_ticks = ticks_per_beat / steps
+
+    # Cada passo deslocado precisa continuar depois do anterior (inclusive na volta para a próxima batida)
+    if np.any(step_ticks + np.diff(np.r_[offsets, offsets[0]]) <= 0):
+        raise ValueError("Deslocamentos do groove maiores que o espaço entre os passos.")
+
+    ticks_in_beat = np.arange(ticks_per_beat)
+    grid = np.arange(steps + 1) * step_ticks
+    tick_offsets = np.rint(np.interp(ticks_in_beat, grid, np.r_[offsets, offsets[0]])).astype(np.int64)
+
+    velocity = np.asarray(template.get('velocity', [1.0] * steps), dtype=np.float64)
+    nearest_step = np.rint(ticks_in_beat / step_ticks).astype(np.int64) % len(velocity)
+    return GrooveTable(tick_offsets, velocity[nearest_step])
+
+
+def apply_groove(all_midi_events, table, parts=None):
+    """
+    Aplica o groove a todas as partes (ou às listadas em `parts`) em uma única passada
+    vetorizada: cada evento é deslocado pelo offset do seu tick dentro da batida e cada
+    note_on tem a velocity escalada. Custo O(eventos); as notas não são geradas de novo.
+    Retorna um novo dicionário {parte: eventos}.
+    """
+    ticks_per_beat = len(table.tick_offsets)
+    selected = [part for part, events in all_midi_events.items() if events and (parts is None or part in parts)]
+    result = dict(all_midi_events)
+    if not selected:
+        return result
+
+    columns = [list(zip(*all_midi_events[part])) for part in selected]
+    lengths = [len(event_types) for event_types, _, _, _ in columns]
+    event_types = [event_type for part_columns in columns for event_type in part_columns[0]]
+    count = len(event_types)
+    is_on = np.fromiter(map('note_on'.__eq__, event_types), dtype=bool, count=count)
+    ticks = np.fromiter((tick for part_columns in columns for tick in part_columns[3]), dtype=np.int64, count=count)
+    velocities = np.fromiter((velocity for part_columns in columns for velocity in part_columns[2]), dtype=np.int64, count=count)
+
+    position = ticks % ticks_per_beat
+    ticks = np.maximum(0, ticks + table.tick_offsets[position])
+    scaled = np.clip(np.rint(velocities * table.velocity_scales[position]), 1, 127).astype(np.int64)
+    velocities = np.where(is_on, scaled, velocities)
+
+    ticks, velocities = ticks.tolist(), velocities.tolist()
+    start = 0
+    for part, part_columns, length in zip(selected, columns, lengths):
+        end = start + length
+        result[part] = list(zip(part_columns[0], part_columns[1], velocities[start:end], ticks[start:end]))
+        start = end
+    return result
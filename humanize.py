@@ -0,0 +1,114 @@
+# humanize.py
+
+import collections
+
+import numpy as np
+
+# Variações aplicadas a uma parte (em ticks e em pontos de velocity, sorteadas uniformemente em +/- o valor).
+#   shared_onsets: notas que começam no mesmo tick (um acorde) recebem o mesmo deslocamento de timing e de duração
+#   clamp_to_measure: o início da nota não volta para antes do início do seu compasso
+HumanizeSettings = collections.namedtuple(
+    'HumanizeSettings',
+    ['timing_ticks', 'velocity', 'duration_ticks', 'min_duration_ticks', 'min_velocity', 'max_velocity',
+     'shared_onsets', 'clamp_to_measure'],
+    defaults=(0, 0, 0, 30, 1, 127, False, False)
+)
+
+
+def part_settings(humanize_config, part):
+    """
+    HumanizeSettings de uma parte a partir da chave "humanize" de um gênero no
+    genres_config.json: valores em "default", sobrescritos pelos de "parts"[parte].
+    Retorna None se a parte não tiver nenhuma variação configurada.
+    """
+    values = dict(humanize_config.get('default', {}))
+    values.update(humanize_config.get('parts', {}).get(part, {}))
+    settings = HumanizeSettings(**values)
+    if not (settings.timing_ticks or settings.velocity or settings.duration_ticks):
+        return None
+    return settings
+
+
+def pair_events(is_on, notes):
+    """
+    Índices (note_on, note_off) de cada nota de uma lista de eventos de uma parte.
+    Os geradores produzem pares consecutivos (note_on, note_off) da mesma nota: esse caso
+    é reconhecido de uma vez. Caso contrário, o k-ésimo note_on de cada altura é pareado
+    com o k-ésimo note_off dessa altura, na ordem da lista (eventos sem par ficam de fora).
+    """
+    count = len(is_on)
+    if count % 2 == 0 and is_on[0::2].all() and not is_on[1::2].any() and (notes[0::2] == notes[1::2]).all():
+        return np.arange(0, count, 2), np.arange(1, count, 2)
+
+    # Ordem estável por altura: dentro de cada altura, os eventos continuam na ordem da lista
+    order = np.argsort(notes, kind='stable')
+    sorted_notes, sorted_on = notes[order], is_on[order]
+    group_start = np.r_[True, sorted_notes[1:] != sorted_notes[:-1]]
+    group_id = np.cumsum(group_start) - 1
+
+    def rank_in_group(mask):
+        # Posição de cada evento marcado entre os eventos marcados da mesma altura
+        cumulative = np.cumsum(mask)
+        first_in_group = cumulative[group_start] - mask[group_start]
+        return cumulative - first_in_group[group_id] - 1
+
+    on_rank = rank_in_group(sorted_on)
+    off_rank = rank_in_group(~sorted_on)
+    # Chave (grupo, posição) de cada note_on e note_off; o pareamento é a interseção das chaves
+    width = count + 1
+    on_keys = group_id[sorted_on] * width + on_rank[sorted_on]
+    off_keys = group_id[~sorted_on] * width + off_rank[~sorted_on]
+    _, on_positions, off_positions = np.intersect1d(on_keys, off_keys, assume_unique=True, return_indices=True)
+    return order[sorted_on][on_positions], order[~sorted_on][off_positions]
+
+
+def humanize_arrays(ticks, velocities, on_index, off_index, settings, np_rng, measure_ticks=None):
+    """
+    Aplica as variações em arrays (ticks e velocities de todos os eventos) com os pares
+    de pair_events. O note_off acompanha o deslocamento do seu note_on e a duração nunca
+    fica abaixo de min_duration_ticks (nem do valor original, se já era menor).
+    clamp_to_measure usa measure_ticks. Retorna novos arrays.
+    """
+    ticks = ticks.copy()
+    velocities = velocities.copy()
+    num_notes = len(on_index)
+    if num_notes == 0:
+        return ticks, velocities
+
+    starts = ticks[on_index]
+    durations = ticks[off_index] - starts
+    if settings.shared_onsets:
+        _, jitter_index = np.unique(starts, return_inverse=True) # Um sorteio por início
+    else:
+        jitter_index = np.arange(num_notes)
+    num_draws = int(jitter_index.max()) + 1
+    if settings.timing_ticks:
+        shifted = starts + np_rng.integers(-settings.timing_ticks, settings.timing_ticks + 1, num_draws)[jitter_index]
+        if settings.clamp_to_measure and measure_ticks:
+            shifted = np.maximum(shifted, starts // measure_ticks * measure_ticks)
+        starts = np.maximum(0, shifted)
+    if settings.duration_ticks:
+        jittered = durations + np_rng.integers(-settings.duration_ticks, settings.duration_ticks + 1, num_draws)[jitter_index]
+        durations = np.maximum(jittered, np.minimum(durations, settings.min_duration_ticks))
+    ticks[on_index] = starts
+    ticks[off_index] = starts + durations
+
+    if settings.velocity:
+        jittered = velocities[on_index] + np_rng.integers(-settings.velocity, settings.velocity + 1, num_notes)
+        velocities[on_index] = np.clip(jittered, settings.min_velocity, settings.max_velocity)
+    return ticks, velocities
+
+
+def humanize_events(events, settings, np_rng, measure_ticks=None):
+    """Versão de humanize_arrays para uma lista de eventos (tipo, nota, velocity, tick) de uma parte."""
+    if not events or settings is None:
+        return events
+    count = len(events)
+    event_types, notes, velocities, ticks = zip(*events)
+    is_on = np.fromiter(map('note_on'.__eq__, event_types), dtype=bool, count=count)
+    notes = np.fromiter(notes, dtype=np.int64, count=count)
+    on_index, off_index = pair_events(is_on, notes)
+    ticks, velocities = humanize_arrays(np.fromiter(ticks, dtype=np.int64, count=count),
+                                        np.fromiter(velocities, dtype=np.int64, count=count),
+                                        on_index, off_index, settings, np_rng, measure_ticks)
+    return list(zip(event_types, notes.tolist(), velocities.tolist(), ticks.tolist()))
@@ -0,0 +1,192 @@
+# live_mode.py
+
+import heapq
+import itertools
+import math
+import queue
+import threading
+import time
+
+import mido
+
+from midi_parts import PART_CHANNELS
+from note_overlaps import OverlapTracker
+from tempo_map import TempoMap
+
+BEATS_PER_MEASURE = 4
+
+
+class LiveSession:
+    """
+    Reprodução generativa sem fim: uma thread produtora gera os próximos compassos
+    (MusicGenerator.stream_measures) enquanto os atuais tocam no MidiSequencer.
+    Os compassos passam por uma fila de look-ahead de tamanho fixo, dimensionada a partir
+    do tempo medido de geração de um compasso, então a memória não cresce com a duração.
+
+    O MusicGenerator deve ser exclusivo da sessão: o RNG dele é usado pela thread produtora.
+    """
+    def __init__(self, music_generator, sequencer, root_key, scale_type, bpm, selected_style,
+                 parts=('bass', 'chords', 'lead', 'pads', 'arpeggio', 'drums'),
+                 chord_progression_roman=None, seed=None, lookahead_measures=None,
+                 min_lookahead_measures=2, safety_factor=4.0):
+        self.music_generator = music_generator
+        self.sequencer = sequencer
+        self.root_key = root_key
+        self.scale_type = scale_type
+        self.bpm = bpm
+        self.selected_style = selected_style
+        self.parts = tuple(parts)
+        self.chord_progression_roman = chord_progression_roman
+        self.seed = seed
+        self.lookahead_measures = lookahead_measures # None: calculado em start()
+        self.min_lookahead_measures = min_lookahead_measures # 2 = buffer duplo
+        self.safety_factor = safety_factor # Margem sobre o pior tempo de geração medido
+
+        ticks_per_beat = music_generator.ticks_per_beat
+        self.ticks_per_measure = ticks_per_beat * BEATS_PER_MEASURE
+        self.tempo_map = TempoMap.from_bpm(ticks_per_beat, bpm)
+        self.measure_seconds = self.tempo_map.tick_to_seconds(self.ticks_per_measure)
+
+        self.measures_generated = 0
+        self.measures_played = 0
+        self.underruns = 0 # Vezes em que a reprodução precisou esperar pela geração
+        self.max_generation_seconds = 0.0
+        self.error = None # Exceção da thread produtora, que encerra a reprodução
+        self._queue = None
+        self._stream = None
+        self._producer = None
+        self._stop_event = threading.Event()
+
+    @property
+    def is_running(self):
+        return self._producer is not None and not self._stop_event.is_set()
+
+    def start(self):
+        """Mede a geração, pré-enche a fila de look-ahead e inicia produtor e reprodução."""
+        self.stop()
+        self._stop_event.clear()
+        self.error = None
+        generator = self.music_generator
+        if self.seed is not None:
+            generator.rng.seed(self.seed)
+        if self.chord_progression_roman is None:
+            config = generator.genre_configs.get(self.selected_style, generator.genre_configs.get('Drum and Bass', {}))
+            self.chord_progression_roman = generator.rng.choice(config.get('chords_progressions', [['i', 'VI', 'VII', 'III']]))
+
+        self._stream = generator.stream_measures(self.root_key, self.scale_type, self.chord_progression_roman,
+                                                 self.selected_style, self.parts)
+
+        # Os primeiros compassos servem também para medir o custo de geração
+        prefill = [self._next_block() for _ in range(self.min_lookahead_measures)]
+        if self.lookahead_measures is None:
+            self.lookahead_measures = self.required_lookahead(self.max_generation_seconds)
+        self._queue = queue.Queue(maxsize=self.lookahead_measures)
+        for block in prefill:
+            self._queue.put(block)
+        while not self._queue.full():
+            self._queue.put(self._next_block())
+
+        self._producer = threading.Thread(target=self._produce, daemon=True, name="LiveSessionProducer")
+        self._producer.start()
+        self.sequencer.play(self._timed_messages())
+
+    def required_lookahead(self, generation_seconds):
+        """
+        Compassos de antecedência para que a geração nunca alcance a reprodução: cobre o
+        pior tempo de geração (com margem) e mantém pelo menos o buffer duplo.
+        """
+        needed = math.ceil(generation_seconds * self.safety_factor / self.measure_seconds) + 1
+        return max(self.min_lookahead_measures, needed)
+
+    def stop(self):
+        self._stop_event.set()
+        if self.sequencer.is_playing:
+            self.sequencer.stop()
+        if self._producer is not None:
+            self._producer.join()
+            self._producer = None
+
+    def position_seconds(self):
+        return self.sequencer.position_seconds()
+
+    def _next_block(self):
+        started = time.perf_counter()
+        block = next(self._stream)
+        self.max_generation_seconds = max(self.max_generation_seconds, time.perf_counter() - started)
+        self.measures_generated += 1
+        return block
+
+    def _produce(self):
+        while not self._stop_event.is_set():
+            try:
+                block = self._next_block()
+            except Exception as e:
+                block = e # Vai pela fila até _timed_messages, que a relança
+            # Espera em fatias por espaço na fila para poder ser interrompida por stop()
+            while not self._stop_event.is_set():
+                try:
+                    self._queue.put(block, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if isinstance(block, Exception):
+                return
+
+    def _take_block(self):
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            self.underruns += 1
+        while not self._stop_event.is_set():
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _timed_messages(self):
+        """
+        Converte os blocos de compassos em (segundos, parte, mensagem) para o MidiSequencer.
+        Eventos que terminam depois do compasso atual (ex.: pads de 2 compassos) esperam
+        num heap até que nenhum bloco futuro possa ter eventos anteriores a eles.
+        """
+        programs = self.music_generator.get_instrument_programs(self.selected_style)
+        for part_name in self.parts:
+            channel = PART_CHANNELS.get(part_name, 0)
+            yield 0.0, part_name, mido.Message('program_change', channel=channel, program=programs.get(part_name, 0))
+
+        pending = [] # Heap de (tick, ordem, sequência, parte, mensagem)
+        sequence = itertools.count()
+        # Como em build_midi_file, notas da mesma altura sobrepostas são corrigidas (também entre blocos)
+        policy = self.music_generator.overlap_policy
+        overlaps = OverlapTracker(policy) if policy else None
+        while not self._stop_event.is_set():
+            block = self._take_block()
+            if block is None:
+                return
+            if isinstance(block, Exception):
+                # Falha na geração: não pode parecer um fim normal da reprodução
+                self.error = block
+                raise block
+            measure_idx, part_events = block
+            for part_name, events in part_events.items():
+                channel = PART_CHANNELS.get(part_name, 0)
+                for event_type, note, velocity, tick in events:
+                    order = 1 if event_type == 'note_off' else 2 # note_off antes de note_on no mesmo tick
+                    heapq.heappush(pending, (max(0, tick), order, next(sequence), part_name,
+                                             mido.Message(event_type, channel=channel, note=note, velocity=velocity)))
+
+            # Blocos seguintes só têm eventos a partir do início do próximo compasso
+            next_measure_tick = (measure_idx + 1) * self.ticks_per_measure
+            while pending and pending[0][0] < next_measure_tick:
+                tick, _, _, part_name, msg = heapq.heappop(pending)
+                seconds = self.tempo_map.tick_to_seconds(tick)
+                if overlaps is None:
+                    yield seconds, part_name, msg
+                    continue
+                for event_type in overlaps.process(msg.type, msg.channel, msg.note):
+                    if event_type != msg.type:
+                        yield seconds, part_name, mido.Message(event_type, channel=msg.channel, note=msg.note, velocity=0)
+                    else:
+                        yield seconds, part_name, msg
+            self.measures_played += 1
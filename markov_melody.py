@@ -0,0 +1,238 @@
+# markov_melody.py
+
+import bisect
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from midi_reader import MappedMidiFile, pair_note_events
+
+DEFAULT_CORPUS_DIRS = [os.path.join(os.getcwd(), "MIDI")]
+DEFAULT_CACHE_DIR = os.path.join(os.getcwd(), "MIDIs_Gerados", ".cache")
+DRUM_CHANNEL = 9
+
+MAX_INTERVAL = 12 # Saltos melódicos limitados a uma oitava (para cima ou para baixo)
+NUM_INTERVALS = 2 * MAX_INTERVAL + 1
+MAX_STEPS = 8 # Distância entre ataques de 1 a 8 semicolcheias
+NUM_TOKENS = NUM_INTERVALS * MAX_STEPS # Token = (intervalo, distância até a próxima nota)
+SMOOTHING = 0.01 # Suavização aditiva para que todo token tenha alguma probabilidade
+
+
+def encode_tokens(notes, ticks_per_beat):
+    """
+    Converte uma tabela de notas (midi_reader.NOTE_DTYPE) em tokens de (intervalo, ritmo).
+    Notas simultâneas são reduzidas à mais aguda, como uma linha melódica.
+    """
+    if len(notes) < 2:
+        return np.empty(0, dtype=np.int64)
+    step_ticks = max(1, ticks_per_beat // 4)
+
+    # Uma nota por ataque: a mais aguda entre as que começam no mesmo tick
+    order = np.lexsort((-notes['note'].astype(np.int64), notes['start']))
+    notes = notes[order]
+    first_of_onset = np.concatenate(([True], np.diff(notes['start']) > 0))
+    notes = notes[first_of_onset]
+    if len(notes) < 2:
+        return np.empty(0, dtype=np.int64)
+
+    intervals = np.clip(np.diff(notes['note'].astype(np.int64)), -MAX_INTERVAL, MAX_INTERVAL) + MAX_INTERVAL
+    steps = np.clip(np.rint(np.diff(notes['start']) / step_ticks).astype(np.int64), 1, MAX_STEPS) - 1
+    return intervals * MAX_STEPS + steps
+
+
+def context_keys(tokens, context_length):
+    """Codifica os `context_length` tokens anteriores de cada posição em um único inteiro."""
+    keys = np.zeros(len(tokens) - context_length, dtype=np.int64)
+    for offset in range(context_length):
+        keys = keys * NUM_TOKENS + tokens[offset:len(tokens) - context_length + offset]
+    return keys
+
+
+def count_file_ngrams(args):
+    """
+    Extrai os pares (contexto, próximo token) de um arquivo do corpus.
+    Executado nos processos de trabalho do treinamento, por isso é uma função de módulo.
+    """
+    path, order = args
+    context_length = order - 1
+    all_keys, all_next = [], []
+    try:
+        with MappedMidiFile(path) as midi_file:
+            ticks_per_beat = midi_file.ticks_per_beat
+            for index in range(len(midi_file)):
+                notes = pair_note_events(midi_file.track_events(index))
+                for channel in np.unique(notes['channel']):
+                    if channel == DRUM_CHANNEL:
+                        continue
+                    tokens = encode_tokens(notes[notes['channel'] == channel], ticks_per_beat)
+                    if len(tokens) <= context_length:
+                        continue
+                    all_keys.append(context_keys(tokens, context_length))
+                    all_next.append(tokens[context_length:])
+    except Exception:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64) # Arquivos ilegíveis são ignorados
+    if not all_keys:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(all_keys), np.concatenate(all_next)
+
+
+class MarkovMelodyModel:
+    """
+    Modelo de n-gramas de (intervalo, ritmo) treinado a partir de um corpus MIDI.
+    As transições são guardadas como distribuições acumuladas (CDF) em arrays NumPy:
+    uma linha por contexto observado, mais uma linha de unigramas usada como fallback.
+    """
+    def __init__(self, order, contexts, cdf, unigram_cdf):
+        self.order = order
+        self.contexts = contexts # Chaves de contexto ordenadas (int64)
+        self.cdf = cdf # (len(contexts), NUM_TOKENS) float32
+        self.unigram_cdf = unigram_cdf # (NUM_TOKENS,) float32
+        # Identifica o conteúdo do modelo (usado, por exemplo, nas chaves do SongCache)
+        self.fingerprint = hashlib.sha256(self.contexts.tobytes() + self.cdf.tobytes()).hexdigest()
+        self._snap_tables = {}
+        self._lookup = None # (contexto -> linha, linhas da CDF como listas), montado no primeiro uso
+
+    @classmethod
+    def train(cls, paths, order=2, max_workers=None):
+        """Treina o modelo em paralelo (um processo por lote de arquivos)."""
+        if order < 1:
+            raise ValueError("A ordem do modelo deve ser pelo menos 1.")
+        keys, next_tokens = [], []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for file_keys, file_next in executor.map(count_file_ngrams, [(path, order) for path in paths],
+                                                     chunksize=max(1, len(paths) // 64)):
+                keys.append(file_keys)
+                next_tokens.append(file_next)
+
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        next_tokens = np.concatenate(next_tokens) if next_tokens else np.empty(0, dtype=np.int64)
+
+        unigram_counts = np.bincount(next_tokens, minlength=NUM_TOKENS).astype(np.float64) + SMOOTHING
+        contexts, context_index = np.unique(keys, return_inverse=True)
+        counts = np.zeros((len(contexts), NUM_TOKENS), dtype=np.float64)
+        np.add.at(counts, (context_index, next_tokens), 1.0)
+        counts += SMOOTHING
+        return cls(order, contexts, cls._to_cdf(counts), cls._to_cdf(unigram_counts))
+
+    @classmethod
+    def train_or_load(cls, directories=None, order=2, cache_dir=DEFAULT_CACHE_DIR, max_workers=None):
+        """
+        Carrega o modelo do cache em disco ou treina e grava no cache. A chave do cache
+        depende da ordem e dos arquivos do corpus (caminho, tamanho, data de modificação).
+        """
+        paths = []
+        for directory in directories or DEFAULT_CORPUS_DIRS:
+            for dirpath, dirnames, filenames in os.walk(directory):
+                dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+                paths.extend(os.path.join(dirpath, name) for name in filenames if name.lower().endswith('.mid'))
+        paths.sort()
+
+        fingerprint = [order, NUM_TOKENS]
+        for path in paths:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_size, stat.st_mtime))
+        key = hashlib.sha256(json.dumps(fingerprint).encode('utf-8')).hexdigest()
+
+        cache_path = os.path.join(cache_dir, f"markov_{key[:32]}.npz") if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                return cls.load(cache_path)
+            except (OSError, ValueError, KeyError):
+                pass # Cache corrompido: treina novamente
+
+        model = cls.train(paths, order=order, max_workers=max_workers)
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            model.save(cache_path)
+        return model
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, order=np.int64(self.order), contexts=self.contexts,
+                            cdf=self.cdf, unigram_cdf=self.unigram_cdf)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(int(data['order']), data['contexts'], data['cdf'], data['unigram_cdf'])
+
+    @staticmethod
+    def _to_cdf(counts):
+        cdf = np.cumsum(counts, axis=-1)
+        cdf /= cdf[..., -1:]
+        return cdf.astype(np.float32)
+
+    def _sampling_tables(self):
+        """
+        Versões em listas Python das tabelas de amostragem: a busca binária de um único
+        valor é bem mais barata com bisect do que com uma chamada NumPy por nota.
+        """
+        if self._lookup is None:
+            rows = {key: index for index, key in enumerate(self.contexts.tolist())}
+            self._lookup = (rows, self.cdf.tolist(), self.unigram_cdf.tolist())
+        return self._lookup
+
+    def _snap_table(self, scale_notes, low, high):
+        """Tabela (0-127) que leva cada nota à nota da escala mais próxima dentro de [low, high]."""
+        table_key = (tuple(scale_notes), low, high)
+        table = self._snap_tables.get(table_key)
+        if table is None:
+            pitch_classes = sorted({note % 12 for note in scale_notes})
+            candidates = np.array([note for note in range(low, high + 1) if note % 12 in pitch_classes])
+            all_notes = np.arange(128)
+            nearest = np.abs(all_notes[:, None] - candidates[None, :]).argmin(axis=1)
+            table = candidates[nearest].tolist()
+            self._snap_tables[table_key] = table
+        return table
+
+    def generate_lead(self, scale_notes, num_beats, ticks_per_beat, rng, low=60, high=96,
+                      velocity_range=(75, 100)):
+        """
+        Gera uma frase melódica com a mesma convenção de eventos do MusicGenerator.
+        Todos os números aleatórios da frase são sorteados de uma vez; cada passo é uma
+        busca binária (CDF inversa) na linha do contexto atual.
+        """
+        np_rng = np.random.default_rng(rng.getrandbits(64))
+        step_ticks = ticks_per_beat // 4
+        total_ticks = num_beats * ticks_per_beat
+        max_notes = total_ticks // step_ticks + 1
+        snap = self._snap_table(scale_notes, low, high)
+
+        context_rows, cdf_rows, unigram_row = self._sampling_tables()
+
+        uniforms = np_rng.random(max_notes).tolist()
+        velocities = np_rng.integers(velocity_range[0], velocity_range[1] + 1, size=max_notes).tolist()
+        context_length = self.order - 1
+
+        events = []
+        history = []
+        pitch = snap[scale_notes[0]]
+        tick = 0
+        for i in range(max_notes):
+            row = unigram_row # Fallback para contextos nunca vistos no corpus
+            if context_length and len(history) >= context_length:
+                context_key = 0
+                for token in history[-context_length:]:
+                    context_key = context_key * NUM_TOKENS + token
+                row_index = context_rows.get(context_key)
+                if row_index is not None:
+                    row = cdf_rows[row_index]
+
+            token = min(bisect.bisect_right(row, uniforms[i]), NUM_TOKENS - 1)
+            history.append(token)
+            interval = token // MAX_STEPS - MAX_INTERVAL
+            duration_ticks = (token % MAX_STEPS + 1) * step_ticks
+
+            if tick >= total_ticks:
+                break
+            duration_ticks = min(duration_ticks, total_ticks - tick)
+            events.append(('note_on', pitch, velocities[i], tick))
+            # Pequeno "release" antes da próxima nota, como no gerador aleatório
+            events.append(('note_off', pitch, 0, tick + duration_ticks - (step_ticks // 2)))
+            tick += duration_ticks
+            pitch = snap[min(127, max(0, pitch + interval))]
+        return events
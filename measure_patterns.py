@@ -0,0 +1,82 @@
+# measure_patterns.py
+
+import collections
+import collections.abc
+
+# Uma parte comprimida: cada bloco único de compasso (eventos com ticks relativos ao
+# início do compasso) aparece uma vez em `patterns`; occurrences[i] lista os compassos
+# em que patterns[i] toca
+PatternPart = collections.namedtuple('PatternPart', ['patterns', 'occurrences'])
+
+
+def compress_part(events, measure_ticks):
+    """
+    Agrupa os eventos por compasso e guarda cada bloco distinto uma única vez.
+    Um note_off fica no compasso do note_on que o precede na lista (notas que atravessam
+    a barra de compasso continuam no mesmo bloco), e o compasso do bloco nunca volta:
+    um note_on fora de ordem (humanização) entra no bloco atual com tick relativo
+    negativo. Assim cada bloco é um trecho contínuo da lista e expand_part devolve
+    exatamente a mesma lista, na mesma ordem.
+    """
+    measures = collections.defaultdict(list)
+    current_measure = None
+    for event_type, note, velocity, tick in events:
+        if current_measure is None:
+            current_measure = tick // measure_ticks
+        elif event_type == 'note_on':
+            current_measure = max(current_measure, tick // measure_ticks)
+        measures[current_measure].append((event_type, note, velocity, tick - current_measure * measure_ticks))
+
+    pattern_index = {} # bloco -> índice em patterns (o dicionário faz o hash de cada bloco)
+    patterns = []
+    occurrences = []
+    for measure, block in sorted(measures.items()):
+        block = tuple(block)
+        index = pattern_index.get(block)
+        if index is None:
+            index = pattern_index[block] = len(patterns)
+            patterns.append(block)
+            occurrences.append([])
+        occurrences[index].append(measure)
+    return PatternPart(patterns, occurrences)
+
+
+def expand_part(pattern_part, measure_ticks):
+    """Lista de eventos com ticks absolutos, em ordem de compasso."""
+    placements = sorted((measure, index) for index, measures in enumerate(pattern_part.occurrences) for measure in measures)
+    events = []
+    for measure, index in placements:
+        start_tick = measure * measure_ticks
+        events.extend((event_type, note, velocity, start_tick + tick) for event_type, note, velocity, tick in pattern_part.patterns[index])
+    return events
+
+
+class PatternEvents(collections.abc.Mapping):
+    """
+    Dicionário {parte: eventos} somente leitura guardado como padrões de compasso.
+    Cada acesso a uma parte expande a lista completa, então pode substituir
+    all_midi_events na exportação, no visualizador e na renderização de áudio,
+    ocupando memória proporcional ao número de compassos distintos.
+    """
+    def __init__(self, parts, measure_ticks):
+        self.parts = parts # parte -> PatternPart
+        self.measure_ticks = measure_ticks
+
+    @classmethod
+    def from_events(cls, all_midi_events, measure_ticks):
+        if isinstance(all_midi_events, cls) and all_midi_events.measure_ticks == measure_ticks:
+            return all_midi_events
+        return cls({part: compress_part(events, measure_ticks) for part, events in all_midi_events.items()}, measure_ticks)
+
+    def __getitem__(self, part):
+        return expand_part(self.parts[part], self.measure_ticks)
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def stored_event_count(self):
+        """Eventos efetivamente guardados (somando os blocos únicos de todas as partes)."""
+        return sum(len(pattern) for part in self.parts.values() for pattern in part.patterns)
@@ -0,0 +1,289 @@
+# midi_catalog.py
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import mido
+
+DEFAULT_CATALOG_PATH = os.path.join(os.getcwd(), "MIDIs_Gerados", "catalog.sqlite3")
+DEFAULT_SCAN_DIRS = [os.path.join(os.getcwd(), "MIDIs_Gerados"), os.path.join(os.getcwd(), "MIDI")]
+
+# Nomes de arquivo gerados pelo app: "<parte>_<AAAAMMDD>_<HHMMSS>.mid" ou "Full_Mix_<AAAAMMDD>_<HHMMSS>.mid"
+FILENAME_PATTERN = re.compile(r'^(?P<part>.+?)_(?P<timestamp>\d{8}_\d{6})\.mid$', re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS midi_files (
+    path TEXT PRIMARY KEY,
+    project TEXT,
+    part TEXT,
+    genre TEXT,
+    root_key TEXT,
+    scale_type TEXT,
+    bpm REAL,
+    seed INTEGER,
+    arrangement TEXT,
+    length_ticks INTEGER,
+    length_seconds REAL,
+    event_count INTEGER,
+    created_at TEXT,
+    size_bytes INTEGER,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS idx_midi_files_lookup ON midi_files (genre, part, root_key, scale_type, bpm);
+CREATE INDEX IF NOT EXISTS idx_midi_files_project ON midi_files (project, part);
+"""
+
+QUERY_FIELDS = ('project', 'part', 'genre', 'root_key', 'scale_type', 'bpm', 'seed')
+
+
+def parse_output_path(path):
+    """
+    Extrai projeto, parte e timestamp de um caminho no formato usado pelo app
+    (<Projeto>/<Parte>/<parte>_<timestamp>.mid ou <Projeto>/Full_Mix_<timestamp>.mid).
+    """
+    filename = os.path.basename(path)
+    parent_dir = os.path.basename(os.path.dirname(path))
+    match = FILENAME_PATTERN.match(filename)
+    if not match:
+        return {'project': parent_dir, 'part': None, 'created_at': None}
+
+    part = match.group('part').lower()
+    if part == 'full_mix':
+        project = parent_dir
+    else:
+        # Arquivos de partes ficam em uma subpasta com o nome da parte dentro do projeto
+        project = os.path.basename(os.path.dirname(os.path.dirname(path)))
+    return {'project': project, 'part': part, 'created_at': match.group('timestamp')}
+
+
+def scan_midi_file(path):
+    """
+    Lê um arquivo MIDI e retorna suas estatísticas para o catálogo.
+    Executado nos processos de trabalho do rescan, por isso é uma função de módulo.
+    """
+    try:
+        stat = os.stat(path)
+        mid = mido.MidiFile(path)
+    except Exception as e:
+        return {'path': path, 'error': str(e)}
+
+    event_count = 0
+    length_ticks = 0
+    tempo = None
+    for track in mid.tracks:
+        track_ticks = 0
+        for msg in track:
+            track_ticks += msg.time
+            if msg.type == 'set_tempo' and tempo is None:
+                tempo = msg.tempo
+            elif not msg.is_meta:
+                event_count += 1
+        length_ticks = max(length_ticks, track_ticks)
+
+    info = parse_output_path(path)
+    info.update({
+        'path': path,
+        # Arquivos sem set_tempo não registram o BPM usado na geração
+        'bpm': round(mido.tempo2bpm(tempo), 3) if tempo else None,
+        'length_ticks': length_ticks,
+        'length_seconds': mid.length,
+        'event_count': event_count,
+        'size_bytes': stat.st_size,
+        'mtime': stat.st_mtime,
+    })
+    return info
+
+
+class MidiCatalog:
+    """
+    Catálogo SQLite dos arquivos MIDI gerados. Os metadados de geração (gênero, tônica,
+    escala, BPM, seed) são registrados no momento do salvamento; o rescan preenche
+    o catálogo a partir de pastas existentes lendo os arquivos em paralelo.
+    """
+    def __init__(self, db_path=DEFAULT_CATALOG_PATH):
+        self.db_path = db_path
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self._add_missing_columns()
+
+    def close(self):
+        self.connection.close()
+
+    def record_file(self, path, genre=None, root_key=None, scale_type=None, bpm=None, seed=None,
+                    length_ticks=None, event_count=None, ticks_per_beat=480, part=None, project=None,
+                    arrangement=None):
+        """
+        Registra (ou atualiza) um arquivo recém-salvo com os parâmetros usados na geração.
+        arrangement é a estrutura de seções de uma música arranjada ("intro,build,drop,..."),
+        necessária junto com a seed para reproduzi-la; None para músicas sem arranjo.
+        """
+        path = os.path.abspath(path)
+        info = parse_output_path(path)
+        stat = os.stat(path)
+
+        length_seconds = None
+        if bpm and length_ticks is not None:
+            length_seconds = mido.tick2second(length_ticks, ticks_per_beat, mido.bpm2tempo(bpm))
+
+        row = {
+            'path': path,
+            'project': project or info['project'],
+            'part': part or info['part'],
+            'genre': genre,
+            'root_key': root_key,
+            'scale_type': scale_type,
+            'bpm': bpm,
+            'seed': seed,
+            'arrangement': arrangement,
+            'length_ticks': length_ticks,
+            'length_seconds': length_seconds,
+            'event_count': event_count,
+            'created_at': info['created_at'],
+            'size_bytes': stat.st_size,
+            'mtime': stat.st_mtime,
+        }
+        with self.connection:
+            self._upsert(row)
+
+    def rescan(self, directories=None, max_workers=None, force=False):
+        """
+        Percorre as pastas informadas e adiciona ao catálogo os arquivos .mid novos ou alterados.
+        Metadados já registrados no salvamento (gênero, tônica, seed...) são preservados.
+        Retorna (arquivos indexados, arquivos com erro).
+        """
+        directories = directories or DEFAULT_SCAN_DIRS
+        known = {}
+        if not force:
+            for row in self.connection.execute("SELECT path, size_bytes, mtime FROM midi_files"):
+                known[row['path']] = (row['size_bytes'], row['mtime'])
+
+        pending = []
+        for directory in directories:
+            for dirpath, dirnames, filenames in os.walk(directory):
+                # Pastas ocultas (ex.: .store do armazenamento por conteúdo) não são projetos
+                dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+                for filename in filenames:
+                    if not filename.lower().endswith('.mid'):
+                        continue
+                    path = os.path.abspath(os.path.join(dirpath, filename))
+                    stat = os.stat(path)
+                    if known.get(path) == (stat.st_size, stat.st_mtime):
+                        continue # Arquivo inalterado desde o último rescan
+                    pending.append(path)
+
+        indexed, failed = 0, []
+        if not pending:
+            return indexed, failed
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(scan_midi_file, pending, chunksize=max(1, len(pending) // 64))
+            with self.connection:
+                for info in results:
+                    if 'error' in info:
+                        failed.append((info['path'], info['error']))
+                        continue
+                    self._upsert(info)
+                    indexed += 1
+        return indexed, failed
+
+    def find(self, order_by='path', limit=None, **filters):
+        """
+        Busca arquivos por qualquer combinação de project, part, genre, root_key, scale_type, bpm e seed.
+        Ex.: catalog.find(genre='Psytrance', part='bass', root_key='A', scale_type='Minor', bpm=145)
+        """
+        clauses, params = [], []
+        for field, value in filters.items():
+            if field not in QUERY_FIELDS:
+                raise ValueError(f"Campo de busca inválido: {field}")
+            if value is None:
+                continue
+            clauses.append(f"{field} = ?")
+            params.append(value)
+
+        if order_by not in QUERY_FIELDS + ('path', 'created_at', 'length_seconds'):
+            raise ValueError(f"Campo de ordenação inválido: {order_by}")
+
+        sql = "SELECT * FROM midi_files"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def remove_missing(self):
+        """Remove do catálogo os arquivos que não existem mais no disco."""
+        missing = [row['path'] for row in self.connection.execute("SELECT path FROM midi_files")
+                   if not os.path.exists(row['path'])]
+        with self.connection:
+            self.connection.executemany("DELETE FROM midi_files WHERE path = ?", [(path,) for path in missing])
+        return len(missing)
+
+    def _add_missing_columns(self):
+        # Catálogos criados antes de uma coluna existir a recebem vazia
+        existing = {row['name'] for row in self.connection.execute("PRAGMA table_info(midi_files)")}
+        with self.connection:
+            if 'arrangement' not in existing:
+                self.connection.execute("ALTER TABLE midi_files ADD COLUMN arrangement TEXT")
+
+    def _upsert(self, row):
+        columns = ['path', 'project', 'part', 'genre', 'root_key', 'scale_type', 'bpm', 'seed', 'arrangement',
+                   'length_ticks', 'length_seconds', 'event_count', 'created_at', 'size_bytes', 'mtime']
+        values = [row.get(column) for column in columns]
+        # Valores nulos do novo registro não sobrescrevem metadados já conhecidos
+        updates = ", ".join(f"{column} = COALESCE(excluded.{column}, {column})" for column in columns[1:])
+        self.connection.execute(
+            f"INSERT INTO midi_files ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT(path) DO UPDATE SET {updates}",
+            values
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Catálogo SQLite dos MIDIs gerados.")
+    parser.add_argument('--db', default=DEFAULT_CATALOG_PATH, help="Caminho do banco SQLite do catálogo.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rescan_parser = subparsers.add_parser('rescan', help="Indexa (em paralelo) os MIDIs existentes nas pastas.")
+    rescan_parser.add_argument('directories', nargs='*', default=None)
+    rescan_parser.add_argument('--workers', type=int, default=None)
+    rescan_parser.add_argument('--force', action='store_true', help="Relê também arquivos inalterados.")
+
+    query_parser = subparsers.add_parser('query', help="Busca arquivos no catálogo.")
+    query_parser.add_argument('--project')
+    query_parser.add_argument('--part')
+    query_parser.add_argument('--genre')
+    query_parser.add_argument('--key', dest='root_key')
+    query_parser.add_argument('--scale', dest='scale_type')
+    query_parser.add_argument('--bpm', type=float)
+    query_parser.add_argument('--seed', type=int)
+    query_parser.add_argument('--limit', type=int)
+
+    args = parser.parse_args(argv)
+    catalog = MidiCatalog(args.db)
+    try:
+        if args.command == 'rescan':
+            removed = catalog.remove_missing()
+            indexed, failed = catalog.rescan(args.directories, max_workers=args.workers, force=args.force)
+            print(f"{indexed} arquivo(s) indexado(s), {removed} removido(s) do catálogo.")
+            for path, error in failed:
+                print(f"  ERRO ao ler '{path}': {error}", file=sys.stderr)
+        else:
+            filters = {field: getattr(args, field) for field in QUERY_FIELDS}
+            for row in catalog.find(limit=args.limit, **filters):
+                print(f"{row['path']}\t{row['genre'] or '-'}\t{row['part'] or '-'}\t"
+                      f"{row['root_key'] or '-'} {row['scale_type'] or '-'}\t{row['bpm'] or '-'} BPM")
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
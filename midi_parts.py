@@ -0,0 +1,7 @@
+# midi_parts.py
+
+# Partes geradas pelo MusicGenerator, na ordem dos flags de generate_music_parts
+PART_NAMES = ('bass', 'chords', 'lead', 'pads', 'arpeggio', 'drums')
+
+# Canal MIDI de cada parte (a bateria usa o canal 10 do General MIDI)
+PART_CHANNELS = {'bass': 0, 'chords': 1, 'lead': 2, 'pads': 3, 'arpeggio': 4, 'drums': 9}
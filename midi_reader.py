@@ -0,0 +1,244 @@
+# midi_reader.py
+
+import collections
+import mmap
+import struct
+
+import numpy as np
+
+from tempo_map import TempoMap
+
+# Tabela de eventos de nota de uma trilha (type: 1 = note_on, 0 = note_off)
+EVENT_DTYPE = np.dtype([('tick', '<i8'), ('channel', 'u1'), ('type', 'u1'), ('note', 'u1'), ('velocity', 'u1')])
+# Tabela de notas já pareadas (início/fim em ticks absolutos)
+NOTE_DTYPE = np.dtype([('start', '<i8'), ('end', '<i8'), ('channel', 'u1'), ('note', 'u1'), ('velocity', 'u1')])
+
+# Número de bytes de dados de cada tipo de mensagem de canal (indexado pelo nibble alto do status)
+CHANNEL_MESSAGE_DATA_LENGTHS = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+
+# Mesmo mapeamento de canais usado pelo MusicGenerator ao salvar
+CHANNEL_PART_NAMES = {0: 'bass', 1: 'chords', 2: 'lead', 3: 'pads', 4: 'arpeggio', 9: 'drums'}
+
+DecodedTrack = collections.namedtuple('DecodedTrack', ['events', 'channel_event_counts', 'tempo_changes', 'length_ticks'])
+
+
+class MidiFormatError(ValueError):
+    pass
+
+
+class MappedMidiFile:
+    """
+    Leitor de arquivos MIDI (SMF) via mmap. Apenas os cabeçalhos dos chunks são lidos na
+    abertura; cada trilha é decodificada sob demanda, direto do mapeamento de memória,
+    para tabelas NumPy de eventos/notas, sem criar um objeto Python por mensagem.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise MidiFormatError(f"Arquivo MIDI vazio: {path}")
+        self._data = memoryview(self._mmap)
+
+        if len(self._data) < 14 or self._data[:4] != b'MThd':
+            self.close()
+            raise MidiFormatError(f"Cabeçalho MThd ausente: {path}")
+        header_length, self.format, self.num_tracks, self.ticks_per_beat = struct.unpack('>IHHH', self._data[4:14])
+        if self.ticks_per_beat & 0x8000:
+            self.close()
+            raise MidiFormatError("Divisão SMPTE não suportada.")
+
+        # Localiza os chunks MTrk (offset do início dos dados, tamanho)
+        self.track_chunks = []
+        offset = 8 + header_length
+        while offset + 8 <= len(self._data):
+            chunk_type = bytes(self._data[offset:offset + 4])
+            (chunk_length,) = struct.unpack('>I', self._data[offset + 4:offset + 8])
+            if chunk_type == b'MTrk':
+                self.track_chunks.append((offset + 8, min(chunk_length, len(self._data) - offset - 8)))
+            offset += 8 + chunk_length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._data is not None:
+            self._data.release()
+            self._data = None
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self.track_chunks)
+
+    def decode_track(self, index, stop_tick=None):
+        """
+        Decodifica os eventos de nota de uma trilha. Com stop_tick, a leitura para no
+        primeiro evento depois de stop_tick em que nenhuma nota está soando.
+        """
+        start, length = self.track_chunks[index]
+        data = self._data
+        end = start + length
+
+        ticks = []
+        packed = bytearray() # channel, type, note, velocity por evento
+        channel_event_counts = np.zeros(16, dtype=np.int64)
+        tempo_changes = []
+        active_notes = 0
+
+        position = start
+        tick = 0
+        running_status = None
+        while position < end:
+            # Delta-time (quantidade de tamanho variável)
+            delta = 0
+            while True:
+                byte = data[position]
+                position += 1
+                delta = (delta << 7) | (byte & 0x7F)
+                if not byte & 0x80:
+                    break
+            tick += delta
+            if stop_tick is not None and tick > stop_tick and active_notes <= 0:
+                break
+
+            status = data[position]
+            if status == 0xFF: # Meta-evento
+                meta_type = data[position + 1]
+                position += 2
+                meta_length = 0
+                while True:
+                    byte = data[position]
+                    position += 1
+                    meta_length = (meta_length << 7) | (byte & 0x7F)
+                    if not byte & 0x80:
+                        break
+                if meta_type == 0x51 and meta_length == 3:
+                    tempo_changes.append((tick, (data[position] << 16) | (data[position + 1] << 8) | data[position + 2]))
+                position += meta_length
+                if meta_type == 0x2F: # End of track
+                    break
+                running_status = None
+                continue
+            if status in (0xF0, 0xF7): # SysEx
+                position += 1
+                sysex_length = 0
+                while True:
+                    byte = data[position]
+                    position += 1
+                    sysex_length = (sysex_length << 7) | (byte & 0x7F)
+                    if not byte & 0x80:
+                        break
+                position += sysex_length
+                running_status = None
+                continue
+
+            if status & 0x80:
+                running_status = status
+                position += 1
+            elif running_status is None:
+                raise MidiFormatError(f"Running status sem status anterior na trilha {index}.")
+            status = running_status
+
+            kind = status >> 4
+            channel = status & 0x0F
+            channel_event_counts[channel] += 1
+            if kind in (0x8, 0x9):
+                note = data[position]
+                velocity = data[position + 1]
+                is_on = kind == 0x9 and velocity > 0 # note_on com velocity 0 equivale a note_off
+                ticks.append(tick)
+                packed += bytes((channel, 1 if is_on else 0, note, velocity))
+                active_notes += 1 if is_on else -1
+            position += CHANNEL_MESSAGE_DATA_LENGTHS.get(kind, 0)
+
+        events = np.empty(len(ticks), dtype=EVENT_DTYPE)
+        events['tick'] = ticks
+        fields = np.frombuffer(bytes(packed), dtype=np.uint8).reshape(-1, 4)
+        events['channel'] = fields[:, 0]
+        events['type'] = fields[:, 1]
+        events['note'] = fields[:, 2]
+        events['velocity'] = fields[:, 3]
+        return DecodedTrack(events, channel_event_counts, tempo_changes, tick)
+
+    def track_events(self, index, stop_tick=None):
+        return self.decode_track(index, stop_tick).events
+
+    def track_notes(self, index, stop_tick=None):
+        """Tabela de notas (pareamento note_on/note_off por canal e nota) ordenada pelo início."""
+        return pair_note_events(self.track_events(index, stop_tick))
+
+    def iter_notes(self, start_tick=0, end_tick=None, tracks=None):
+        """
+        Itera por (índice da trilha, tabela de notas) com as notas que começam em
+        [start_tick, end_tick). Cada trilha é decodificada só até onde for necessário.
+        """
+        for index in (range(len(self.track_chunks)) if tracks is None else tracks):
+            notes = self.track_notes(index, stop_tick=end_tick)
+            first = np.searchsorted(notes['start'], start_tick, side='left')
+            last = len(notes) if end_tick is None else np.searchsorted(notes['start'], end_tick, side='left')
+            yield index, notes[first:last]
+
+    def tempo_changes(self):
+        """Lista ordenada de (tick, microssegundos por batida) de todas as trilhas."""
+        changes = []
+        for index in range(len(self.track_chunks)):
+            changes.extend(self.decode_track(index).tempo_changes)
+        return sorted(changes)
+
+
+def pair_note_events(events):
+    """Pareia eventos note_on/note_off (FIFO por canal e nota). Notas sem note_off são descartadas."""
+    pending = collections.defaultdict(collections.deque)
+    starts, ends, channels, notes, velocities = [], [], [], [], []
+    for tick, channel, event_type, note, velocity in events.tolist():
+        key = (channel, note)
+        if event_type:
+            pending[key].append((tick, velocity))
+        elif pending[key]:
+            start, on_velocity = pending[key].popleft()
+            starts.append(start)
+            ends.append(tick)
+            channels.append(channel)
+            notes.append(note)
+            velocities.append(on_velocity)
+
+    table = np.empty(len(starts), dtype=NOTE_DTYPE)
+    table['start'] = starts
+    table['end'] = ends
+    table['channel'] = channels
+    table['note'] = notes
+    table['velocity'] = velocities
+    return table[np.argsort(table['start'], kind='stable')]
+
+
+def load_song_events(path):
+    """
+    Carrega um arquivo MIDI no formato de eventos do MusicGenerator
+    ({parte: [(tipo, nota, velocity, tick), ...]}), para exibição no visualizador.
+    Retorna (all_midi_events, total_ticks, ticks_per_beat, tempo_map).
+    """
+    all_midi_events = {}
+    total_ticks = 0
+    with MappedMidiFile(path) as midi_file:
+        tempo_changes = []
+        for index in range(len(midi_file)):
+            decoded = midi_file.decode_track(index)
+            tempo_changes.extend(decoded.tempo_changes)
+            total_ticks = max(total_ticks, decoded.length_ticks)
+            for channel, event_type, note, velocity, tick in zip(
+                    decoded.events['channel'].tolist(), decoded.events['type'].tolist(),
+                    decoded.events['note'].tolist(), decoded.events['velocity'].tolist(),
+                    decoded.events['tick'].tolist()):
+                part_name = CHANNEL_PART_NAMES.get(channel, f"channel_{channel + 1}")
+                all_midi_events.setdefault(part_name, []).append(
+                    ('note_on' if event_type else 'note_off', note, velocity if event_type else 0, tick)
+                )
+        ticks_per_beat = midi_file.ticks_per_beat
+    return all_midi_events, total_ticks, ticks_per_beat, TempoMap(ticks_per_beat, tempo_changes)
@@ -0,0 +1,181 @@
+# midi_sequencer.py
+
+import collections
+import threading
+import time
+
+import mido
+
+from midi_parts import PART_CHANNELS
+
+# Limite das medições de atraso guardadas (as mais antigas são descartadas em reproduções longas)
+MAX_LATENESS_SAMPLES = 100_000
+
+JitterReport = collections.namedtuple('JitterReport', ['count', 'mean_ms', 'p99_ms', 'max_ms'])
+
+
+class LoopbackPort:
+    """
+    Porta de saída que apenas registra as mensagens recebidas e o instante (monotônico)
+    do envio. Substitui uma porta real em testes e medições de jitter.
+    """
+    def __init__(self, name="Loopback"):
+        self.name = name
+        self.closed = False
+        self.messages = [] # (instante em segundos, mensagem)
+
+    def send(self, msg):
+        self.messages.append((time.perf_counter(), msg))
+
+    def reset(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def open_output_port(name=None, virtual=False):
+    """Abre uma porta de saída do mido (hardware ou virtual). Requer um backend como python-rtmidi."""
+    if virtual:
+        return mido.open_output(name or "Gerador de Música", virtual=True)
+    return mido.open_output(name)
+
+
+def song_to_timed_messages(all_midi_events, tempo_map, instrument_programs=None):
+    """
+    Converte as partes geradas em uma lista ordenada de (segundos, parte, mensagem),
+    começando com os program changes de cada parte. Os instantes vêm do mapa de tempo
+    (tempo_map.TempoMap). No mesmo instante, note_off vem antes de note_on.
+    """
+    instrument_programs = instrument_programs or {}
+    timed = []
+    for part_name, events in all_midi_events.items():
+        channel = PART_CHANNELS.get(part_name, 0)
+        timed.append((0.0, 0, part_name, mido.Message('program_change', channel=channel,
+                                                      program=instrument_programs.get(part_name, 0))))
+        if not events:
+            continue
+        seconds = tempo_map.ticks_to_seconds([max(0, event[3]) for event in events]).tolist()
+        for (event_type, note, velocity, _), event_seconds in zip(events, seconds):
+            order = 1 if event_type == 'note_off' else 2
+            timed.append((event_seconds, order, part_name,
+                          mido.Message(event_type, channel=channel, note=note, velocity=velocity)))
+    timed.sort(key=lambda item: (item[0], item[1]))
+    return [(seconds, part_name, msg) for seconds, _, part_name, msg in timed]
+
+
+class MidiSequencer:
+    """
+    Envia eventos para uma porta de saída do mido a partir de uma thread dedicada.
+    Cada evento é agendado em tempo absoluto (início + deslocamento do evento) no relógio
+    monotônico de alta resolução: a thread dorme até perto do instante e completa a espera
+    com espera ativa, o que evita o acúmulo de erro de sleeps relativos.
+    """
+    def __init__(self, port, spin_threshold=0.002):
+        self.port = port
+        self.spin_threshold = spin_threshold # Últimos segundos antes do evento em espera ativa
+        self.muted_parts = set()
+        # Atraso (segundos) de cada mensagem enviada em relação ao instante agendado
+        self.lateness = collections.deque(maxlen=MAX_LATENESS_SAMPLES)
+        self.start_time = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._active_notes = collections.defaultdict(set) # parte -> {(canal, nota)}
+
+    @property
+    def is_playing(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def play(self, timed_messages, start_delay=0.05):
+        """
+        Inicia a reprodução de um iterável de (segundos, parte, mensagem) em ordem crescente
+        de tempo. O iterável pode ser um gerador infinito (ex.: modo ao vivo).
+        """
+        self.stop()
+        self._stop_event.clear()
+        self.lateness.clear()
+        self._active_notes.clear()
+        self.start_time = time.perf_counter() + start_delay
+        self._thread = threading.Thread(target=self._run, args=(iter(timed_messages),), daemon=True,
+                                        name="MidiSequencer")
+        self._thread.start()
+
+    def play_song(self, all_midi_events, tempo_map, instrument_programs=None):
+        self.play(song_to_timed_messages(all_midi_events, tempo_map, instrument_programs))
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def position_seconds(self):
+        """Tempo decorrido desde o início da reprodução, no mesmo relógio usado pelo agendamento."""
+        if self.start_time is None:
+            return 0.0
+        return max(0.0, time.perf_counter() - self.start_time)
+
+    def mute_part(self, part_name):
+        """Silencia uma parte durante a reprodução (as notas que estão soando são encerradas)."""
+        with self._lock:
+            self.muted_parts.add(part_name)
+            self._release_notes(part_name)
+
+    def unmute_part(self, part_name):
+        with self._lock:
+            self.muted_parts.discard(part_name)
+
+    def jitter_report(self):
+        if not self.lateness:
+            return JitterReport(0, 0.0, 0.0, 0.0)
+        ordered = sorted(abs(value) for value in self.lateness)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return JitterReport(len(ordered), sum(ordered) / len(ordered) * 1000, p99 * 1000, ordered[-1] * 1000)
+
+    def _run(self, messages):
+        clock = time.perf_counter
+        try:
+            for seconds, part_name, msg in messages:
+                target = self.start_time + seconds
+                remaining = target - clock()
+                if remaining > self.spin_threshold:
+                    # Dorme em fatias para responder rapidamente a stop()
+                    if self._stop_event.wait(remaining - self.spin_threshold):
+                        break
+                elif self._stop_event.is_set():
+                    break
+                while clock() < target:
+                    pass
+
+                with self._lock:
+                    if not self._should_send(part_name, msg):
+                        continue
+                    self.port.send(msg)
+                self.lateness.append(clock() - target)
+        finally:
+            with self._lock:
+                for part_name in list(self._active_notes):
+                    self._release_notes(part_name)
+
+    def _should_send(self, part_name, msg):
+        # Chamado com self._lock adquirido
+        if msg.type == 'note_on' and msg.velocity > 0:
+            if part_name in self.muted_parts:
+                return False
+            self._active_notes[part_name].add((msg.channel, msg.note))
+        elif msg.type in ('note_off', 'note_on'):
+            key = (msg.channel, msg.note)
+            if key not in self._active_notes[part_name]:
+                return False # Nota já encerrada (parte silenciada no meio da nota)
+            self._active_notes[part_name].discard(key)
+        return True
+
+    def _release_notes(self, part_name):
+        # Chamado com self._lock adquirido
+        for channel, note in self._active_notes.pop(part_name, ()):
+            self.port.send(mido.Message('note_off', channel=channel, note=note, velocity=0))
@@ -0,0 +1,125 @@
+# midi_store.py
+
+import hashlib
+import os
+import tempfile
+
+DEFAULT_STORE_DIR = os.path.join(os.getcwd(), "MIDIs_Gerados", ".store")
+
+
+class ContentStore:
+    """
+    Armazenamento endereçado por conteúdo para arquivos MIDI: cada conteúdo é gravado
+    uma única vez em objects/<aa>/<sha256>.mid e os caminhos de projeto/parte são
+    hardlinks para esse objeto (ou links simbólicos / cópias quando o sistema de
+    arquivos não suporta hardlinks).
+    """
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.mid")
+
+    def put(self, data):
+        """Grava o conteúdo no armazenamento (se ainda não existir) e retorna seu hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def link(self, digest, dest_path):
+        """
+        Cria dest_path apontando para o objeto. Retorna o tipo de referência criada:
+        'hardlink', 'symlink' ou 'copy' (último recurso, ocupa espaço extra).
+        """
+        source = self.object_path(digest)
+        os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+
+        try:
+            os.link(source, dest_path)
+            return 'hardlink'
+        except OSError:
+            pass # Ex.: pasta em outro volume ou sistema de arquivos sem suporte a hardlinks
+        try:
+            os.symlink(os.path.abspath(source), dest_path)
+            return 'symlink'
+        except OSError:
+            pass # Ex.: Windows sem permissão para criar links simbólicos
+        with open(source, 'rb') as src, open(dest_path, 'wb') as dst:
+            dst.write(src.read())
+        return 'copy'
+
+    def find_existing_reference(self, digest, directory):
+        """Retorna um arquivo em `directory` que já referencia o objeto, ou None."""
+        source = self.object_path(digest)
+        if not os.path.isdir(directory):
+            return None
+        source_stat = os.stat(source)
+        for entry in os.scandir(directory):
+            if not entry.name.lower().endswith('.mid'):
+                continue
+            try:
+                if entry.is_symlink():
+                    if os.path.realpath(entry.path) == os.path.realpath(source):
+                        return entry.path
+                elif entry.is_file():
+                    entry_stat = entry.stat()
+                    if (entry_stat.st_ino, entry_stat.st_dev) == (source_stat.st_ino, source_stat.st_dev):
+                        return entry.path
+            except OSError:
+                continue
+        return None
+
+    def save(self, data, dest_path, reuse_existing=True):
+        """
+        Salva o conteúdo em dest_path via armazenamento por conteúdo.
+        Com reuse_existing=True, se a pasta de destino já tiver um arquivo com o mesmo
+        conteúdo, nenhum arquivo novo é criado. Retorna (caminho final, reaproveitado).
+        """
+        digest = self.put(data)
+        if reuse_existing:
+            existing = self.find_existing_reference(digest, os.path.dirname(os.path.abspath(dest_path)))
+            if existing:
+                return existing, True
+        self.link(digest, dest_path)
+        return dest_path, False
+
+    def collect_garbage(self, referencing_dirs=()):
+        """
+        Remove objetos que não são mais referenciados: sem hardlinks além do próprio
+        objeto e sem links simbólicos apontando para eles dentro de `referencing_dirs`.
+        Retorna o número de bytes liberados.
+        """
+        symlinked = set()
+        for directory in referencing_dirs:
+            for dirpath, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if os.path.islink(path):
+                        symlinked.add(os.path.realpath(path))
+
+        freed = 0
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                if stat.st_nlink <= 1 and os.path.realpath(path) not in symlinked:
+                    os.remove(path)
+                    freed += stat.st_size
+        return freed
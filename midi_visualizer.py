@@ -2,6 +2,8 @@
 
 import tkinter as tk
 
+from tempo_map import TempoMap
+
 class MidiVisualizer(tk.Canvas):
     def __init__(self, master, total_ticks, **kwargs):
         super().__init__(master, **kwargs)
@@ -15,6 +17,7 @@ class MidiVisualizer(tk.Canvas):
         
         self.all_midi_events = {} # Inicializa para evitar NameError
         self.ticks_per_beat = 480 # Valor padrão, será atualizado por set_midi_data
+        self.tempo_map = TempoMap(self.ticks_per_beat) # Converte o tempo de reprodução em posição (ticks)
 
         self.progress_line_id = None # Armazenará o ID da linha de progresso
         
@@ -70,16 +73,18 @@ class MidiVisualizer(tk.Canvas):
             return int(x_coord / self.pixels_per_tick)
         return 0
 
-    def set_midi_data(self, all_midi_events, total_ticks, ticks_per_beat):
+    def set_midi_data(self, all_midi_events, total_ticks, ticks_per_beat, tempo_map=None):
         """
         Define os dados MIDI para o visualizador.
         :param all_midi_events: Dicionário de eventos MIDI por parte.
         :param total_ticks: O número total de ticks da música.
         :param ticks_per_beat: A resolução de ticks por batida.
+        :param tempo_map: TempoMap da música (padrão: 120 BPM constante).
         """
         self.all_midi_events = all_midi_events
         self.total_ticks = total_ticks 
         self.ticks_per_beat = ticks_per_beat
+        self.tempo_map = tempo_map or TempoMap(ticks_per_beat)
         
         # Força o recálculo de pixels_per_tick e redraw ao definir novos dados
         self._on_resize(None) # Simula um evento de redimensionamento para recalcular pp_tick e redraw
@@ -135,6 +140,10 @@ class MidiVisualizer(tk.Canvas):
             self.update_progress_line(self.get_current_progress_ticks())
 
 
+    def seconds_to_ticks(self, seconds):
+        """Posição (em ticks) correspondente a um instante da reprodução, pelo mapa de tempo."""
+        return self.tempo_map.seconds_to_tick(seconds)
+
     def update_progress_line(self, current_ticks):
         """
         Atualiza a posição da linha de progresso no visualizador e rola o canvas.
@@ -4,6 +4,17 @@ import random
 import mido
 import json
 import os
+import io
+import hashlib
+import math
+
+import numpy as np
+
+from groove import apply_groove, compile_groove, resolve_template
+from humanize import humanize_events, part_settings
+from midi_parts import PART_CHANNELS
+from note_overlaps import resolve_overlaps
+from voice_leading import VoiceLeader
 
 class MusicGenerator:
     def __init__(self):
@@ -40,6 +51,36 @@ class MusicGenerator:
         self.ticks_per_beat = 480 # Resolução MIDI padrão (PPQ)
 
         self.genre_configs = self._load_genre_configs()
+        # Hash estável do conteúdo das configurações de gênero (usado como parte de chaves de cache)
+        self.genre_configs_hash = hashlib.sha256(
+            json.dumps(self.genre_configs, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+        # Gerador de números aleatórios próprio, para permitir gerações reprodutíveis via seed
+        self.rng = random.Random()
+
+        # Modelo de melodia treinado em um corpus (markov_melody.MarkovMelodyModel).
+        # Quando definido, substitui a escolha aleatória de notas em generate_lead_melody.
+        self.melody_model = None
+
+        # Condução de vozes dos acordes e pads (voice_leading.VoiceLeader).
+        # Se None, os acordes são tocados em posição fundamental a partir da oitava base.
+        self.voice_leader = VoiceLeader(self.scales)
+
+        # Estágio de humanização aplicado às partes depois de geradas (configurado por gênero em "humanize")
+        self.humanize_enabled = True
+
+        # Groove aplicado às partes depois de geradas: None usa o do gênero ("groove" no genres_config.json);
+        # um nome de groove.GROOVE_TEMPLATES (ou um modelo por extenso) substitui o do gênero
+        self.groove_template = None
+        self._groove_tables = {} # Modelo (JSON) -> GrooveTable compilado
+
+        # Correção de notas da mesma altura sobrepostas ao codificar o MIDI ('truncate', 'merge'
+        # ou 'retrigger', ver note_overlaps.py); None grava os eventos como estão
+        self.overlap_policy = 'truncate'
+
+        # Progressão de acordes usada na última chamada de generate_music_parts (gravada nas sessões)
+        self.last_chord_progression_roman = None
 
     def _load_genre_configs(self):
         config_path = os.path.join(os.path.dirname(__file__), 'genres_config.json')
@@ -100,6 +141,13 @@ class MusicGenerator:
                 }
             }
 
+    def get_instrument_programs(self, selected_style):
+        """Retorna os programas de instrumento (General MIDI) configurados para o gênero."""
+        config = self.genre_configs.get(selected_style, {})
+        return config.get('instrument_programs', {
+            'bass': 39, 'chords': 1, 'lead': 81, 'pads': 89, 'arpeggio': 81, 'drums': 0
+        })
+
     def _get_note_from_root_and_interval(self, root_key, scale_type, interval, base_octave_midi_note):
         midi_notes_map = {
             'C': 0, 'C#': 1, 'D': 2, 'D#': 3, 'E': 4, 'F': 5,
@@ -115,14 +163,20 @@ class MusicGenerator:
     def generate_music_parts(self, root_key, scale_type, bpm, num_beats,
                              generate_bass, generate_chords, generate_lead,
                              generate_pads, generate_arpeggio, generate_drums,
-                             selected_style):
+                             selected_style, seed=None, chord_progression_roman=None):
         log_details = ""
         all_midi_events = {}
 
+        # Com uma seed definida, a mesma combinação de parâmetros gera sempre a mesma música
+        if seed is not None:
+            self.rng.seed(seed)
+
         config = self.genre_configs.get(selected_style, self.genre_configs.get('Drum and Bass', {}))
         
-        # Obtém a progressão de acordes do JSON
-        chord_progression_roman = random.choice(config.get('chords_progressions', [['i', 'VI', 'VII', 'III']]))
+        # Obtém a progressão de acordes do JSON (a menos que uma progressão fixa tenha sido informada)
+        if chord_progression_roman is None:
+            chord_progression_roman = self.rng.choice(config.get('chords_progressions', [['i', 'VI', 'VII', 'III']]))
+        self.last_chord_progression_roman = list(chord_progression_roman)
         
         instrument_programs = config.get('instrument_programs', {
             'bass': 39, 'chords': 1, 'lead': 81, 'pads': 89, 'arpeggio': 81, 'drums': 0
@@ -168,14 +222,55 @@ class MusicGenerator:
             all_midi_events['arpeggio'] = self.generate_arpeggio(root_key, scale_type, num_beats, chord_progression_roman)
             log_details += "Arpejo gerado.\n"
 
+        all_midi_events = self.humanize_parts(self.apply_groove_to_parts(all_midi_events, selected_style), selected_style)
+
         total_ticks = num_beats * self.ticks_per_beat
         us_per_beat = mido.bpm2tempo(bpm)
 
         return all_midi_events, log_details, total_ticks, us_per_beat
 
+    def apply_groove_to_parts(self, all_midi_events, selected_style):
+        """Aplica o groove (do gênero ou self.groove_template) às partes, sem gerá-las de novo. Ver groove.py."""
+        groove_config = self.genre_configs.get(selected_style, {}).get('groove', {})
+        template = resolve_template(self.groove_template if self.groove_template is not None
+                                    else groove_config.get('template', 'straight'))
+        key = json.dumps(template, sort_keys=True)
+        table = self._groove_tables.get(key)
+        if table is None:
+            table = self._groove_tables[key] = compile_groove(template, self.ticks_per_beat)
+        if not table.tick_offsets.any() and (table.velocity_scales == 1).all():
+            return all_midi_events # Reto: nada a fazer
+        return apply_groove(all_midi_events, table, groove_config.get('parts'))
+
+    def humanize_parts(self, all_midi_events, selected_style, np_rng=None):
+        """
+        Estágio de humanização: variações de timing, duração e velocity de cada parte, com os
+        valores da chave "humanize" do gênero, aplicadas de uma vez por parte (humanize.py).
+        Sem np_rng, os números aleatórios vêm de self.rng (reprodutíveis pela seed).
+        """
+        if not self.humanize_enabled:
+            return all_midi_events
+        humanize_config = self.genre_configs.get(selected_style, {}).get('humanize', {})
+        humanized = {}
+        for part, events in all_midi_events.items():
+            settings = part_settings(humanize_config, part)
+            if settings is not None and np_rng is None:
+                np_rng = np.random.default_rng(self.rng.getrandbits(64))
+            humanized[part] = humanize_events(events, settings, np_rng, self.ticks_per_beat * 4)
+        return humanized
+
+    def _measure_ranges(self, num_beats):
+        """Lista de (índice do compasso, batidas no compasso) cobrindo num_beats (o último compasso pode ser parcial)."""
+        return [(measure_idx, min(4, num_beats - measure_idx * 4)) for measure_idx in range(-(-num_beats // 4))]
+
     def generate_bass_line(self, root_key, scale_type, num_beats, chord_progression_roman):
         events = []
-        root_midi = self._get_note_from_root_and_interval(root_key, 'Major', 0, 0) # Obtém o valor MIDI da tônica
+        for measure_idx, beats_in_measure in self._measure_ranges(num_beats):
+            events.extend(self._bass_measure(root_key, scale_type, measure_idx, chord_progression_roman, beats_in_measure))
+        return events
+
+    def _bass_measure(self, root_key, scale_type, measure_idx, chord_progression_roman, beats_in_measure=4):
+        events = []
         # Oitava mais baixa para o baixo, garantindo que a nota esteja em uma faixa MIDI válida
         scale_notes = [self._get_note_from_root_and_interval(root_key, scale_type, interval, 36) for interval in self.scales[scale_type]['intervals']]
         
@@ -184,16 +279,15 @@ class MusicGenerator:
         base_velocity = 85
         velocity_range = 15 # Variação de +/- 15 da base
 
-        for beat_num in range(num_beats):
+        # Obtém o nome do acorde para o compasso atual
+        chord_name = chord_progression_roman[measure_idx % len(chord_progression_roman)]
+
+        # Obtém a nota raiz do acorde na escala correta
+        chord_root_interval = self.scales[scale_type]['chords'][chord_name][0]
+        base_note = self._get_note_from_root_and_interval(root_key, scale_type, chord_root_interval, 36) # Oitava do baixo
+
+        for beat_num in range(measure_idx * 4, measure_idx * 4 + beats_in_measure):
             beat_start_tick = beat_num * self.ticks_per_beat
-            
-            # Obtém o nome do acorde para o compasso atual
-            measure_idx = beat_num // 4
-            chord_name = chord_progression_roman[measure_idx % len(chord_progression_roman)]
-            
-            # Obtém a nota raiz do acorde na escala correta
-            chord_root_interval = self.scales[scale_type]['chords'][chord_name][0]
-            base_note = self._get_note_from_root_and_interval(root_key, scale_type, chord_root_interval, 36) # Oitava do baixo
 
             # Decide o ritmo da nota principal (semínima, colcheia, pontuada)
             rhythmic_options = [
@@ -202,14 +296,14 @@ class MusicGenerator:
                 (int(self.ticks_per_beat * 1.5), 0.75), # Semínima pontuada
                 (self.ticks_per_beat * 2, 0.5) # Mínima
             ]
-            duration_ticks, _ = random.choice(rhythmic_options)
+            duration_ticks, _ = self.rng.choice(rhythmic_options)
             
             # Garante que a duração seja um múltiplo da unidade de quantização
             duration_ticks = (duration_ticks // quantization_unit) * quantization_unit
             if duration_ticks == 0: duration_ticks = quantization_unit # Evita duração zero
 
             # Velocity com variação para humanizar
-            velocity = random.randint(base_velocity - velocity_range, base_velocity + velocity_range)
+            velocity = self.rng.randint(base_velocity - velocity_range, base_velocity + velocity_range)
             
             # Adiciona a nota principal
             events.append(('note_on', base_note, velocity, beat_start_tick))
@@ -220,10 +314,10 @@ class MusicGenerator:
             current_sub_tick = beat_start_tick + duration_ticks # Começa após a nota principal
             
             while current_sub_tick < beat_start_tick + self.ticks_per_beat: # Dentro da mesma batida
-                if random.random() < 0.6: # 60% de chance de adicionar uma nota extra
-                    sub_note_duration = random.choice([quantization_unit, quantization_unit * 2]) # Semicolcheia ou Colcheia
-                    sub_note = random.choice(scale_notes + [base_note + 7, base_note + 12]) # Varia a nota
-                    sub_velocity = random.randint(base_velocity - velocity_range - 20, base_velocity - velocity_range) # Mais suave
+                if self.rng.random() < 0.6: # 60% de chance de adicionar uma nota extra
+                    sub_note_duration = self.rng.choice([quantization_unit, quantization_unit * 2]) # Semicolcheia ou Colcheia
+                    sub_note = self.rng.choice(scale_notes + [base_note + 7, base_note + 12]) # Varia a nota
+                    sub_velocity = self.rng.randint(base_velocity - velocity_range - 20, base_velocity - velocity_range) # Mais suave
 
                     events.append(('note_on', sub_note, sub_velocity, current_sub_tick))
                     events.append(('note_off', sub_note, 0, current_sub_tick + sub_note_duration - (quantization_unit // 2)))
@@ -238,8 +332,22 @@ class MusicGenerator:
             
         return events
 
+    def _chord_voicing(self, root_key, scale_type, chord_progression_roman, chord_index, base_octave_midi_note):
+        """Notas MIDI do acorde chord_index da progressão, na oitava de base_octave_midi_note."""
+        base_note = self._get_note_from_root_and_interval(root_key, scale_type, 0, base_octave_midi_note)
+        if self.voice_leader is None:
+            chord_intervals = self.scales[scale_type]['chords'][chord_progression_roman[chord_index]]
+            return [base_note + note_offset for note_offset in chord_intervals]
+        return self.voice_leader.voice_progression(chord_progression_roman, scale_type, base_note)[chord_index]
+
     def generate_chords(self, root_key, scale_type, num_beats, chord_progression_roman, selected_style):
         events = []
+        for measure_num in range(num_beats // 4): # Para cada compasso
+            events.extend(self._chords_measure(root_key, scale_type, measure_num, chord_progression_roman, selected_style))
+        return events
+
+    def _chords_measure(self, root_key, scale_type, measure_num, chord_progression_roman, selected_style):
+        events = []
         
         # Obtém a configuração do gênero
         config = self.genre_configs.get(selected_style, {})
@@ -250,90 +358,85 @@ class MusicGenerator:
         # Parâmetros de dinamismo adicionais
         note_skip_probability = 0.1 # 10% de chance de pular uma nota dentro de um acorde
         chord_event_skip_probability = 0.05 # 5% de chance de pular um evento de acorde dentro do padrão rítmico
-        velocity_random_range = 10 # Variação de +/- 10 na velocity final
-        timing_random_range = 15 # Variação de +/- 15 ticks no timing (para humanização)
-        duration_random_range = 20 # Variação de +/- 20 ticks na duração
+        # Variações de timing, duração e velocity ficam no estágio de humanização (chave "humanize" do gênero)
 
-        for measure_num in range(num_beats // 4): # Para cada compasso
-            chord_name = chord_progression_roman[measure_num % progression_length]
-            chord_intervals = self.scales[scale_type]['chords'][chord_name]
-            
-            base_note_for_chord = self._get_note_from_root_and_interval(root_key, scale_type, 0, 60) # Oitava dos acordes
-            
-            start_tick_measure = measure_num * self.ticks_per_beat * 4
+        # Notas do acorde do compasso (oitava base 60), já com a condução de vozes da progressão
+        chord_notes = self._chord_voicing(root_key, scale_type, chord_progression_roman, measure_num % progression_length, 60)
+        
+        start_tick_measure = measure_num * self.ticks_per_beat * 4
+        
+        if selected_style == 'House' and chord_rhythmic_patterns:
+            # Se for House e existirem padrões rítmicos, escolhe um aleatoriamente
+            chosen_pattern = self.rng.choice(chord_rhythmic_patterns)
             
-            if selected_style == 'House' and chord_rhythmic_patterns:
-                # Se for House e existirem padrões rítmicos, escolhe um aleatoriamente
-                chosen_pattern = random.choice(chord_rhythmic_patterns)
+            for note_event_data in chosen_pattern:
+                # Chance de pular o evento de acorde inteiro no padrão rítmico
+                if self.rng.random() < chord_event_skip_probability:
+                    continue
+
+                offset = note_event_data['offset']
+                duration = note_event_data['duration']
+                velocity_mult = note_event_data['velocity_mult']
                 
-                for note_event_data in chosen_pattern:
-                    # Chance de pular o evento de acorde inteiro no padrão rítmico
-                    if random.random() < chord_event_skip_probability:
+                final_offset = start_tick_measure + offset
+                
+                for note in chord_notes:
+                    # Chance de pular uma nota individual dentro do acorde
+                    if self.rng.random() < note_skip_probability:
                         continue
 
-                    offset = note_event_data['offset']
-                    duration = note_event_data['duration']
-                    velocity_mult = note_event_data['velocity_mult']
-                    
-                    # Adiciona variação de timing
-                    random_timing_offset = random.randint(-timing_random_range, timing_random_range)
-                    final_offset = start_tick_measure + offset + random_timing_offset
-                    # Garante que o offset não seja negativo
-                    if final_offset < start_tick_measure:
-                        final_offset = start_tick_measure
-
-                    # Adiciona variação de duração
-                    random_duration_offset = random.randint(-duration_random_range, duration_random_range)
-                    final_duration = duration + random_duration_offset
-                    # Garante que a duração mínima seja razoável (ex: 30 ticks)
-                    if final_duration < 30:
-                        final_duration = 30
+                    # Aplica multiplicador de velocity
+                    final_velocity = max(20, min(127, int(self.rng.randint(70, 90) * velocity_mult))) # Garante velocity entre 20-127
                     
-                    for note_offset in chord_intervals:
-                        # Chance de pular uma nota individual dentro do acorde
-                        if random.random() < note_skip_probability:
-                            continue
-
-                        note = base_note_for_chord + note_offset
-                        
-                        # Aplica multiplicador de velocity e adiciona variação aleatória
-                        base_vel = int(random.randint(70, 90) * velocity_mult)
-                        final_velocity = max(20, min(127, base_vel + random.randint(-velocity_random_range, velocity_random_range))) # Garante velocity entre 20-127
-                        
-                        events.append(('note_on', note, final_velocity, final_offset))
-                        # Pequeno release para o efeito de "corte"
-                        events.append(('note_off', note, 0, final_offset + final_duration - 10)) 
-            else:
-                # Comportamento padrão para outros gêneros ou se não houver padrão rítmico
-                duration_ticks = self.ticks_per_beat * 4 - 10 # Padrão de 1 compasso sustentado
-                if selected_style == 'Trance' or selected_style == 'Psytrance':
-                    duration_ticks = self.ticks_per_beat * 8 - 10 # Pads mais longos para Trance/Psytrance
-
-                for note_offset in chord_intervals:
-                    note = base_note_for_chord + note_offset
-                    velocity = random.randint(70, 90) # Variação de velocity
-                    events.append(('note_on', note, velocity, start_tick_measure))
-                    events.append(('note_off', note, 0, start_tick_measure + duration_ticks)) 
+                    events.append(('note_on', note, final_velocity, final_offset))
+                    # Pequeno release para o efeito de "corte"
+                    events.append(('note_off', note, 0, final_offset + duration - 10)) 
+        else:
+            # Comportamento padrão para outros gêneros ou se não houver padrão rítmico
+            duration_ticks = self.ticks_per_beat * 4 - 10 # Padrão de 1 compasso sustentado
+            if selected_style == 'Trance' or selected_style == 'Psytrance':
+                duration_ticks = self.ticks_per_beat * 8 - 10 # Pads mais longos para Trance/Psytrance
+
+            for note in chord_notes:
+                velocity = self.rng.randint(70, 90) # Variação de velocity
+                events.append(('note_on', note, velocity, start_tick_measure))
+                events.append(('note_off', note, 0, start_tick_measure + duration_ticks)) 
 
         return events
 
     def generate_lead_melody(self, root_key, scale_type, num_beats, chord_progression_roman, selected_style):
+        if self.melody_model is not None:
+            # Oitava mais alta para melodia
+            scale_notes = [self._get_note_from_root_and_interval(root_key, scale_type, interval, 72) for interval in self.scales[scale_type]['intervals']]
+            return self.melody_model.generate_lead(scale_notes, num_beats, self.ticks_per_beat, self.rng)
+
+        events = []
+        for measure_idx, beats_in_measure in self._measure_ranges(num_beats):
+            events.extend(self._lead_measure(root_key, scale_type, measure_idx, beats_in_measure))
+        return events
+
+    def _lead_measure(self, root_key, scale_type, measure_idx, beats_in_measure=4):
         events = []
-        root_midi = self._get_note_from_root_and_interval(root_key, 'Major', 0, 0) # Obtém o valor MIDI da tônica
         # Oitava mais alta para melodia
         scale_notes = [self._get_note_from_root_and_interval(root_key, scale_type, interval, 72) for interval in self.scales[scale_type]['intervals']]
+
+        if self.melody_model is not None:
+            # Frase de um compasso do modelo treinado, deslocada para o início do compasso
+            measure_start_tick = measure_idx * 4 * self.ticks_per_beat
+            phrase = self.melody_model.generate_lead(scale_notes, beats_in_measure, self.ticks_per_beat, self.rng)
+            return [(event_type, note, velocity, measure_start_tick + tick) for event_type, note, velocity, tick in phrase]
         
         # Definir uma resolução de quantização para a melodia (ex: semicolcheia)
         quantization_unit = self.ticks_per_beat // 4 # Semicolcheia (120 ticks)
 
         # Reintroduzir mais variedade na melodia
-        for beat_num in range(num_beats): # Loop para cada batida (quarter note)
+        for beat_num in range(measure_idx * 4, measure_idx * 4 + beats_in_measure): # Loop para cada batida (quarter note)
             beat_start_tick = beat_num * self.ticks_per_beat
             
             # Decide quantas notas na melodia para esta batida (mais variação)
-            num_notes_in_beat = random.randint(0, 4) # Pode ter de 0 a 4 notas por batida
+            num_notes_in_beat = self.rng.randint(0, 4) # Pode ter de 0 a 4 notas por batida
             
-            if num_notes_in_beat == 0 and random.random() < 0.3: # Pequena chance de silêncio total na batida
+            if num_notes_in_beat == 0 and self.rng.random() < 0.3: # Pequena chance de silêncio total na batida
                 continue
 
             for i in range(num_notes_in_beat):
@@ -341,20 +444,20 @@ class MusicGenerator:
                 note_start_tick = beat_start_tick + (i * quantization_unit) 
                 
                 # Escolhe uma nota da escala ou um salto melódico pequeno
-                if random.random() < 0.7: # Maior chance de seguir a escala
-                    melody_note = random.choice(scale_notes)
+                if self.rng.random() < 0.7: # Maior chance de seguir a escala
+                    melody_note = self.rng.choice(scale_notes)
                 else: # Pequena chance de um salto para criar interesse
-                    melody_note = random.choice(scale_notes + [scale_notes[0] + 12, scale_notes[0] - 12])
+                    melody_note = self.rng.choice(scale_notes + [scale_notes[0] + 12, scale_notes[0] - 12])
 
                 # Evita notas muito fora da faixa comum
                 if melody_note < 60: melody_note = 60 # C4
                 if melody_note > 96: melody_note = 96 # C7 (para ter mais espaço)
 
-                velocity = random.randint(75, 100) # Variação de velocity
+                velocity = self.rng.randint(75, 100) # Variação de velocity
                 
                 # Duração da nota: colcheia, semicolheia, ou semínima (quantizada)
                 duration_multipliers = [1, 2, 4] # Semicolcheia, Colcheia, Semínima
-                duration_ticks = random.choice(duration_multipliers) * quantization_unit
+                duration_ticks = self.rng.choice(duration_multipliers) * quantization_unit
                 
                 # Garante que a nota não ultrapasse o final da batida
                 if note_start_tick + duration_ticks > beat_start_tick + self.ticks_per_beat:
@@ -371,41 +474,36 @@ class MusicGenerator:
 
     def generate_pads(self, root_key, scale_type, num_beats, chord_progression_roman, selected_style):
         events = []
-        root_midi = self._get_note_from_root_and_interval(root_key, 'Major', 0, 0) # Obtém o valor MIDI da tônica
-        
-        current_tick = 0
-        pad_duration = self.ticks_per_beat * 8 # Pad dura 2 compassos (8 batidas)
+        for block_num in range(num_beats // 8): # Para cada bloco de 2 compassos
+            events.extend(self._pads_block(root_key, scale_type, block_num, chord_progression_roman, selected_style))
+        return events
+
+    def _pads_block(self, root_key, scale_type, block_num, chord_progression_roman, selected_style):
+        events = []
         
         # Usar a progressão de acordes do JSON
         progression_length = len(chord_progression_roman)
 
-        for block_num in range(num_beats // 8): # Para cada bloco de 2 compassos
-            # Seleciona o acorde da progressão (looping)
-            # Usamos `block_num * 2` porque cada bloco tem 2 compassos e a progressão é por compasso.
-            chord_name = chord_progression_roman[(block_num * 2) % progression_length] 
-            chord_intervals = self.scales[scale_type]['chords'][chord_name]
-
-            # Ajusta as notas do acorde para a oitava correta (geralmente uma oitava acima da melodia principal, ou mais cheia)
-            base_note_for_pad = self._get_note_from_root_and_interval(root_key, scale_type, 0, 48) # Oitava dos pads
-            
-            start_tick = block_num * self.ticks_per_beat * 8
-            
-            duration_ticks = self.ticks_per_beat * 4 - 10 # Padrão de 1 compasso
-            if selected_style == 'Trance' or selected_style == 'Psytrance':
-                duration_ticks = self.ticks_per_beat * 8 - 10 # Pads mais longos para Trance/Psytrance
-
-            for note_offset in chord_intervals:
-                note = base_note_for_pad + note_offset
-                velocity = random.randint(50, 70) # Pads são mais suaves
-                events.append(('note_on', note, velocity, start_tick))
-                events.append(('note_off', note, 0, start_tick + duration_ticks)) # Pequeno release
+        # Os pads tocam um acorde a cada 2 compassos (a progressão é por compasso): a condução
+        # de vozes segue a sequência de acordes que os pads realmente tocam, até ela se repetir
+        pad_progression = [chord_progression_roman[(block * 2) % progression_length]
+                           for block in range(progression_length // math.gcd(progression_length, 2))]
+        pad_notes = self._chord_voicing(root_key, scale_type, pad_progression, block_num % len(pad_progression), 48) # Oitava dos pads
+        
+        start_tick = block_num * self.ticks_per_beat * 8
+        
+        duration_ticks = self.ticks_per_beat * 4 - 10 # Padrão de 1 compasso
+        if selected_style == 'Trance' or selected_style == 'Psytrance':
+            duration_ticks = self.ticks_per_beat * 8 - 10 # Pads mais longos para Trance/Psytrance
+
+        for note in pad_notes:
+            velocity = self.rng.randint(50, 70) # Pads são mais suaves
+            events.append(('note_on', note, velocity, start_tick))
+            events.append(('note_off', note, 0, start_tick + duration_ticks)) # Pequeno release
             
         return events
 
-    def generate_arpeggio(self, root_key, scale_type, num_beats, chord_progression_roman):
-        events = []
-        root_midi = self._get_note_from_root_and_interval(root_key, 'Major', 0, 0) # Obtém o valor MIDI da tônica
-        
+    def _choose_arpeggio_note_duration(self):
         # Define a menor duração para as notas do arpejo (Fusa - 32nd note)
         # Permite variação: 1/16, 1/32, 1/64
         arpeggio_quantization_options = [
@@ -413,34 +511,44 @@ class MusicGenerator:
             self.ticks_per_beat // 8,  # Fusa (1/32)
             self.ticks_per_beat // 16  # Semifusa (1/64)
         ]
-        arpeggio_note_duration = random.choice(arpeggio_quantization_options)
+        return self.rng.choice(arpeggio_quantization_options)
+
+    def generate_arpeggio(self, root_key, scale_type, num_beats, chord_progression_roman):
+        events = []
+        arpeggio_note_duration = self._choose_arpeggio_note_duration()
+        for measure_idx, beats_in_measure in self._measure_ranges(num_beats):
+            events.extend(self._arpeggio_measure(root_key, scale_type, measure_idx, chord_progression_roman,
+                                                 arpeggio_note_duration, beats_in_measure))
+        return events
+
+    def _arpeggio_measure(self, root_key, scale_type, measure_idx, chord_progression_roman, arpeggio_note_duration, beats_in_measure=4):
+        events = []
         
         progression_length = len(chord_progression_roman)
         
         # Tipos de padrão de arpejo para mais variedade
         arpeggio_styles = ['up', 'down', 'up_down', 'random_order', 'broken_chord']
 
-        for beat_num in range(num_beats): # Loop para cada batida
+        # Obtém o nome do acorde para o compasso atual
+        chord_name = chord_progression_roman[measure_idx % progression_length]
+        current_chord_intervals = self.scales[scale_type]['chords'][chord_name]
+        
+        base_note_for_arpeggio = self._get_note_from_root_and_interval(root_key, scale_type, 0, 72) # Oitava mais alta
+        arpeggio_notes_base = sorted([base_note_for_arpeggio + interval for interval in current_chord_intervals])
+        
+        # Estende as notas do acorde para incluir mais oitavas para o arpejo
+        extended_arpeggio_notes = []
+        for note in arpeggio_notes_base:
+            if note - 12 >= 36: extended_arpeggio_notes.append(note - 12) # Oitava abaixo
+            extended_arpeggio_notes.append(note)
+            if note + 12 <= 108: extended_arpeggio_notes.append(note + 12) # Oitava acima
+        extended_arpeggio_notes = sorted(list(set(extended_arpeggio_notes))) # Remove duplicatas e ordena
+
+        for beat_num in range(measure_idx * 4, measure_idx * 4 + beats_in_measure): # Loop para cada batida
             current_beat_start_tick = beat_num * self.ticks_per_beat
-            
-            # Obtém o nome do acorde para o compasso atual
-            measure_idx = beat_num // 4
-            chord_name = chord_progression_roman[measure_idx % progression_length]
-            current_chord_intervals = self.scales[scale_type]['chords'][chord_name]
-            
-            base_note_for_arpeggio = self._get_note_from_root_and_interval(root_key, scale_type, 0, 72) # Oitava mais alta
-            arpeggio_notes_base = sorted([base_note_for_arpeggio + interval for interval in current_chord_intervals])
-            
-            # Estende as notas do acorde para incluir mais oitavas para o arpejo
-            extended_arpeggio_notes = []
-            for note in arpeggio_notes_base:
-                if note - 12 >= 36: extended_arpeggio_notes.append(note - 12) # Oitava abaixo
-                extended_arpeggio_notes.append(note)
-                if note + 12 <= 108: extended_arpeggio_notes.append(note + 12) # Oitava acima
-            extended_arpeggio_notes = sorted(list(set(extended_arpeggio_notes))) # Remove duplicatas e ordena
 
             # Escolhe um estilo de arpejo aleatoriamente para esta batida/bloco
-            chosen_style = random.choice(arpeggio_styles)
+            chosen_style = self.rng.choice(arpeggio_styles)
             
             arpeggio_pattern_notes = []
             if chosen_style == 'up':
@@ -450,13 +558,13 @@ class MusicGenerator:
             elif chosen_style == 'up_down':
                 arpeggio_pattern_notes = extended_arpeggio_notes + list(reversed(extended_arpeggio_notes[1:-1]))
             elif chosen_style == 'random_order':
-                arpeggio_pattern_notes = random.sample(extended_arpeggio_notes, len(extended_arpeggio_notes))
+                arpeggio_pattern_notes = self.rng.sample(extended_arpeggio_notes, len(extended_arpeggio_notes))
             elif chosen_style == 'broken_chord': # Toca notas do acorde de forma não sequencial
                 # Escolhe 2-3 notas aleatórias do acorde base para tocar em sequência
-                num_broken_notes = random.randint(2, min(4, len(arpeggio_notes_base)))
-                arpeggio_pattern_notes = random.sample(arpeggio_notes_base, num_broken_notes)
+                num_broken_notes = self.rng.randint(2, min(4, len(arpeggio_notes_base)))
+                arpeggio_pattern_notes = self.rng.sample(arpeggio_notes_base, num_broken_notes)
                 # Adiciona variação de oitava para as notas do broken chord
-                arpeggio_pattern_notes = [n + random.choice([-12, 0, 12]) for n in arpeggio_pattern_notes]
+                arpeggio_pattern_notes = [n + self.rng.choice([-12, 0, 12]) for n in arpeggio_pattern_notes]
                 arpeggio_pattern_notes = sorted([n for n in arpeggio_pattern_notes if 36 <= n <= 108]) # Filtra faixa MIDI
 
             # Garante que o arpejo preenche a batida com a duração escolhida
@@ -466,7 +574,7 @@ class MusicGenerator:
                 if not arpeggio_pattern_notes: break # Evita erro se o padrão estiver vazio
                 arpeggio_note = arpeggio_pattern_notes[i % len(arpeggio_pattern_notes)]
                 
-                velocity = random.randint(65, 85) # Variação de velocity
+                velocity = self.rng.randint(65, 85) # Variação de velocity
 
                 tick_position = current_beat_start_tick + (i * arpeggio_note_duration)
                 
@@ -475,7 +583,21 @@ class MusicGenerator:
         
         return events
 
+    def _choose_drum_patterns(self, drum_patterns_config):
+        # Seleciona um padrão aleatório para cada tipo de instrumento de bateria
+        return {
+            drum_type: self.rng.choice(drum_patterns_config.get(drum_type, [[]]))
+            for drum_type in ('kick', 'snare', 'hihat_closed', 'hihat_open', 'percussion')
+        }
+
     def generate_drums(self, num_beats, drum_patterns_config):
+        events = []
+        chosen_patterns = self._choose_drum_patterns(drum_patterns_config)
+        for measure_idx in range(num_beats // 4):
+            events.extend(self._drums_measure(measure_idx, chosen_patterns))
+        return events
+
+    def _drums_measure(self, measure_idx, chosen_patterns):
         events = []
         # Definir notas MIDI para bateria (General MIDI Standard)
         KICK = 36  # C1
@@ -485,74 +607,107 @@ class MusicGenerator:
         RIDE = 51 # D#2
         CRASH = 49 # C#2
 
-        # Seleciona um padrão aleatório para cada tipo de instrumento de bateria
-        chosen_kick_pattern = random.choice(drum_patterns_config.get('kick', [[]]))
-        chosen_snare_pattern = random.choice(drum_patterns_config.get('snare', [[]]))
-        chosen_hihat_closed_pattern = random.choice(drum_patterns_config.get('hihat_closed', [[]]))
-        chosen_hihat_open_pattern = random.choice(drum_patterns_config.get('hihat_open', [[]]))
-        chosen_percussion_pattern = random.choice(drum_patterns_config.get('percussion', [[]]))
-        
-        for measure_idx in range(num_beats // 4):
-            measure_start_tick = measure_idx * self.ticks_per_beat * 4
+        measure_start_tick = measure_idx * self.ticks_per_beat * 4
 
-            # Adiciona kick
-            for offset_ticks_json, velocity, duration_beats in chosen_kick_pattern:
-                duration_ticks = int(duration_beats * self.ticks_per_beat)
-                events.append(('note_on', KICK, velocity, measure_start_tick + offset_ticks_json))
-                events.append(('note_off', KICK, 0, measure_start_tick + offset_ticks_json + duration_ticks))
-            
-            # Adiciona snare
-            for offset_ticks_json, velocity, duration_beats in chosen_snare_pattern:
-                duration_ticks = int(duration_beats * self.ticks_per_beat)
-                events.append(('note_on', SNARE, velocity, measure_start_tick + offset_ticks_json))
-                events.append(('note_off', SNARE, 0, measure_start_tick + offset_ticks_json + duration_ticks))
-
-            # Adiciona hihat_closed
-            for offset_ticks_json, velocity, duration_beats in chosen_hihat_closed_pattern:
-                duration_ticks = int(duration_beats * self.ticks_per_beat)
-                events.append(('note_on', CLOSED_HIHAT, velocity, measure_start_tick + offset_ticks_json))
-                events.append(('note_off', CLOSED_HIHAT, 0, measure_start_tick + offset_ticks_json + duration_ticks))
-
-            # Adiciona hihat_open
-            for offset_ticks_json, velocity, duration_beats in chosen_hihat_open_pattern:
-                duration_ticks = int(duration_beats * self.ticks_per_beat)
-                events.append(('note_on', OPEN_HIHAT, velocity, measure_start_tick + offset_ticks_json))
-                events.append(('note_off', OPEN_HIHAT, 0, measure_start_tick + offset_ticks_json + duration_ticks))
-            
-            # Adiciona percussão genérica
-            for offset_ticks_json, velocity, duration_beats in chosen_percussion_pattern:
-                duration_ticks = int(duration_beats * self.ticks_per_beat)
-                events.append(('note_on', random.choice([RIDE, CRASH]), velocity, measure_start_tick + offset_ticks_json)) # Varia entre Ride e Crash
-                events.append(('note_off', random.choice([RIDE, CRASH]), 0, measure_start_tick + offset_ticks_json + duration_ticks))
+        # Adiciona kick
+        for offset_ticks_json, velocity, duration_beats in chosen_patterns['kick']:
+            duration_ticks = int(duration_beats * self.ticks_per_beat)
+            events.append(('note_on', KICK, velocity, measure_start_tick + offset_ticks_json))
+            events.append(('note_off', KICK, 0, measure_start_tick + offset_ticks_json + duration_ticks))
+        
+        # Adiciona snare
+        for offset_ticks_json, velocity, duration_beats in chosen_patterns['snare']:
+            duration_ticks = int(duration_beats * self.ticks_per_beat)
+            events.append(('note_on', SNARE, velocity, measure_start_tick + offset_ticks_json))
+            events.append(('note_off', SNARE, 0, measure_start_tick + offset_ticks_json + duration_ticks))
+
+        # Adiciona hihat_closed
+        for offset_ticks_json, velocity, duration_beats in chosen_patterns['hihat_closed']:
+            duration_ticks = int(duration_beats * self.ticks_per_beat)
+            events.append(('note_on', CLOSED_HIHAT, velocity, measure_start_tick + offset_ticks_json))
+            events.append(('note_off', CLOSED_HIHAT, 0, measure_start_tick + offset_ticks_json + duration_ticks))
+
+        # Adiciona hihat_open
+        for offset_ticks_json, velocity, duration_beats in chosen_patterns['hihat_open']:
+            duration_ticks = int(duration_beats * self.ticks_per_beat)
+            events.append(('note_on', OPEN_HIHAT, velocity, measure_start_tick + offset_ticks_json))
+            events.append(('note_off', OPEN_HIHAT, 0, measure_start_tick + offset_ticks_json + duration_ticks))
+        
+        # Adiciona percussão genérica
+        for offset_ticks_json, velocity, duration_beats in chosen_patterns['percussion']:
+            duration_ticks = int(duration_beats * self.ticks_per_beat)
+            cymbal = self.rng.choice([RIDE, CRASH]) # Varia entre Ride e Crash (o note_off precisa ser da mesma nota)
+            events.append(('note_on', cymbal, velocity, measure_start_tick + offset_ticks_json))
+            events.append(('note_off', cymbal, 0, measure_start_tick + offset_ticks_json + duration_ticks))
 
         return events
 
-    def save_midi_file(self, all_midi_events, filename, bpm, instrument_programs):
+    def stream_measures(self, root_key, scale_type, chord_progression_roman, selected_style,
+                        parts=('bass', 'chords', 'lead', 'pads', 'arpeggio', 'drums'), start_measure=0, num_measures=None):
+        """
+        Gera a música compasso a compasso, indefinidamente (ou por num_measures compassos),
+        continuando a progressão de acordes. Produz (índice do compasso, {parte: eventos}),
+        com ticks absolutos; notas podem terminar em compassos seguintes (ex.: pads de 2 compassos).
+        """
+        config = self.genre_configs.get(selected_style, self.genre_configs.get('Drum and Bass', {}))
+        # Escolhas feitas uma vez por música nos geradores completos
+        arpeggio_note_duration = self._choose_arpeggio_note_duration() if 'arpeggio' in parts else None
+        chosen_drum_patterns = self._choose_drum_patterns(config.get('drum_patterns', {})) if 'drums' in parts else None
+        humanize_rng = np.random.default_rng(self.rng.getrandbits(64))
+
+        measure_idx = start_measure
+        while num_measures is None or measure_idx < start_measure + num_measures:
+            block = {}
+            if 'bass' in parts:
+                block['bass'] = self._bass_measure(root_key, scale_type, measure_idx, chord_progression_roman)
+            if 'drums' in parts:
+                block['drums'] = self._drums_measure(measure_idx, chosen_drum_patterns)
+            if 'chords' in parts:
+                block['chords'] = self._chords_measure(root_key, scale_type, measure_idx, chord_progression_roman, selected_style)
+            if 'lead' in parts:
+                block['lead'] = self._lead_measure(root_key, scale_type, measure_idx)
+            if 'pads' in parts:
+                # Pads ocupam blocos de 2 compassos: só começam nos compassos pares
+                block['pads'] = self._pads_block(root_key, scale_type, measure_idx // 2, chord_progression_roman, selected_style) if measure_idx % 2 == 0 else []
+            if 'arpeggio' in parts:
+                block['arpeggio'] = self._arpeggio_measure(root_key, scale_type, measure_idx, chord_progression_roman, arpeggio_note_duration)
+            yield measure_idx, self.humanize_parts(self.apply_groove_to_parts(block, selected_style), selected_style, humanize_rng)
+            measure_idx += 1
+
+    def build_midi_file(self, all_midi_events, bpm, instrument_programs, compact=False):
+        """
+        Monta o arquivo MIDI (uma trilha por parte). Com compact=True, gera o menor arquivo
+        equivalente: note_off vira note_on com velocity 0 (todas as mensagens de nota de uma
+        trilha passam a ter o mesmo status e o mido grava com running status, omitindo o byte
+        de status). O primeiro program change de cada canal é sempre gravado (o dispositivo pode
+        estar com outro programa); só repetições do mesmo programa no mesmo canal são omitidas.
+        Notas da mesma altura sobrepostas são corrigidas conforme self.overlap_policy.
+        """
         mid = mido.MidiFile(ticks_per_beat=self.ticks_per_beat)
-        mid.tempo = mido.bpm2tempo(bpm) # Define o tempo principal do arquivo MIDI
-
-        # Mapeamento de canais e nomes de partes
-        part_channel_map = {
-            'bass': {'channel': 0},
-            'chords': {'channel': 1},
-            'lead': {'channel': 2},
-            'pads': {'channel': 3},
-            'arpeggio': {'channel': 4},
-            'drums': {'channel': 9}
-        }
+        channel_programs = {} # Canal -> programa já definido no arquivo
 
         # Cria uma trilha para cada parte gerada
-        for part_name, part_data in part_channel_map.items():
+        for part_name, channel in PART_CHANNELS.items():
             if part_name in all_midi_events:
                 track = mido.MidiTrack()
                 mid.tracks.append(track)
                 
+                # O andamento vai na primeira trilha (sem ele, os players assumem 120 BPM)
+                if len(mid.tracks) == 1:
+                    track.append(mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm), time=0))
+
                 # Define o programa (instrumento) para a trilha
                 program = instrument_programs.get(part_name, 0) # Obtém o programa do dicionário passado
-                track.append(mido.Message('program_change', program=program, channel=part_data['channel'], time=0))
-
-                events = all_midi_events[part_name]
-                events.sort(key=lambda x: x[3]) # Garante que os eventos estejam em ordem cronológica
+                if channel_programs.get(channel) != program:
+                    channel_programs[channel] = program
+                    track.append(mido.Message('program_change', program=program, channel=channel, time=0))
+
+                # Garante que os eventos estejam em ordem cronológica (sem alterar a lista original),
+                # já sem sobreposições da mesma altura
+                if self.overlap_policy is None:
+                    events = sorted(all_midi_events[part_name], key=lambda x: x[3])
+                else:
+                    events = resolve_overlaps(all_midi_events[part_name], self.overlap_policy)
                 
                 current_ticks = 0
                 for event_type, note, velocity, time in events:
@@ -561,13 +716,26 @@ class MusicGenerator:
                     # Evita delta_time negativo, caso haja algum erro na ordenação ou eventos no mesmo tick
                     if delta_time < 0: delta_time = 0 
 
+                    if compact and event_type == 'note_off':
+                        event_type, velocity = 'note_on', 0
+
                     # Garante que delta_time é um inteiro antes de adicionar à mensagem MIDI
-                    track.append(mido.Message(event_type, channel=part_data['channel'], note=note, velocity=velocity, time=int(delta_time)))
+                    track.append(mido.Message(event_type, channel=channel, note=note, velocity=velocity, time=int(delta_time)))
                     current_ticks = time # Atualiza o tempo atual para o próximo cálculo de delta
 
         # Se não houver eventos, criar uma trilha vazia para o arquivo ser válido
         if not mid.tracks:
-            mid.tracks.append(mido.MidiTrack())
+            mid.tracks.append(mido.MidiTrack([mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm), time=0)]))
+
+        return mid
+
+    def encode_midi_bytes(self, all_midi_events, bpm, instrument_programs, compact=False):
+        """Codifica as partes em um arquivo MIDI completo na memória e retorna seus bytes."""
+        buffer = io.BytesIO()
+        self.build_midi_file(all_midi_events, bpm, instrument_programs, compact).save(file=buffer)
+        return buffer.getvalue()
 
+    def save_midi_file(self, all_midi_events, filename, bpm, instrument_programs, compact=False):
+        mid = self.build_midi_file(all_midi_events, bpm, instrument_programs, compact)
         mid.save(filename)
         return True # Retorna True em caso de sucesso
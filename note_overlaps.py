@@ -0,0 +1,116 @@
+# note_overlaps.py
+
+import collections
+
+import numpy as np
+
+from humanize import pair_events
+
+# Políticas para notas da mesma altura que se sobrepõem em um canal (no MIDI, o note_off
+# da primeira cortaria a segunda):
+#   truncate: a nota anterior termina onde a seguinte começa
+#   merge: as notas sobrepostas viram uma só, do primeiro início ao último fim (velocity da primeira)
+#   retrigger: cada nota é atacada de novo no seu início e a última soa até o fim do grupo sobreposto
+OVERLAP_POLICIES = ('truncate', 'merge', 'retrigger')
+
+
+def resolve_overlaps(events, policy):
+    """
+    Lista de eventos (tipo, nota, velocity, tick) de uma parte em ordem cronológica, sem
+    notas da mesma altura sobrepostas. As notas são pareadas como em humanize.pair_events,
+    ordenadas por (altura, início) e corrigidas em uma varredura linear; eventos sem par
+    passam sem alteração.
+    """
+    if policy not in OVERLAP_POLICIES:
+        raise ValueError(f"Política de sobreposição desconhecida: {policy!r}")
+    count = len(events)
+    if count == 0:
+        return []
+
+    event_types, notes, velocities, ticks = zip(*events)
+    is_on = np.fromiter(map('note_on'.__eq__, event_types), dtype=bool, count=count)
+    notes = np.fromiter(notes, dtype=np.int64, count=count)
+    velocities = np.fromiter(velocities, dtype=np.int64, count=count)
+    ticks = np.fromiter(ticks, dtype=np.int64, count=count)
+    on_index, off_index = pair_events(is_on, notes)
+    if len(on_index) == 0:
+        return sorted(events, key=lambda event: event[3])
+
+    # Notas ordenadas por altura e início (no mesmo início, na ordem da lista)
+    order = np.lexsort((ticks[on_index], notes[on_index]))
+    on_index, off_index = on_index[order], off_index[order]
+    pitches, starts = notes[on_index], ticks[on_index]
+    ends = np.maximum(ticks[off_index], starts)
+
+    # Maior fim até cada nota, recomeçando em cada altura
+    separation = (pitches - pitches.min()) * (int(ends.max() - ends.min()) + 1)
+    running_end = np.maximum.accumulate(ends + separation) - separation
+    overlaps_next = np.r_[(pitches[1:] == pitches[:-1]) & (starts[1:] < running_end[:-1]), False]
+
+    next_starts = np.r_[starts[1:], 0]
+    if policy == 'truncate':
+        ends = np.where(overlaps_next, np.minimum(ends, next_starts), ends)
+        keep = ~overlaps_next | (ends > starts) # Notas com o mesmo início: fica a última
+    elif policy == 'merge':
+        # Cada grupo sobreposto vira a sua primeira nota, estendida até o maior fim do grupo
+        group_start = np.r_[True, ~overlaps_next[:-1]]
+        group_last = ~overlaps_next
+        ends[group_start] = running_end[group_last]
+        keep = group_start
+    else:
+        ends = np.where(overlaps_next, next_starts, running_end)
+        keep = ~overlaps_next | (ends > starts)
+
+    paired = np.zeros(count, dtype=bool)
+    paired[on_index] = paired[off_index] = True
+    unpaired = np.flatnonzero(~paired)
+    on_index, off_index, starts, ends = on_index[keep], off_index[keep], starts[keep], ends[keep]
+
+    out_ticks = np.concatenate((starts, ends, ticks[unpaired]))
+    out_index = np.concatenate((on_index, off_index, unpaired))
+    # No mesmo tick, note_offs antes de note_ons (uma nota que termina não corta a seguinte),
+    # exceto o note_off de uma nota de duração zero, que vem depois do seu note_on
+    rank = np.concatenate((np.ones(len(starts), dtype=np.int64), np.where(ends > starts, 0, 2),
+                           is_on[unpaired].astype(np.int64)))
+    chronological_order = np.lexsort((rank, out_ticks))
+    return [(event_types[index], note, velocity, tick) for index, note, velocity, tick in zip(
+        out_index[chronological_order].tolist(), notes[out_index[chronological_order]].tolist(),
+        velocities[out_index[chronological_order]].tolist(), out_ticks[chronological_order].tolist())]
+
+
+class OverlapTracker:
+    """
+    Versão incremental de resolve_overlaps para eventos enviados em ordem cronológica
+    (modo ao vivo, em que as notas atravessam os blocos de compasso). Cada note_off
+    encerra a nota aberta mais antiga da mesma altura, como em pair_events.
+    """
+    def __init__(self, policy):
+        if policy not in OVERLAP_POLICIES:
+            raise ValueError(f"Política de sobreposição desconhecida: {policy!r}")
+        self.policy = policy
+        self._open = collections.defaultdict(collections.deque) # (canal, nota) -> [encerrada] de cada nota aberta
+
+    def process(self, event_type, channel, note):
+        """
+        Tipos de evento a enviar no lugar deste: nenhum, o próprio evento, ou
+        ['note_off', 'note_on'] quando uma nota que ainda soa é reatacada.
+        """
+        open_notes = self._open[(channel, note)]
+        if event_type == 'note_on':
+            sounding = any(not ended for ended, in open_notes)
+            if self.policy == 'truncate':
+                # As notas abertas terminam aqui; os seus note_offs originais são descartados
+                for entry in open_notes:
+                    entry[0] = True
+            open_notes.append([False])
+            if not sounding:
+                return ['note_on']
+            return [] if self.policy == 'merge' else ['note_off', 'note_on']
+
+        if not open_notes:
+            return [event_type] # note_off sem nota aberta passa sem alteração
+        ended, = open_notes.popleft()
+        if self.policy == 'truncate':
+            return [] if ended else [event_type]
+        # merge e retrigger: o grupo sobreposto soa até o fim da última nota aberta
+        return [] if open_notes else [event_type]
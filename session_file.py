@@ -0,0 +1,129 @@
+# session_file.py
+
+import collections
+import io
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from measure_patterns import PatternEvents, PatternPart
+
+SESSION_EXTENSION = ".mgsession"
+SESSION_FORMAT_VERSION = 2 # 2: partes gravadas como padrões de compasso (measure_patterns)
+SESSION_MAGIC = "gerador-de-musica-sessao"
+
+EVENT_TYPES = ('note_off', 'note_on') # Código gravado na coluna de tipo = índice nesta tupla
+
+# Tudo o que é preciso para reabrir uma música gerada sem reler MIDI
+Session = collections.namedtuple(
+    'Session',
+    ['all_midi_events', 'bpm', 'ticks_per_beat', 'total_ticks', 'genre', 'root_key', 'scale_type',
+     'seed', 'chord_progression_roman', 'instrument_programs']
+)
+
+
+def events_to_arrays(events):
+    """
+    Converte [(tipo, nota, velocity, tick), ...] em duas tabelas: (tipo, nota, velocity)
+    em uint8 (n x 3) e ticks em int32. Colunas estreitas comprimem bem no .npz.
+    """
+    if not events:
+        return np.empty((0, 3), dtype=np.uint8), np.empty(0, dtype=np.int32)
+    event_types, notes, velocities, ticks = zip(*events)
+    codes = np.column_stack((np.asarray(event_types) == EVENT_TYPES[1], notes, velocities)).astype(np.uint8)
+    return codes, np.asarray(ticks, dtype=np.int32)
+
+
+def arrays_to_events(codes, ticks):
+    event_types = np.asarray(EVENT_TYPES, dtype=object)[codes[:, 0]].tolist()
+    return list(zip(event_types, codes[:, 1].tolist(), codes[:, 2].tolist(), ticks.tolist()))
+
+
+def pattern_part_to_arrays(pattern_part):
+    """
+    Tabelas de uma parte comprimida: eventos de todos os blocos únicos concatenados,
+    início de cada bloco (offsets) e, para cada ocorrência, o compasso e o bloco.
+    """
+    events = [event for pattern in pattern_part.patterns for event in pattern]
+    codes, ticks = events_to_arrays(events)
+    offsets = np.cumsum([0] + [len(pattern) for pattern in pattern_part.patterns]).astype(np.int32)
+    occurrences = [(measure, index) for index, measures in enumerate(pattern_part.occurrences) for measure in measures]
+    occurrences = np.array(occurrences, dtype=np.int32).reshape(-1, 2)
+    return codes, ticks, offsets, occurrences
+
+
+def arrays_to_pattern_part(codes, ticks, offsets, occurrences):
+    events = arrays_to_events(codes, ticks)
+    patterns = [tuple(events[start:end]) for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    part_occurrences = [[] for _ in patterns]
+    for measure, index in occurrences.tolist():
+        part_occurrences[index].append(measure)
+    return PatternPart(patterns, part_occurrences)
+
+
+def save_session(path, session):
+    """
+    Grava a sessão como um .npz (sem pickle): um cabeçalho JSON com os parâmetros da
+    geração e, para cada parte, os blocos únicos de compasso e onde cada um se repete.
+    A escrita é atômica.
+    """
+    measure_ticks = session.ticks_per_beat * 4
+    pattern_events = PatternEvents.from_events(session.all_midi_events, measure_ticks)
+    header = {
+        'magic': SESSION_MAGIC,
+        'version': SESSION_FORMAT_VERSION,
+        'parts': list(pattern_events),
+        'measure_ticks': measure_ticks,
+        'bpm': session.bpm,
+        'ticks_per_beat': session.ticks_per_beat,
+        'total_ticks': session.total_ticks,
+        'genre': session.genre,
+        'root_key': session.root_key,
+        'scale_type': session.scale_type,
+        'seed': session.seed,
+        'chord_progression_roman': session.chord_progression_roman,
+        'instrument_programs': session.instrument_programs,
+    }
+    arrays = {'header': np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)}
+    for index, pattern_part in enumerate(pattern_events.parts.values()):
+        (arrays[f"part_{index}_codes"], arrays[f"part_{index}_ticks"],
+         arrays[f"part_{index}_offsets"], arrays[f"part_{index}_occurrences"]) = pattern_part_to_arrays(pattern_part)
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_session(path):
+    """
+    Lê uma sessão gravada por save_session. As partes voltam como PatternEvents (expandidas
+    a cada acesso). Levanta ValueError se o arquivo não for uma sessão válida.
+    """
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(data['header'].tobytes().decode('utf-8'))
+            if header.get('magic') != SESSION_MAGIC:
+                raise ValueError("O arquivo não é uma sessão do gerador.")
+            if header.get('version', 0) > SESSION_FORMAT_VERSION:
+                raise ValueError(f"Sessão gravada por uma versão mais nova (formato {header['version']}).")
+            if header['version'] < 2: # Eventos gravados por extenso
+                all_midi_events = {part: arrays_to_events(data[f"part_{index}_codes"], data[f"part_{index}_ticks"])
+                                   for index, part in enumerate(header['parts'])}
+            else:
+                all_midi_events = PatternEvents({
+                    part: arrays_to_pattern_part(data[f"part_{index}_codes"], data[f"part_{index}_ticks"],
+                                                 data[f"part_{index}_offsets"], data[f"part_{index}_occurrences"])
+                    for index, part in enumerate(header['parts'])
+                }, header['measure_ticks'])
+    except (KeyError, OSError, zipfile.BadZipFile, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Sessão inválida ou corrompida: {e}") from e
+
+    return Session(all_midi_events, header['bpm'], header['ticks_per_beat'], header['total_ticks'],
+                   header['genre'], header['root_key'], header['scale_type'], header['seed'],
+                   header['chord_progression_roman'], header['instrument_programs'])
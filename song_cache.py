@@ -0,0 +1,264 @@
+# song_cache.py
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from midi_parts import PART_NAMES
+
+# Estimativa (em bytes) do espaço ocupado em memória por cada tupla de evento MIDI
+EVENT_SIZE_ESTIMATE = 120
+
+# Pasta padrão do armazenamento em disco (compartilhada pelos processos do serviço de geração)
+DEFAULT_SONG_CACHE_DIR = os.path.join(os.getcwd(), "MIDIs_Gerados", ".cache", "songs")
+
+# Limite padrão do armazenamento em disco
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+
+# Incrementado quando a codificação dos arquivos MIDI muda (invalida os bytes já armazenados)
+MIDI_ENCODING_VERSION = 3
+
+# Entrada de cache: partes geradas, log, os bytes do MIDI completo já codificado e a progressão usada
+CachedSong = collections.namedtuple(
+    'CachedSong',
+    ['all_midi_events', 'log_details', 'total_ticks', 'us_per_beat', 'instrument_programs', 'midi_bytes',
+     'chord_progression_roman']
+)
+
+
+class SizeBoundedLRU:
+    """
+    Cache LRU em memória limitado pelo tamanho total (em bytes) das entradas.
+    Ao ultrapassar o limite, as entradas usadas há mais tempo são descartadas.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = collections.OrderedDict() # chave -> (valor, tamanho)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key) # Marca como usado recentemente
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return False # Entrada maior que o cache inteiro: não armazena
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+            return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self.current_bytes -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+class SongCache:
+    """
+    Cache de músicas geradas em dois níveis: LRU em memória e armazenamento em disco
+    (bytes MIDI codificados + dados das partes), indexado por um hash estável dos
+    parâmetros de geração, da seed e do conteúdo de genres_config.json. Os dois níveis
+    são limitados em bytes: no disco, as entradas acessadas há mais tempo são removidas
+    primeiro, como em audio_preview.PreviewCache.
+    Gerações sem seed não são reprodutíveis e por isso nunca são armazenadas.
+    """
+    def __init__(self, music_generator, cache_dir=None, max_memory_bytes=64 * 1024 * 1024,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.music_generator = music_generator
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = SizeBoundedLRU(max_memory_bytes)
+        self.hits = 0
+        self.misses = 0
+        # O gerador compartilha um único RNG, então a geração em si é serializada
+        self._generate_lock = threading.Lock()
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, root_key, scale_type, bpm, num_beats, parts, selected_style, seed, chord_progression_roman=None):
+        """Retorna o hash (hex) que identifica uma combinação de parâmetros de geração."""
+        params = {
+            'root_key': root_key,
+            'scale_type': scale_type,
+            'bpm': bpm,
+            'num_beats': num_beats,
+            'parts': sorted(part for part in parts if part in PART_NAMES),
+            'selected_style': selected_style,
+            'seed': seed,
+            'chord_progression_roman': list(chord_progression_roman) if chord_progression_roman else None,
+            'ticks_per_beat': self.music_generator.ticks_per_beat,
+            'midi_encoding': MIDI_ENCODING_VERSION,
+            'genre_configs': self.music_generator.genre_configs_hash,
+            'melody_model': getattr(self.music_generator.melody_model, 'fingerprint', None),
+            'voice_leading': getattr(self.music_generator.voice_leader, 'fingerprint', None),
+            'humanize': self.music_generator.humanize_enabled,
+            'groove': self.music_generator.groove_template,
+            'overlap_policy': self.music_generator.overlap_policy,
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def generate_music_parts(self, root_key, scale_type, bpm, num_beats,
+                             generate_bass, generate_chords, generate_lead,
+                             generate_pads, generate_arpeggio, generate_drums,
+                             selected_style, seed=None, chord_progression_roman=None, use_cache=True):
+        """
+        Mesma assinatura de MusicGenerator.generate_music_parts, mas retorna um CachedSong.
+        As partes retornadas são tuplas imutáveis compartilhadas entre todos os acertos de cache.
+        use_cache=False gera sem consultar nem gravar o cache (ex.: seed sorteada para um pedido sem seed).
+        """
+        flags = (generate_bass, generate_chords, generate_lead, generate_pads, generate_arpeggio, generate_drums)
+        parts = [part for part, enabled in zip(PART_NAMES, flags) if enabled]
+
+        if seed is None or not use_cache:
+            self.misses += 1
+            return self._generate(root_key, scale_type, bpm, num_beats, flags, selected_style, seed, chord_progression_roman)
+
+        key = self.make_key(root_key, scale_type, bpm, num_beats, parts, selected_style, seed, chord_progression_roman)
+
+        song = self.memory.get(key)
+        if song is not None:
+            self.hits += 1
+            return song
+
+        song = self._load_from_disk(key)
+        if song is not None:
+            self.hits += 1
+            self.memory.put(key, song, self._estimate_size(song))
+            return song
+
+        self.misses += 1
+        song = self._generate(root_key, scale_type, bpm, num_beats, flags, selected_style, seed, chord_progression_roman)
+        self.memory.put(key, song, self._estimate_size(song))
+        self._save_to_disk(key, song)
+        return song
+
+    def clear(self):
+        """Limpa o cache em memória (o armazenamento em disco é mantido)."""
+        self.memory.clear()
+
+    def _generate(self, root_key, scale_type, bpm, num_beats, flags, selected_style, seed, chord_progression_roman):
+        with self._generate_lock:
+            all_midi_events, log_details, total_ticks, us_per_beat = self.music_generator.generate_music_parts(
+                root_key, scale_type, bpm, num_beats, *flags, selected_style,
+                seed=seed, chord_progression_roman=chord_progression_roman
+            )
+            used_progression = list(self.music_generator.last_chord_progression_roman)
+        instrument_programs = self.music_generator.get_instrument_programs(selected_style)
+        midi_bytes = self.music_generator.encode_midi_bytes(all_midi_events, bpm, instrument_programs)
+        frozen_events = {part: tuple(tuple(event) for event in events) for part, events in all_midi_events.items()}
+        return CachedSong(frozen_events, log_details, total_ticks, us_per_beat, dict(instrument_programs), midi_bytes,
+                          used_progression)
+
+    def _estimate_size(self, song):
+        num_events = sum(len(events) for events in song.all_midi_events.values())
+        return len(song.midi_bytes) + num_events * EVENT_SIZE_ESTIMATE
+
+    def _disk_paths(self, key):
+        # Subpasta pelos dois primeiros caracteres do hash para não acumular milhares de arquivos numa só pasta
+        entry_dir = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(entry_dir, f"{key}.mid"), os.path.join(entry_dir, f"{key}.json")
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        midi_path, data_path = self._disk_paths(key)
+        try:
+            with open(data_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with open(midi_path, 'rb') as f:
+                midi_bytes = f.read()
+            os.utime(data_path) # Marca como usada recentemente para a remoção por bytes
+        except (OSError, ValueError):
+            return None # Entrada ausente ou corrompida: trata como falta de cache
+        if 'chord_progression_roman' not in data:
+            return None # Entrada gravada antes de a progressão ser guardada
+
+        all_midi_events = {part: tuple(tuple(event) for event in events) for part, events in data['all_midi_events'].items()}
+        return CachedSong(all_midi_events, data['log_details'], data['total_ticks'], data['us_per_beat'],
+                          data['instrument_programs'], midi_bytes, data['chord_progression_roman'])
+
+    def _save_to_disk(self, key, song):
+        if not self.cache_dir:
+            return
+        midi_path, data_path = self._disk_paths(key)
+        os.makedirs(os.path.dirname(midi_path), exist_ok=True)
+        data = {
+            'all_midi_events': song.all_midi_events,
+            'log_details': song.log_details,
+            'total_ticks': song.total_ticks,
+            'us_per_beat': song.us_per_beat,
+            'instrument_programs': song.instrument_programs,
+            'chord_progression_roman': song.chord_progression_roman,
+        }
+        # Escrita atômica: o MIDI é gravado antes dos dados, que marcam a entrada como completa
+        self._atomic_write(midi_path, song.midi_bytes)
+        self._atomic_write(data_path, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        self._evict_disk()
+
+    def _evict_disk(self):
+        # A pasta pode ser compartilhada por vários processos: arquivos que somem no meio
+        # da varredura (removidos por outro processo) são ignorados
+        entries = {} # chave -> [data de uso (mtime do .json), bytes]
+        for entry_dir in os.scandir(self.cache_dir):
+            if not entry_dir.is_dir():
+                continue
+            for entry in os.scandir(entry_dir.path):
+                key, extension = os.path.splitext(entry.name)
+                if extension not in ('.mid', '.json'):
+                    continue # Inclui os .tmp das escritas em andamento
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                used, size = entries.get(key, (0, 0))
+                entries[key] = (stat.st_mtime if extension == '.json' else used, size + stat.st_size)
+        total = sum(size for _, size in entries.values())
+        for used, size, key in sorted((used, size, key) for key, (used, size) in entries.items()):
+            if total <= self.max_disk_bytes:
+                break
+            for path in reversed(self._disk_paths(key)): # O .json primeiro: sem ele a entrada já é falta de cache
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def _atomic_write(self, path, payload):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,187 @@
+# song_validator.py
+
+import argparse
+import collections
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from corpus_analyzer import find_midi_files, read_note_events
+from humanize import pair_events
+from midi_reader import CHANNEL_PART_NAMES
+
+DEFAULT_QA_DIRS = [os.path.join(os.getcwd(), "MIDIs_Gerados")]
+PART_CHANNELS = {part: channel for channel, part in CHANNEL_PART_NAMES.items()}
+
+# Um problema encontrado: tipo (chave de ISSUE_DESCRIPTIONS), canal, nota e tick do evento
+Issue = collections.namedtuple('Issue', ['kind', 'channel', 'note', 'tick'])
+
+ISSUE_DESCRIPTIONS = {
+    'stuck_note': "nota presa (note_on sem note_off)",
+    'stray_note_off': "note_off sem nota soando",
+    'negative_duration': "note_off antes do note_on",
+    'overlap': "note_on da mesma nota enquanto ela ainda soa",
+    'pitch_out_of_range': "nota fora de 0-127",
+    'velocity_out_of_range': "velocity fora da faixa",
+    'negative_tick': "tick negativo",
+}
+
+
+def _sweep(sorted_group, sorted_on):
+    """
+    Notas soando em cada grupo (canal, nota) para eventos já agrupados, na ordem de
+    execução dentro de cada grupo. A contagem fica presa em zero nos note_offs soltos:
+    soando = profundidade - min(0, menor profundidade do grupo até aqui).
+    Retorna (início de grupo, fim de grupo, soando depois, soando antes de cada evento).
+    """
+    count = len(sorted_group)
+    group_start = np.r_[True, sorted_group[1:] != sorted_group[:-1]]
+    group_end = np.r_[group_start[1:], True]
+    group_id = np.cumsum(group_start) - 1
+
+    step = np.where(sorted_on, 1, -1)
+    depth = np.cumsum(step)
+    depth -= (depth - step)[group_start][group_id]
+    separation = group_id * (count + 1) # Separa os grupos para o mínimo acumulado recomeçar em cada um
+    running_min = np.minimum.accumulate(depth - separation) + separation
+    sounding = depth - np.minimum(running_min, 0)
+    sounding_before = np.r_[0, sounding[:-1]]
+    sounding_before[group_start] = 0
+    return group_start, group_end, sounding, sounding_before
+
+
+def validate_arrays(ticks, channels, notes, velocities, is_on):
+    """
+    Confere os eventos de nota de uma música inteira (arrays paralelos, em qualquer ordem
+    de canal, mas com cada canal/nota na ordem da lista) e retorna os Issues ordenados por tick.
+    Durações negativas usam o pareamento da lista (k-ésimo note_on com k-ésimo note_off
+    de cada canal/nota, sem os note_offs que não fecham nenhuma nota); notas presas, note_offs soltos e sobreposições usam uma varredura
+    dos eventos ordenados por (canal, nota, tick), que é o que um sintetizador recebe.
+    """
+    ticks = np.asarray(ticks, dtype=np.int64)
+    channels = np.asarray(channels, dtype=np.int64)
+    notes = np.asarray(notes, dtype=np.int64)
+    velocities = np.asarray(velocities, dtype=np.int64)
+    is_on = np.asarray(is_on, dtype=bool)
+    count = len(ticks)
+    found = []
+
+    def report(kind, index):
+        found.append((kind, index))
+
+    report('pitch_out_of_range', np.flatnonzero((notes < 0) | (notes > 127)))
+    min_velocity = np.where(is_on, 1, 0) # note_on com velocity 0 seria lido como note_off
+    report('velocity_out_of_range', np.flatnonzero((velocities < min_velocity) | (velocities > 127)))
+    report('negative_tick', np.flatnonzero(ticks < 0))
+
+    if count:
+        # Um grupo por (canal, nota)
+        note_span = int(notes.max() - notes.min()) + 1
+        group = channels * note_span + (notes - notes.min())
+
+        # Pareamento na ordem da lista; um note_off antes de qualquer note_on aberto não
+        # fecha nota nenhuma e não pode ser pareado com o note_on seguinte
+        list_order = np.argsort(group, kind='stable')
+        _, _, _, open_before = _sweep(group[list_order], is_on[list_order])
+        closes_note = np.ones(count, dtype=bool)
+        closes_note[list_order[~is_on[list_order] & (open_before == 0)]] = False
+        kept = np.flatnonzero(closes_note)
+        on_index, off_index = pair_events(is_on[kept], group[kept])
+        on_index, off_index = kept[on_index], kept[off_index]
+        report('negative_duration', off_index[ticks[off_index] < ticks[on_index]])
+
+        # Ordem estável: no mesmo tick, os eventos seguem a ordem da lista
+        order = np.lexsort((ticks, group))
+        sorted_on = is_on[order]
+        group_start, group_end, sounding, sounding_before = _sweep(group[order], sorted_on)
+
+        report('stray_note_off', order[~sorted_on & (sounding_before == 0)])
+        report('overlap', order[sorted_on & (sounding_before > 0)])
+        # Uma nota presa por (canal, nota), no último note_on do grupo
+        last_on = np.maximum.accumulate(np.where(sorted_on, np.arange(count), -1))
+        report('stuck_note', order[last_on[group_end & (sounding > 0)]])
+
+    issues = [Issue(kind, channel, note, tick)
+              for kind, index in found
+              for channel, note, tick in zip(channels[index].tolist(), notes[index].tolist(), ticks[index].tolist())]
+    issues.sort(key=lambda issue: issue.tick)
+    return issues
+
+
+def validate_song(all_midi_events):
+    """Versão de validate_arrays para um dicionário {parte: eventos} do MusicGenerator."""
+    parts = [(PART_CHANNELS[part], events) for part, events in all_midi_events.items() if events]
+    if not parts:
+        return []
+    columns = [(channel, list(zip(*events))) for channel, events in parts]
+    event_types = [event_type for _, part_columns in columns for event_type in part_columns[0]]
+    count = len(event_types)
+
+    def column(index):
+        return np.fromiter((value for _, part_columns in columns for value in part_columns[index]), dtype=np.int64, count=count)
+
+    channels = np.concatenate([np.full(len(part_columns[0]), channel, dtype=np.int64) for channel, part_columns in columns])
+    is_on = np.fromiter(map('note_on'.__eq__, event_types), dtype=bool, count=count)
+    return validate_arrays(column(3), channels, column(1), column(2), is_on)
+
+
+def validate_file(path):
+    """Valida um arquivo MIDI. Função de módulo para poder rodar nos processos de trabalho."""
+    try:
+        ticks, channels, notes, velocities, is_on, _, _ = read_note_events(path)
+        issues = validate_arrays(ticks, channels, notes, velocities, is_on)
+    except Exception as e:
+        return {'path': path, 'error': str(e)}
+    return {'path': path, 'issues': issues}
+
+
+def validate_files(paths, max_workers=None):
+    """
+    Valida todos os arquivos em um pool de processos (QA em lote).
+    Retorna (resultados, erros): listas de (caminho, issues) e de (caminho, erro).
+    """
+    results, errors = [], []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for report in executor.map(validate_file, paths, chunksize=max(1, len(paths) // 64)):
+            if 'error' in report:
+                errors.append((report['path'], report['error']))
+            else:
+                results.append((report['path'], report['issues']))
+    return results, errors
+
+
+def describe(issue):
+    part = CHANNEL_PART_NAMES.get(issue.channel, f"canal {issue.channel}")
+    return f"tick {issue.tick}: {ISSUE_DESCRIPTIONS[issue.kind]} ({part}, nota {issue.note})"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida a estrutura de arquivos MIDI gerados (QA em lote).")
+    parser.add_argument('directories', nargs='*', default=None, help="Pastas a validar (padrão: MIDIs_Gerados/).")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('-v', '--verbose', action='store_true', help="Lista cada problema (padrão: contagem por tipo).")
+    args = parser.parse_args(argv)
+
+    paths = find_midi_files(args.directories or DEFAULT_QA_DIRS)
+    if not paths:
+        print("Nenhum arquivo MIDI encontrado.")
+        return 0
+
+    results, errors = validate_files(paths, max_workers=args.workers)
+    failed = [(path, issues) for path, issues in results if issues]
+    for path, issues in failed:
+        counts = collections.Counter(issue.kind for issue in issues)
+        print(f"{path}: " + ", ".join(f"{number} {ISSUE_DESCRIPTIONS[kind]}" for kind, number in sorted(counts.items())))
+        if args.verbose:
+            for issue in issues:
+                print(f"  {describe(issue)}")
+    for path, error in errors:
+        print(f"  ERRO ao ler '{path}': {error}", file=sys.stderr)
+    print(f"{len(results)} arquivo(s) validado(s), {len(failed)} com problemas, {len(errors)} erro(s) de leitura.")
+    return 1 if failed or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# tempo_map.py
+
+import bisect
+
+import mido
+import numpy as np
+
+DEFAULT_US_PER_BEAT = 500000 # 120 BPM é o padrão do formato MIDI
+
+
+class TempoMap:
+    """
+    Conversão entre ticks e segundos para uma música com mudanças de andamento.
+    Guarda, para cada mudança de tempo, o tick em que começa e os segundos acumulados
+    até ali; cada conversão é uma busca binária (O(log n)) seguida de uma conta linear,
+    sem acumular erro ao longo da música.
+    """
+    def __init__(self, ticks_per_beat, tempo_changes=None):
+        self.ticks_per_beat = ticks_per_beat
+
+        # Uma entrada por segmento de tempo constante; a última mudança em um mesmo tick vale
+        segments = {0: DEFAULT_US_PER_BEAT}
+        for tick, us_per_beat in sorted(tempo_changes or [], key=lambda change: change[0]):
+            segments[max(0, int(tick))] = int(us_per_beat)
+
+        self.ticks = sorted(segments)
+        self.us_per_beat = [segments[tick] for tick in self.ticks]
+        self.seconds = [0.0]
+        for index in range(1, len(self.ticks)):
+            elapsed_ticks = self.ticks[index] - self.ticks[index - 1]
+            self.seconds.append(self.seconds[-1] + elapsed_ticks * self._seconds_per_tick(index - 1))
+
+    @classmethod
+    def from_bpm(cls, ticks_per_beat, bpm):
+        return cls(ticks_per_beat, [(0, mido.bpm2tempo(bpm))])
+
+    @classmethod
+    def from_midi_file(cls, midi_file):
+        """Monta o mapa a partir de um midi_reader.MappedMidiFile."""
+        return cls(midi_file.ticks_per_beat, midi_file.tempo_changes())
+
+    @property
+    def initial_us_per_beat(self):
+        return self.us_per_beat[0]
+
+    def _seconds_per_tick(self, index):
+        return self.us_per_beat[index] / 1_000_000 / self.ticks_per_beat
+
+    def tick_to_seconds(self, tick):
+        index = bisect.bisect_right(self.ticks, tick) - 1
+        if index < 0:
+            index = 0
+        return self.seconds[index] + (tick - self.ticks[index]) * self._seconds_per_tick(index)
+
+    def seconds_to_tick(self, seconds):
+        index = bisect.bisect_right(self.seconds, seconds) - 1
+        if index < 0:
+            index = 0
+        return self.ticks[index] + (seconds - self.seconds[index]) / self._seconds_per_tick(index)
+
+    def ticks_to_seconds(self, ticks):
+        """Versão vetorizada de tick_to_seconds para um array de ticks."""
+        ticks = np.asarray(ticks, dtype=np.float64)
+        segment_ticks = np.asarray(self.ticks, dtype=np.float64)
+        index = np.maximum(np.searchsorted(segment_ticks, ticks, side='right') - 1, 0)
+        seconds_per_tick = np.asarray(self.us_per_beat, dtype=np.float64) / 1_000_000 / self.ticks_per_beat
+        return np.asarray(self.seconds)[index] + (ticks - segment_ticks[index]) * seconds_per_tick[index]
+
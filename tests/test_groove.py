@@ -0,0 +1,35 @@
+# test_groove.py
+
+import numpy as np
+import pytest
+
+from groove import GROOVE_TEMPLATES, compile_groove
+
+
+@pytest.mark.parametrize('name', sorted(GROOVE_TEMPLATES))
+def test_builtin_templates_keep_event_order(name):
+    table = compile_groove(GROOVE_TEMPLATES[name], 480)
+    shifted = np.arange(480) + table.tick_offsets
+    assert (np.diff(shifted) >= 0).all()
+    assert shifted[-1] <= 480 + table.tick_offsets[0] # A batida seguinte começa depois
+
+
+def test_straight_template_has_no_offsets():
+    table = compile_groove(GROOVE_TEMPLATES['straight'], 96)
+    assert not table.tick_offsets.any()
+    assert (table.velocity_scales == 1.0).all()
+
+
+@pytest.mark.parametrize('offsets', [
+    [0, 120, 0, 0],   # Um passo alcança o seguinte (passo de 120 ticks)
+    [0, 0, 0, -130],  # Um passo volta antes do anterior
+    [0, 0, 0, 130],   # O último passo passaria do início da próxima batida
+])
+def test_offsets_too_large_for_the_step_are_rejected(offsets):
+    with pytest.raises(ValueError):
+        compile_groove({'offsets': offsets}, 480)
+
+
+def test_offsets_scale_with_resolution():
+    table = compile_groove({'offsets': [0, 40]}, 960)
+    assert table.tick_offsets[480] == 80
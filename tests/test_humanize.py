@@ -0,0 +1,29 @@
+# test_humanize.py
+
+import numpy as np
+
+from humanize import pair_events
+
+
+def pairs(event_types, notes):
+    is_on = np.array([event_type == 'on' for event_type in event_types])
+    on_index, off_index = pair_events(is_on, np.array(notes))
+    return sorted(zip(on_index.tolist(), off_index.tolist()))
+
+
+def test_consecutive_pairs():
+    assert pairs(['on', 'off', 'on', 'off'], [60, 60, 62, 62]) == [(0, 1), (2, 3)]
+
+
+def test_non_consecutive_pairs_follow_list_order_per_pitch():
+    # Acorde: três note_ons e depois os note_offs, em outra ordem
+    assert pairs(['on', 'on', 'on', 'off', 'off', 'off'], [60, 64, 67, 67, 60, 64]) == [(0, 4), (1, 5), (2, 3)]
+
+
+def test_kth_on_is_paired_with_kth_off_of_the_same_pitch():
+    assert pairs(['on', 'on', 'off', 'off'], [60, 60, 60, 60]) == [(0, 2), (1, 3)]
+
+
+def test_unpaired_events_are_left_out():
+    # Pareamento por posição: o 1º note_on da nota 60 fica com o 1º note_off, mesmo que venha antes
+    assert pairs(['off', 'on', 'on', 'off'], [60, 62, 60, 60]) == [(2, 0)]
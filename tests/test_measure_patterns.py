@@ -0,0 +1,47 @@
+# test_measure_patterns.py
+
+from measure_patterns import PatternEvents, compress_part, expand_part
+
+MEASURE = 1920
+
+
+def round_trip(events):
+    return expand_part(compress_part(events, MEASURE), MEASURE)
+
+
+def test_repeated_measures_are_stored_once():
+    events = []
+    for measure in range(4):
+        start = measure * MEASURE
+        events += [('note_on', 60, 100, start), ('note_off', 60, 0, start + 480)]
+    part = compress_part(events, MEASURE)
+    assert len(part.patterns) == 1
+    assert part.occurrences == [[0, 1, 2, 3]]
+    assert expand_part(part, MEASURE) == events
+
+
+def test_note_crossing_the_bar_stays_in_its_measure_block():
+    events = [('note_on', 60, 100, 1800), ('note_off', 60, 0, 2100), ('note_on', 62, 100, 2200), ('note_off', 62, 0, 2300)]
+    part = compress_part(events, MEASURE)
+    assert part.patterns[0] == (('note_on', 60, 100, 1800), ('note_off', 60, 0, 2100))
+    assert round_trip(events) == events
+
+
+def test_out_of_order_note_on_keeps_the_list_order():
+    # Um acorde humanizado pode começar um pouco antes de um note_off do compasso seguinte
+    events = [('note_on', 60, 100, 1900), ('note_on', 64, 100, 1925), ('note_off', 60, 0, 1930),
+              ('note_on', 67, 100, 1915), ('note_off', 64, 0, 2400), ('note_off', 67, 0, 2400)]
+    assert round_trip(events) == events
+
+
+def test_unsorted_list_round_trip():
+    events = [('note_on', 60, 100, 4000), ('note_off', 60, 0, 4100), ('note_on', 62, 100, 100),
+              ('note_off', 62, 0, 200), ('note_off', 70, 0, 5000)]
+    assert round_trip(events) == events
+
+
+def test_pattern_events_expands_each_part():
+    all_midi_events = {'bass': [('note_on', 40, 100, 0), ('note_off', 40, 0, 240)] * 2, 'drums': []}
+    patterns = PatternEvents.from_events(all_midi_events, MEASURE)
+    assert dict(patterns) == all_midi_events
+    assert PatternEvents.from_events(patterns, MEASURE) is patterns
@@ -0,0 +1,100 @@
+# test_note_overlaps.py
+
+import pytest
+
+from note_overlaps import OVERLAP_POLICIES, OverlapTracker, resolve_overlaps
+
+
+def notes(*spans, pitch=60):
+    """Eventos de notas (início, fim, velocity) da mesma altura, em ordem cronológica."""
+    events = [('note_on', pitch, velocity, start) for start, _, velocity in spans]
+    events += [('note_off', pitch, 0, end) for _, end, _ in spans]
+    return sorted(events, key=lambda event: (event[3], event[0] == 'note_on'))
+
+
+def spans(events):
+    """(início, fim, velocity) de cada nota de uma lista sem sobreposições."""
+    result, open_note = [], None
+    for event_type, _, velocity, tick in events:
+        if event_type == 'note_on':
+            assert open_note is None, "note_on com a nota ainda soando"
+            open_note = (tick, velocity)
+        else:
+            result.append((open_note[0], tick, open_note[1]))
+            open_note = None
+    assert open_note is None
+    return result
+
+
+@pytest.mark.parametrize('policy', OVERLAP_POLICIES)
+def test_touching_notes_are_unchanged(policy):
+    events = notes((0, 480, 100), (480, 960, 90))
+    resolved = resolve_overlaps(events, policy)
+    assert spans(resolved) == [(0, 480, 100), (480, 960, 90)]
+    assert [event_type for event_type, _, _, tick in resolved if tick == 480] == ['note_off', 'note_on']
+
+
+@pytest.mark.parametrize('policy, expected', [
+    ('truncate', [(0, 240, 100), (240, 960, 90)]),
+    ('merge', [(0, 960, 100)]),
+    ('retrigger', [(0, 240, 100), (240, 960, 90)]),
+])
+def test_partial_overlap(policy, expected):
+    assert spans(resolve_overlaps(notes((0, 480, 100), (240, 960, 90)), policy)) == expected
+
+
+@pytest.mark.parametrize('policy, expected', [
+    # Pareamento na ordem da lista: o 1º note_off (480) fecha a 1ª nota, o 2º (960) a segunda
+    ('truncate', [(0, 960, 90)]), # Mesmo início: fica a última nota
+    ('merge', [(0, 960, 100)]),
+    ('retrigger', [(0, 960, 90)]),
+])
+def test_identical_start(policy, expected):
+    assert spans(resolve_overlaps(notes((0, 960, 100), (0, 480, 90)), policy)) == expected
+
+
+@pytest.mark.parametrize('policy, expected', [
+    # Pareamento na ordem da lista: o 1º note_off (480) fecha a 1ª nota, o 2º (960) a segunda
+    ('truncate', [(0, 240, 100), (240, 960, 90)]),
+    ('merge', [(0, 960, 100)]),
+    ('retrigger', [(0, 240, 100), (240, 960, 90)]),
+])
+def test_nested_notes(policy, expected):
+    assert spans(resolve_overlaps(notes((0, 960, 100), (240, 480, 90)), policy)) == expected
+
+
+def test_other_pitches_and_unpaired_events_pass_through():
+    events = notes((0, 480, 100)) + notes((100, 200, 80), pitch=64) + [('note_off', 70, 0, 300)]
+    resolved = resolve_overlaps(events, 'truncate')
+    assert sorted(resolved) == sorted(events)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        resolve_overlaps([], 'ignore')
+
+
+@pytest.mark.parametrize('policy', OVERLAP_POLICIES)
+@pytest.mark.parametrize('note_spans', [
+    [(0, 480, 100), (480, 960, 90)],
+    [(0, 480, 100), (240, 960, 90)],
+    [(0, 960, 100), (240, 480, 90)],
+    [(0, 480, 100), (100, 700, 90), (600, 800, 80)],
+])
+def test_tracker_matches_resolve_overlaps(policy, note_spans):
+    events = notes(*note_spans)
+    tracker = OverlapTracker(policy)
+    sent = []
+    for event_type, note, velocity, tick in events:
+        for sent_type in tracker.process(event_type, 0, note):
+            sent.append((sent_type, note, velocity if sent_type == event_type else 0, tick))
+
+    # O que soa em um sintetizador (nota ligada até o próximo note_off ou reataque) é o mesmo
+    def sounding(stream):
+        result, start = [], None
+        for event_type, _, _, tick in stream:
+            if start is not None and tick > start:
+                result.append((start, tick))
+            start = tick if event_type == 'note_on' else None
+        return result
+    assert sounding(sent) == sounding(resolve_overlaps(events, policy))
@@ -0,0 +1,45 @@
+# test_song_validator.py
+
+from song_validator import validate_arrays
+
+
+def validate(events, channel=0):
+    """events: (tipo, nota, velocity, tick) de um canal."""
+    return [(issue.kind, issue.note, issue.tick) for issue in validate_arrays(
+        [tick for _, _, _, tick in events], [channel] * len(events), [note for _, note, _, _ in events],
+        [velocity for _, _, velocity, _ in events], [event_type == 'note_on' for event_type, _, _, _ in events])]
+
+
+def test_clean_song():
+    assert validate([('note_on', 60, 100, 0), ('note_off', 60, 0, 480), ('note_on', 60, 100, 480), ('note_off', 60, 0, 960)]) == []
+
+
+def test_stray_note_off_followed_by_a_valid_note():
+    # O note_off solto não pode "consumir" o note_on seguinte
+    issues = validate([('note_off', 60, 0, 0), ('note_on', 60, 100, 480), ('note_off', 60, 0, 960)])
+    assert issues == [('stray_note_off', 60, 0)]
+
+
+def test_one_stuck_note_per_group():
+    issues = validate([('note_on', 60, 100, 0), ('note_on', 60, 100, 240), ('note_off', 60, 0, 480),
+                       ('note_on', 62, 100, 300)])
+    assert sorted(kind for kind, _, _ in issues) == ['overlap', 'stuck_note', 'stuck_note']
+    assert ('stuck_note', 60, 240) in issues and ('stuck_note', 62, 300) in issues
+
+
+def test_negative_duration():
+    # Na lista, a nota começa em 480 e termina em 100
+    issues = validate([('note_on', 60, 100, 480), ('note_off', 60, 0, 100)])
+    assert ('negative_duration', 60, 100) in issues
+
+
+def test_groups_are_separated_by_channel():
+    # A mesma nota em dois canais ao mesmo tempo não é sobreposição
+    issues = validate_arrays([0, 100, 480, 500], [0, 1, 0, 1], [60, 60, 60, 60], [100, 100, 0, 0],
+                             [True, True, False, False])
+    assert issues == []
+
+
+def test_ranges():
+    issues = validate([('note_on', 128, 0, -1), ('note_off', 128, 0, 10)])
+    assert {kind for kind, _, _ in issues} == {'pitch_out_of_range', 'velocity_out_of_range', 'negative_tick'}
@@ -0,0 +1,44 @@
+# test_voice_leading.py
+
+import itertools
+import json
+import os
+
+import numpy as np
+import pytest
+
+from voice_leading import VoiceLeader
+
+SCALES = {
+    'Minor': {'chords': {'i': [0, 3, 7], 'iv': [5, 8, 12], 'v': [7, 10, 14], 'VI': [8, 12, 15], 'VII': [10, 14, 17]}},
+}
+
+
+def loop_cost(leader, candidates, choices):
+    """Custo próprio das vozes mais o movimento entre acordes vizinhos, incluindo a volta ao primeiro."""
+    cost = sum(candidates[index][1][choice] for index, choice in enumerate(choices))
+    for index, choice in enumerate(choices):
+        next_index = (index + 1) % len(choices)
+        previous = candidates[index][0][choice][None, :]
+        current = candidates[next_index][0][choices[next_index]][None, :]
+        cost += leader._transition_costs(previous, current)[0, 0]
+    return cost
+
+
+@pytest.mark.parametrize('progression', [['i'], ['i', 'VI'], ['i', 'VI', 'VII'], ['i', 'iv', 'v', 'i']])
+def test_solution_has_one_voicing_per_chord_and_minimal_loop_cost(progression):
+    leader = VoiceLeader(SCALES)
+    voicings = leader.voice_progression(progression, 'Minor', 60)
+    assert len(voicings) == len(progression)
+
+    candidates = [leader._candidates(SCALES['Minor']['chords'][name], 60) for name in progression]
+    choices = [next(index for index, notes in enumerate(candidates[position][0]) if tuple(notes) == voicing)
+               for position, voicing in enumerate(voicings)]
+    best = min(loop_cost(leader, candidates, combination)
+               for combination in itertools.product(*(range(len(notes)) for notes, _ in candidates)))
+    assert loop_cost(leader, candidates, choices) == pytest.approx(best)
+
+
+def test_results_are_cached():
+    leader = VoiceLeader(SCALES)
+    assert leader.voice_progression(['i', 'VI'], 'Minor', 60) is leader.voice_progression(['i', 'VI'], 'Minor', 60)
@@ -0,0 +1,206 @@
+# variations.py
+
+import collections
+import os
+import random
+
+import numpy as np
+
+from midi_parts import PART_NAMES
+
+# Resultado de um lote: a progressão compartilhada, o acompanhamento fixo e N takes por parte variada
+VariationBatch = collections.namedtuple(
+    'VariationBatch',
+    ['chord_progression_roman', 'backing_events', 'takes', 'total_ticks', 'us_per_beat', 'instrument_programs']
+)
+
+
+class VariationGenerator:
+    """
+    Gera N takes alternativos de partes escolhidas sobre a mesma progressão, tônica e escala.
+    Baixo e melodia são gerados para todos os takes de uma vez com NumPy (todos os números
+    aleatórios do lote sorteados juntos e tabelas de notas calculadas uma única vez); as
+    demais partes usam os geradores do MusicGenerator, take a take, com a progressão fixa.
+    """
+    def __init__(self, music_generator):
+        self.music_generator = music_generator
+
+    def generate_variations(self, root_key, scale_type, bpm, num_beats, selected_style,
+                            variation_parts=('lead',), num_takes=20, backing_parts=('chords', 'pads', 'drums'),
+                            chord_progression_roman=None, seed=None):
+        generator = self.music_generator
+        rng = random.Random(seed)
+        config = generator.genre_configs.get(selected_style, generator.genre_configs.get('Drum and Bass', {}))
+        if chord_progression_roman is None:
+            chord_progression_roman = rng.choice(config.get('chords_progressions', [['i', 'VI', 'VII', 'III']]))
+
+        unknown_parts = set(variation_parts) - set(PART_NAMES)
+        if unknown_parts:
+            raise ValueError(f"Partes desconhecidas: {', '.join(sorted(unknown_parts))}")
+
+        # Acompanhamento compartilhado por todos os takes (sem as partes que variam)
+        backing_flags = [part in backing_parts and part not in variation_parts for part in PART_NAMES]
+        backing_events, _, total_ticks, us_per_beat = generator.generate_music_parts(
+            root_key, scale_type, bpm, num_beats, *backing_flags, selected_style,
+            seed=rng.getrandbits(32), chord_progression_roman=chord_progression_roman
+        )
+
+        np_rng = np.random.default_rng(rng.getrandbits(64))
+        takes = {}
+        for part in variation_parts:
+            if part == 'lead' and generator.melody_model is None:
+                takes[part] = self._finish_takes(part, self._lead_takes(root_key, scale_type, num_beats, num_takes, np_rng),
+                                                 selected_style, np_rng)
+            elif part == 'bass':
+                takes[part] = self._finish_takes(part, self._bass_takes(root_key, scale_type, num_beats, chord_progression_roman, num_takes, np_rng),
+                                                 selected_style, np_rng)
+            else:
+                takes[part] = [
+                    self._single_part(part, root_key, scale_type, bpm, num_beats, selected_style,
+                                      chord_progression_roman, rng.getrandbits(32))
+                    for _ in range(num_takes)
+                ]
+
+        return VariationBatch(chord_progression_roman, backing_events, takes, total_ticks, us_per_beat,
+                              generator.get_instrument_programs(selected_style))
+
+    def export_variations(self, batch, output_dir, bpm, prefix=''):
+        """
+        Grava o acompanhamento e todos os takes em uma única passada:
+        <prefix>backing.mid e <prefix><parte>_take_<NN>.mid. Retorna a lista de arquivos.
+        """
+        generator = self.music_generator
+        os.makedirs(output_dir, exist_ok=True)
+
+        files = [(f"{prefix}backing.mid", batch.backing_events, batch.instrument_programs)]
+        for part, part_takes in batch.takes.items():
+            single_part_program = {part: batch.instrument_programs.get(part, 0)}
+            for take_index, events in enumerate(part_takes, start=1):
+                files.append((f"{prefix}{part}_take_{take_index:02d}.mid", {part: events}, single_part_program))
+
+        written = []
+        for filename, midi_events, instrument_programs in files:
+            path = os.path.join(output_dir, filename)
+            with open(path, 'wb') as f:
+                f.write(generator.encode_midi_bytes(midi_events, bpm, instrument_programs))
+            written.append(path)
+        return written
+
+    def _single_part(self, part, root_key, scale_type, bpm, num_beats, selected_style, chord_progression_roman, seed):
+        flags = [name == part for name in PART_NAMES]
+        all_midi_events, _, _, _ = self.music_generator.generate_music_parts(
+            root_key, scale_type, bpm, num_beats, *flags, selected_style,
+            seed=seed, chord_progression_roman=chord_progression_roman
+        )
+        return all_midi_events.get(part, [])
+
+    def _finish_takes(self, part, part_takes, selected_style, np_rng):
+        # Takes vetorizados não passam por generate_music_parts: aplica aqui o groove e a humanização do gênero
+        generator = self.music_generator
+        return [generator.humanize_parts(generator.apply_groove_to_parts({part: events}, selected_style),
+                                         selected_style, np_rng)[part]
+                for events in part_takes]
+
+    def _scale_notes(self, root_key, scale_type, base_octave_midi_note):
+        generator = self.music_generator
+        return np.array([generator._get_note_from_root_and_interval(root_key, scale_type, interval, base_octave_midi_note)
+                         for interval in generator.scales[scale_type]['intervals']])
+
+    def _lead_takes(self, root_key, scale_type, num_beats, num_takes, np_rng):
+        """Mesmo algoritmo de MusicGenerator.generate_lead_melody, vetorizado para todos os takes."""
+        ticks_per_beat = self.music_generator.ticks_per_beat
+        quantization_unit = ticks_per_beat // 4
+        max_notes = 4 # No máximo 4 semicolcheias por batida
+        shape = (num_takes, num_beats, max_notes)
+
+        scale_notes = self._scale_notes(root_key, scale_type, 72)
+        leap_notes = np.concatenate((scale_notes, [scale_notes[0] + 12, scale_notes[0] - 12]))
+
+        notes_in_beat = np_rng.integers(0, max_notes + 1, size=(num_takes, num_beats))
+        active = np.arange(max_notes) < notes_in_beat[..., None]
+
+        follow_scale = np_rng.random(shape) < 0.7
+        notes = np.where(follow_scale,
+                         scale_notes[np_rng.integers(0, len(scale_notes), size=shape)],
+                         leap_notes[np_rng.integers(0, len(leap_notes), size=shape)])
+        notes = np.clip(notes, 60, 96)
+        velocities = np_rng.integers(75, 101, size=shape)
+
+        slot = np.arange(max_notes)
+        starts = np.arange(num_beats)[:, None] * ticks_per_beat + slot * quantization_unit
+        durations = np.array([1, 2, 4])[np_rng.integers(0, 3, size=shape)] * quantization_unit
+        # A nota não ultrapassa o final da batida
+        durations = np.minimum(durations, ticks_per_beat - slot * quantization_unit)
+        ends = starts + durations - (quantization_unit // 2)
+
+        return [self._to_events(notes[take][active[take]], velocities[take][active[take]],
+                                np.broadcast_to(starts, active[take].shape)[active[take]], ends[take][active[take]])
+                for take in range(num_takes)]
+
+    def _bass_takes(self, root_key, scale_type, num_beats, chord_progression_roman, num_takes, np_rng):
+        """Mesmo algoritmo de MusicGenerator.generate_bass_line, vetorizado para todos os takes."""
+        generator = self.music_generator
+        ticks_per_beat = generator.ticks_per_beat
+        quantization_unit = ticks_per_beat // 4
+        base_velocity, velocity_range = 85, 15
+        shape = (num_takes, num_beats)
+
+        # Tabelas compartilhadas: nota raiz do acorde de cada batida e notas da escala
+        scale_notes = self._scale_notes(root_key, scale_type, 36)
+        chord_roots = np.array([
+            generator._get_note_from_root_and_interval(
+                root_key, scale_type,
+                generator.scales[scale_type]['chords'][chord_progression_roman[(beat // 4) % len(chord_progression_roman)]][0],
+                36)
+            for beat in range(num_beats)
+        ])
+        beat_starts = np.arange(num_beats) * ticks_per_beat
+
+        main_durations = np.array([ticks_per_beat, ticks_per_beat // 2, int(ticks_per_beat * 1.5), ticks_per_beat * 2])
+        main_durations = (main_durations // quantization_unit) * quantization_unit
+        durations = main_durations[np_rng.integers(0, len(main_durations), size=shape)]
+        velocities = np_rng.integers(base_velocity - velocity_range, base_velocity + velocity_range + 1, size=shape)
+
+        # Notas extras dentro da batida: no máximo (batida / semicolcheia) tentativas
+        max_sub_steps = ticks_per_beat // quantization_unit
+        sub_shape = shape + (max_sub_steps,)
+        sub_random = np_rng.random(sub_shape)
+        sub_durations = np.array([quantization_unit, quantization_unit * 2])[np_rng.integers(0, 2, size=sub_shape)]
+        sub_choice = np_rng.integers(0, len(scale_notes) + 2, size=sub_shape)
+        sub_velocities = np_rng.integers(base_velocity - velocity_range - 20, base_velocity - velocity_range + 1, size=sub_shape)
+        extra_notes = chord_roots[:, None] + np.array([7, 12]) # Quinta e oitava da raiz do acorde
+        sub_candidates = np.concatenate((np.broadcast_to(scale_notes, (num_beats, len(scale_notes))), extra_notes), axis=1)
+        sub_notes = np.take_along_axis(
+            np.broadcast_to(sub_candidates, (num_takes,) + sub_candidates.shape),
+            sub_choice.reshape(num_takes, num_beats, -1), axis=2
+        ).reshape(sub_shape)
+
+        positions = durations.copy() # Posição relativa à batida após a nota principal
+        sub_added = np.zeros(sub_shape, dtype=bool)
+        sub_offsets = np.zeros(sub_shape, dtype=np.int64)
+        for step in range(max_sub_steps):
+            inside_beat = positions < ticks_per_beat
+            add = inside_beat & (sub_random[..., step] < 0.6)
+            sub_added[..., step] = add
+            sub_offsets[..., step] = positions
+            positions = positions + np.where(add, sub_durations[..., step], np.where(inside_beat, quantization_unit, 0))
+
+        takes = []
+        for take in range(num_takes):
+            # Intercala, por batida, a nota principal e as notas extras (mesma ordem do gerador original)
+            notes = np.concatenate((np.broadcast_to(chord_roots[:, None], (num_beats, 1)), sub_notes[take]), axis=1)
+            take_velocities = np.concatenate((velocities[take][:, None], sub_velocities[take]), axis=1)
+            starts = beat_starts[:, None] + np.concatenate((np.zeros((num_beats, 1), dtype=np.int64), sub_offsets[take]), axis=1)
+            lengths = np.concatenate((durations[take][:, None], sub_durations[take]), axis=1)
+            mask = np.concatenate((np.ones((num_beats, 1), dtype=bool), sub_added[take]), axis=1)
+            takes.append(self._to_events(notes[mask], take_velocities[mask], starts[mask],
+                                         starts[mask] + lengths[mask] - (quantization_unit // 2)))
+        return takes
+
+    @staticmethod
+    def _to_events(notes, velocities, starts, ends):
+        events = []
+        for note, velocity, start, end in zip(notes.tolist(), velocities.tolist(), starts.tolist(), ends.tolist()):
+            events.append(('note_on', note, velocity, start))
+            events.append(('note_off', note, 0, end))
+        return events
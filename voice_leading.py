@@ -0,0 +1,110 @@
+# voice_leading.py
+
+import itertools
+
+import numpy as np
+
+from song_cache import SizeBoundedLRU
+
+VOICE_LEADING_VERSION = 1
+
+SPREAD_PENALTY = 1.0 # Custo extra da posição aberta: só é usada quando reduz o movimento das vozes
+REGISTER_WEIGHT = 0.5 # Custo por semitom de distância (média das notas) do centro do registro
+REGISTER_LOW = -5 # Faixa permitida em relação à nota base (ex.: base 60 -> notas de 55 a 84)
+REGISTER_HIGH = 24
+REGISTER_CENTER = 5 # A média de um acorde em posição fundamental fica por volta de base + 5
+
+
+def voicing_templates(chord_intervals):
+    """
+    Tabela de vozes candidatas de um acorde, como offsets em relação à nota base:
+    todas as inversões em posição fechada e aberta (voz do meio uma oitava acima),
+    cada uma deslocada uma oitava abaixo, no lugar e uma oitava acima.
+    Retorna [(offsets ordenados, é aberta), ...] sem repetições.
+    """
+    intervals = sorted(chord_intervals)
+    templates = {}
+    for inversion in range(len(intervals)):
+        close = sorted(intervals[inversion:] + [interval + 12 for interval in intervals[:inversion]])
+        shapes = [(close, False)]
+        if len(close) >= 3:
+            shapes.append((sorted(close[:1] + close[2:] + [close[1] + 12]), True))
+        for (shape, is_open), octave in itertools.product(shapes, (-12, 0, 12)):
+            offsets = tuple(note + octave for note in shape)
+            # Mantém a versão fechada quando as duas formas coincidem
+            templates[offsets] = templates.get(offsets, True) and is_open
+    return list(templates.items())
+
+
+class VoiceLeader:
+    """
+    Escolhe as vozes (inversão, abertura e oitava) de cada acorde de uma progressão
+    para minimizar o movimento entre acordes consecutivos, por programação dinâmica
+    (Viterbi) sobre as tabelas de voicing_templates. A progressão é tocada em loop,
+    então a volta do último acorde para o primeiro também entra no custo. O custo é
+    linear no tamanho da progressão (cada passo compara apenas as vozes de dois acordes
+    vizinhos), e o resultado fica em cache por (progressão, tônica, escala, oitava).
+    """
+    def __init__(self, scales, max_cache_bytes=4 * 1024 * 1024):
+        self.scales = scales
+        self.fingerprint = f"voice-leading-{VOICE_LEADING_VERSION}"
+        self._cache = SizeBoundedLRU(max_cache_bytes)
+        self._template_cache = {}
+
+    def voice_progression(self, chord_progression_roman, scale_type, base_note):
+        """Tuplas de notas MIDI (ordenadas), uma por acorde da progressão, com a base na nota base_note (tônica na oitava desejada)."""
+        key = (tuple(chord_progression_roman), scale_type, base_note)
+        voicings = self._cache.get(key)
+        if voicings is None:
+            voicings = self._solve(chord_progression_roman, scale_type, base_note)
+            self._cache.put(key, voicings, 64 * sum(len(voicing) for voicing in voicings))
+        return voicings
+
+    def _candidates(self, chord_intervals, base_note):
+        """Vozes candidatas (matriz k x notas) dentro do registro e custo próprio de cada uma."""
+        templates_key = tuple(chord_intervals)
+        templates = self._template_cache.get(templates_key)
+        if templates is None:
+            templates = self._template_cache[templates_key] = voicing_templates(chord_intervals)
+
+        notes = np.array([offsets for offsets, _ in templates]) + base_note
+        is_open = np.array([is_open for _, is_open in templates])
+        in_register = (notes.min(axis=1) >= base_note + REGISTER_LOW) & (notes.max(axis=1) <= base_note + REGISTER_HIGH)
+        if not in_register.any(): # Registro estreito demais para o acorde: aceita todas
+            in_register[:] = True
+        notes, is_open = notes[in_register], is_open[in_register]
+        own_cost = REGISTER_WEIGHT * np.abs(notes.mean(axis=1) - (base_note + REGISTER_CENTER)) + SPREAD_PENALTY * is_open
+        return notes, own_cost
+
+    @staticmethod
+    def _transition_costs(previous, current):
+        """Matriz (anteriores x atuais) com o movimento total das vozes, em semitons."""
+        if previous.shape[1] == current.shape[1]:
+            # Mesmo número de vozes: cada voz vai para a nota de mesma posição (ambas ordenadas)
+            return np.abs(previous[:, None, :] - current[None, :, :]).sum(axis=2)
+        # Número de vozes diferente: cada nota nova parte da nota mais próxima do acorde anterior
+        return np.abs(current[None, :, :, None] - previous[:, None, None, :]).min(axis=3).sum(axis=2)
+
+    def _solve(self, chord_progression_roman, scale_type, base_note):
+        chords = self.scales[scale_type]['chords']
+        candidates = [self._candidates(chords[chord_name], base_note) for chord_name in chord_progression_roman]
+
+        # cost[s, j]: menor custo até o acorde atual terminando na voz j, tendo começado na voz s
+        first_notes, first_cost = candidates[0]
+        cost = np.full((len(first_notes), len(first_notes)), np.inf)
+        np.fill_diagonal(cost, first_cost)
+        backpointers = []
+        for (previous_notes, _), (notes, own_cost) in zip(candidates, candidates[1:]):
+            total = cost[:, :, None] + self._transition_costs(previous_notes, notes)[None, :, :]
+            backpointers.append(total.argmin(axis=1))
+            cost = total.min(axis=1) + own_cost[None, :]
+
+        # Fecha o loop: volta da última voz para a primeira
+        cost = cost + self._transition_costs(candidates[-1][0], first_notes).T
+        start, last = np.unravel_index(np.argmin(cost), cost.shape)
+
+        path = [last]
+        for pointers in reversed(backpointers):
+            path.append(pointers[start, path[-1]])
+        path.reverse()
+        return tuple(tuple(int(note) for note in candidates[index][0][choice]) for index, choice in enumerate(path))